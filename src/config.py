@@ -11,16 +11,62 @@ class AppConfig:
     TB_USER: str = os.getenv("TB_USER", "tenant@thingsboard.org")
     TB_PASS: str = os.getenv("TB_PASS", "tenant")
     TB_DEVICE_ID: str = os.getenv("TB_DEVICE_ID", "")
+    TB_DEVICE_IDS: str = os.getenv("TB_DEVICE_IDS", "") # Comma separated, extra devices on the same connection
+    TB_TELEMETRY_KEYS: str = os.getenv("TB_TELEMETRY_KEYS", "llm_payload") # Comma separated
+    TB_INTERNAL_URL: str = os.getenv("TB_INTERNAL_URL", "http://127.0.0.1:9090") # Direct local port, bypasses the proxy
+    TELEMETRY_ENGINE: str = os.getenv("TELEMETRY_ENGINE", "thread") # thread | asyncio
+    TELEMETRY_HISTORY: int = int(os.getenv("TELEMETRY_HISTORY", 256)) # Buffered values per device and key
+    TELEMETRY_QUEUE_SIZE: int = int(os.getenv("TELEMETRY_QUEUE_SIZE", 10000)) # Unparsed frames before backpressure
+    TELEMETRY_TOKEN_MARGIN: float = float(os.getenv("TELEMETRY_TOKEN_MARGIN", 60)) # Refresh JWT this long before exp
+    TB_HTTP_POOL_SIZE: int = int(os.getenv("TB_HTTP_POOL_SIZE", 20))
+    TB_HTTP_RETRIES: int = int(os.getenv("TB_HTTP_RETRIES", 3))
+    TB_HTTP_BACKOFF: float = float(os.getenv("TB_HTTP_BACKOFF", 0.3))
     
     # LLM Settings (Local / Ollama)
     LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "http://192.168.1.54:11434/v1") 
+    LLM_BASE_URLS: str = os.getenv("LLM_BASE_URLS", "") # Comma separated, extra Ollama hosts serving the same model
+    LLM_BREAKER_THRESHOLD: int = int(os.getenv("LLM_BREAKER_THRESHOLD", 3)) # Consecutive API errors that take a host out
+    LLM_BREAKER_COOLDOWN: float = float(os.getenv("LLM_BREAKER_COOLDOWN", 30)) # Seconds before a failed host is tried again
+    LLM_HEALTH_INTERVAL: float = float(os.getenv("LLM_HEALTH_INTERVAL", 15)) # Seconds between /models probes, 0 = off
     MODEL_ID: str = os.getenv("AI_MODEL_ID", "llama3.1")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 4)) # Upper bound of parallel requests per LLM host
+    LLM_MIN_CONCURRENCY: int = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+    LLM_TARGET_LATENCY: float = float(os.getenv("LLM_TARGET_LATENCY", 20)) # Seconds; slower responses shrink concurrency
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", 120)) # Deadline per request (queue + generation), 0 = none
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500)) # Context tokens per request
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", 0)) # 0 = analyse synchronously inside the cycle
+    ANALYSIS_QUEUE_SIZE: int = int(os.getenv("ANALYSIS_QUEUE_SIZE", 32))
+    ANALYSIS_RESULT_TTL: float = float(os.getenv("ANALYSIS_RESULT_TTL", 30)) # Seconds a finished job stays collectable
+    ANALYSIS_WAIT_TIMEOUT: float = float(os.getenv("ANALYSIS_WAIT_TIMEOUT", 120)) # Seconds to wait on a shared in-flight analysis
     
     # Paths
     SOURCES_DIR: str = os.getenv("PDF_SOURCE_DIR", "sources")
     CACHE_DIR: str = os.getenv("CACHE_DIR", "cache")
     LOG_FILE: str = os.getenv("XLSX_SOURCE", "alarm_gecmisi.xlsx")
 
+    # PDF Ingestion
+    INGEST_MODE: str = os.getenv("INGEST_MODE", "process") # process | thread
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", 0)) # 0 = all cores
+    INGEST_FILE_TIMEOUT: float = float(os.getenv("INGEST_FILE_TIMEOUT", 600)) # Seconds per PDF, 0 = no limit
+    INGEST_BATCH_PAGES: int = int(os.getenv("INGEST_BATCH_PAGES", 50))
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", 1200)) # Characters per chunk, 0 = whole pages
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", 200))
+
+    # Retrieval
+    RETRIEVAL_ENGINE: str = os.getenv("RETRIEVAL_ENGINE", "tfidf") # tfidf | bm25
+
+    # Solution cache (in-process LRU over error_solutions)
+    SOLUTION_CACHE_SIZE: int = int(os.getenv("SOLUTION_CACHE_SIZE", 256)) # Entries, 0 = disabled
+    SOLUTION_CACHE_TTL: float = float(os.getenv("SOLUTION_CACHE_TTL", 300)) # Seconds
+
+    # LLM response cache (SQLite, keyed on the prompt content)
+    LLM_RESPONSE_CACHE_BYTES: int = int(os.getenv("LLM_RESPONSE_CACHE_BYTES", 50_000_000)) # LRU-evicted beyond this size, 0 = disabled
+
+    # Alarm log writer (background, batched)
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", 10000)) # Rows waiting before new ones are dropped
+    LOG_BATCH_ROWS: int = int(os.getenv("LOG_BATCH_ROWS", 200))
+    LOG_FLUSH_INTERVAL: float = float(os.getenv("LOG_FLUSH_INTERVAL", 0.25)) # Seconds
+
     # Email Reporting
     SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.mailgun.org")
     SMTP_PORT: int = int(os.getenv("SMTP_PORT", 587))
@@ -32,4 +78,21 @@ class AppConfig:
     def tb_host(self) -> str:
         return self.TB_BASE_URL.replace("https://", "").replace("http://", "").rstrip("/")
 
+    @property
+    def device_ids(self) -> list:
+        """TB_DEVICE_ID first (the single-device default), then TB_DEVICE_IDS without duplicates."""
+        ids = [self.TB_DEVICE_ID] + self.TB_DEVICE_IDS.split(",")
+        return list(dict.fromkeys(i.strip() for i in ids if i.strip()))
+
+    @property
+    def llm_base_urls(self) -> list:
+        """LLM_BASE_URL first, then LLM_BASE_URLS without duplicates."""
+        urls = [self.LLM_BASE_URL] + self.LLM_BASE_URLS.split(",")
+        return list(dict.fromkeys(u.strip().rstrip("/") for u in urls if u.strip()))
+
+    @property
+    def telemetry_keys(self) -> list:
+        keys = [k.strip() for k in self.TB_TELEMETRY_KEYS.split(",") if k.strip()]
+        return keys if "llm_payload" in keys else ["llm_payload"] + keys
+
 settings = AppConfig()
\ No newline at end of file
@@ -1,52 +1,348 @@
-from openai import OpenAI, APIError
+from openai import AsyncOpenAI, APIError
+import json
+import time
+import queue
+import hashlib
+import asyncio
 import logging
-from typing import List, Dict
+import itertools
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Protocol
 from src.config import settings
+from src.core.llm_backends import BackendPool, NoHealthyBackend
+from src.core.knowledge.ingestion import CODE_PATTERN
+from src.core.context_packer import ContextPacker
+
+# Request priorities (lower runs first)
+PRIORITY_LIVE = 0    # Alarms on an operator's screen
+PRIORITY_WARMUP = 10 # Cache warmer and other background work
+
+class LLMGateway:
+    """
+    Process-wide gate in front of the LLM server.
+    Requests are coroutines run on one event loop (daemon thread) and are
+    dispatched from a priority queue, so a live alarm overtakes queued
+    warm-up work. At most `concurrency` run at once; the limit adapts AIMD
+    style: +1/limit per fast completion, x0.7 when a request is slower than
+    `target_latency` or times out (at most once per window of requests). Each request carries a deadline; for live
+    requests it covers both the time in the queue and the execution, warm-up
+    work (priority >= PRIORITY_WARMUP) may wait in the queue indefinitely and
+    its timeout only starts when it is dispatched.
+    """
+    def __init__(self, max_concurrency: int = 4, min_concurrency: int = 1, target_latency: float = 15.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.target_latency = target_latency
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self.completed = 0
+        self.expired = 0
+        self._last_decrease = float("-inf")
+        self._seq = itertools.count()
+        self._ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run_loop, name="llm-gateway", daemon=True).start()
+        self._ready.wait()
+
+    @property
+    def concurrency(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    def submit(self, factory: Callable[[], Awaitable[Any]], priority: int = PRIORITY_LIVE,
+               timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """Queues `factory()` (called on the gateway loop). Thread-safe; returns a concurrent Future."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        # Background work queues behind live alarms by design, so only its execution is timed
+        deadline = time.monotonic() + timeout if timeout and priority < PRIORITY_WARMUP else None
+        item = (priority, next(self._seq), deadline, timeout, factory, future)
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queued": self._queue.qsize(),
+            "completed": self.completed,
+            "expired": self.expired,
+            "latency_ewma_s": round(self.latency_ewma, 3)
+        }
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._capacity = asyncio.Event()
+        self.loop.create_task(self._dispatch())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _dispatch(self):
+        while True:
+            # Wait for a free slot *before* taking an item, so the highest priority wins the slot
+            while self.in_flight >= self.concurrency:
+                self._capacity.clear()
+                await self._capacity.wait()
+            _, _, deadline, timeout, factory, future = await self._queue.get()
+            # From here on the caller can no longer cancel, so setting the outcome cannot race
+            if not future.set_running_or_notify_cancel():
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                self.expired += 1
+                future.set_exception(TimeoutError("LLM request deadline passed while queued"))
+                continue
+            if deadline is None and timeout:
+                deadline = time.monotonic() + timeout
+            self.in_flight += 1
+            self.loop.create_task(self._execute(factory, future, deadline))
+
+    async def _execute(self, factory, future: concurrent.futures.Future, deadline: Optional[float]):
+        start = time.monotonic()
+        timed_out = False
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - start)
+            future.set_result(await asyncio.wait_for(factory(), remaining))
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.expired += 1
+            future.set_exception(TimeoutError("LLM request deadline exceeded"))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self.in_flight -= 1
+            self._adapt(start, time.monotonic() - start, timed_out)
+            self._capacity.set()
+
+    def _adapt(self, start: float, latency: float, timed_out: bool):
+        self.completed += 1
+        self.latency_ewma = latency if self.completed == 1 else 0.8 * self.latency_ewma + 0.2 * latency
+        if timed_out or latency > self.target_latency:
+            # One decrease per congestion event: requests that were already running
+            # when the limit last dropped report the same event
+            if start > self._last_decrease:
+                self.limit = max(float(self.min_concurrency), self.limit * 0.7)
+                self._last_decrease = time.monotonic()
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_llm_gateway() -> LLMGateway:
+    """The process-wide gateway (shared by the UI's MonitorService and the cache warmer)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY * len(settings.llm_base_urls),
+                    min_concurrency=settings.LLM_MIN_CONCURRENCY,
+                    target_latency=settings.LLM_TARGET_LATENCY
+                )
+    return _gateway
+
+_STREAM_END = object()
+
+class ResponseCache(Protocol):
+    """Content-addressed store for finished answers (DatabaseManager implements it)."""
+    def get_llm_response(self, key: str) -> Optional[str]: ...
+    def put_llm_response(self, key: str, error_code: str, model: str, response: str) -> None: ...
 
 class AIAnalysisEngine:
-    def __init__(self):
+    def __init__(self, response_cache: Optional[ResponseCache] = None):
         self.logger = logging.getLogger(__name__)
-        self.logger.info(f"Initializing Local AI Engine (Ollama) at {settings.LLM_BASE_URL} with model {settings.MODEL_ID}")
+        self.logger.info(f"Initializing Local AI Engine (Ollama) at {', '.join(settings.llm_base_urls)} with model {settings.MODEL_ID}")
         
-        # Ollama provides an OpenAI compatible API
-        self.client = OpenAI(
-            base_url=settings.LLM_BASE_URL,
-            api_key="ollama" # api key required but ignored by ollama
+        # Ollama provides an OpenAI compatible API; every request runs on the gateway's event loop
+        # and goes to the least busy host (api key required but ignored by ollama)
+        self.backends = BackendPool(
+            settings.llm_base_urls,
+            client_factory=AsyncOpenAI,
+            failure_threshold=settings.LLM_BREAKER_THRESHOLD,
+            cooldown=settings.LLM_BREAKER_COOLDOWN,
+            health_interval=settings.LLM_HEALTH_INTERVAL
         )
+        self.packer = ContextPacker(token_budget=settings.PROMPT_TOKEN_BUDGET)
+        # Answers are looked up by prompt content before the model is asked (None = no caching)
+        self.response_cache = response_cache
+
+    def context_stats(self) -> Dict[str, float]:
+        """Packed vs. retrieved prompt tokens over all requests (prefill savings)."""
+        return self.packer.stats()
 
-    def generate_report(self, alarm_payload: str, docs: List[Dict]) -> str:
+    def backend_stats(self) -> List[Dict[str, Any]]:
+        """Per-host routing state, latency and throughput."""
+        return self.backends.stats()
+
+    def generate_report(self, alarm_payload: str, docs: List[Dict],
+                        on_token: Optional[Callable[[str], None]] = None,
+                        priority: int = PRIORITY_LIVE, timeout: Optional[float] = None) -> str:
         """
-        Generates a diagnostic report using the Local LLM (Ollama).
+        Generates a diagnostic report using the Local LLM (Ollama), through the LLM gateway.
+        With `on_token`, the answer is streamed and every text delta is passed
+        to the callback (on the calling thread) as it arrives; the full report is still returned.
+        timeout: deadline in seconds (queue + generation), defaults to LLM_REQUEST_TIMEOUT.
         """
+        if on_token is not None:
+            parts = []
+            for delta, is_error in self._stream(alarm_payload, docs, priority, timeout):
+                on_token(delta)
+                if is_error:
+                    # Never return (and cache) a half-written report as a solution
+                    return delta.strip()
+                parts.append(delta)
+            return "".join(parts)
+
         if not docs:
-            return f"⚠️ **No Data Found:** I could not find any information about `{alarm_payload}` in the manual."
+            return self._no_data_message(alarm_payload)
 
-        context_text = "\n\n".join([
-            f"--- Source: {doc['source']} (Page {doc['page_num']}) ---\n{doc['text']}" 
-            for doc in docs
-        ])
+        messages, key = self._prepare(alarm_payload, docs)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+        try:
+            future = get_llm_gateway().submit(lambda: self._complete(messages), priority, self._timeout(timeout))
+            report = future.result()
+        except Exception as e:
+            return self._error_message(e)
+        self._store_response(key, alarm_payload, report)
+        return report
 
-        system_prompt = self._build_system_prompt()
-        user_prompt = f"ALARM CODE: {alarm_payload}\n\nTECHNICAL CONTEXT:\n{context_text}"
+    def stream_report(self, alarm_payload: str, docs: List[Dict], priority: int = PRIORITY_LIVE,
+                      timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Yields the report as text deltas while Ollama generates it.
+        Errors arrive as a final "AI Service Error: ..." chunk.
+        """
+        for delta, _ in self._stream(alarm_payload, docs, priority, timeout):
+            yield delta
+
+    def _stream(self, alarm_payload: str, docs: List[Dict], priority: int,
+                timeout: Optional[float]) -> Iterator[tuple]:
+        """(delta, is_error) pairs; deltas are handed from the gateway loop to this thread via a queue."""
+        if not docs:
+            yield self._no_data_message(alarm_payload), False
+            return
+
+        messages, key = self._prepare(alarm_payload, docs)
+        cached = self._cached_response(key)
+        if cached is not None:
+            yield cached, False
+            return
+
+        deltas: "queue.Queue" = queue.Queue()
+        future = get_llm_gateway().submit(lambda: self._complete(messages, deltas.put), priority, self._timeout(timeout))
+        future.add_done_callback(lambda _: deltas.put(_STREAM_END))
+
+        started = False
+        while True:
+            delta = deltas.get()
+            if delta is _STREAM_END: break
+            started = True
+            yield delta, False
 
         try:
-            response = self.client.chat.completions.create(
+            report = future.result()
+        except Exception as e:
+            yield ("\n\n" if started else "") + self._error_message(e), True
+            return
+        self._store_response(key, alarm_payload, report)
+
+    async def _complete(self, messages: List[Dict], on_delta: Optional[Callable[[str], None]] = None) -> str:
+        emitted = []
+        # A stream that already reached the caller is not restarted on another host
+        return await self.backends.call(
+            lambda client: self._request(client, messages, on_delta, emitted),
+            retryable=lambda: not emitted
+        )
+
+    async def _request(self, client: AsyncOpenAI, messages: List[Dict],
+                       on_delta: Optional[Callable[[str], None]], emitted: List[str]) -> str:
+        if on_delta is None:
+            response = await client.chat.completions.create(
                 model=settings.MODEL_ID,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=messages,
                 temperature=0.1, # Keep it deterministic
                 max_tokens=600  # Ollama usually ignores this or handles it differently, but good practice
             )
             return response.choices[0].message.content
 
-        except APIError as e:
+        stream = await client.chat.completions.create(
+            model=settings.MODEL_ID,
+            messages=messages,
+            temperature=0.1,
+            max_tokens=600,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices: continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                emitted.append(delta)
+                on_delta(delta)
+        return "".join(emitted)
+
+    def _cached_response(self, key: str) -> Optional[str]:
+        return self.response_cache.get_llm_response(key) if self.response_cache is not None else None
+
+    def _store_response(self, key: str, alarm_payload: str, report: str):
+        if self.response_cache is not None:
+            self.response_cache.put_llm_response(key, alarm_payload, settings.MODEL_ID, report)
+
+    @staticmethod
+    def _timeout(timeout: Optional[float]) -> Optional[float]:
+        timeout = settings.LLM_REQUEST_TIMEOUT if timeout is None else timeout
+        return timeout if timeout > 0 else None
+
+    def _error_message(self, e: Exception) -> str:
+        if isinstance(e, (APIError, NoHealthyBackend)):
             self.logger.error(f"AI Service Error: {e}")
             return f"AI Service Error: Connection to Local LLM failed. ({e})"
-        except Exception as e:
-            self.logger.error(f"Unexpected AI Error: {e}")
-            return f"AI Service Error: Unexpected error. ({e})"
+        if isinstance(e, TimeoutError):
+            self.logger.error(f"AI Service Error: {e}")
+            return f"AI Service Error: Request timed out. ({e})"
+        self.logger.error(f"Unexpected AI Error: {e}")
+        return f"AI Service Error: Unexpected error. ({e})"
+
+    @staticmethod
+    def _no_data_message(alarm_payload: str) -> str:
+        return f"⚠️ **No Data Found:** I could not find any information about `{alarm_payload}` in the manual."
+
+    def _prepare(self, alarm_payload: str, docs: List[Dict]) -> tuple:
+        """Chat messages for the request and the response cache key of their content."""
+        codes = self._alarm_codes(alarm_payload)
+        packed = self.packer.pack(docs, codes)
+        self.logger.info(f"Context for {alarm_payload}: {packed.tokens}/{packed.raw_tokens} tokens, "
+                         f"{len(packed.sources)} passages ({packed.trimmed} trimmed, {packed.dropped} dropped)")
+        context_text = packed.text
+        system_prompt = self._build_system_prompt()
+        user_prompt = f"ALARM CODE: {alarm_payload}\n\nTECHNICAL CONTEXT:\n{context_text}"
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        return messages, self._response_key(codes, system_prompt, context_text)
+
+    @staticmethod
+    def _alarm_codes(alarm_payload: str) -> List[str]:
+        """Normalised alarm code(s) of a payload ("CODE=f01662" -> ["F01662"])."""
+        return sorted(set(CODE_PATTERN.findall(alarm_payload.upper()))) or [alarm_payload.strip().upper()]
+
+    @staticmethod
+    def _response_key(codes: List[str], system_prompt: str, context_text: str) -> str:
+        """
+        Content address of an answer: model, system prompt, normalised alarm code(s) and the
+        packed context (source/page headers + text). A rebuilt manual changes the key; another
+        spelling of the same code that retrieves the same pages does not.
+        """
+        material = json.dumps({
+            "model": settings.MODEL_ID,
+            "system": system_prompt,
+            "codes": codes,
+            "context": context_text
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
 
     def _build_system_prompt(self) -> str:
         return """You are an expert industrial maintenance assistant.
@@ -3,6 +3,9 @@ from src.core.knowledge.store import KnowledgeBase
 from src.core.ai_engine import AIAnalysisEngine
 from src.services.translation import TranslationService
 from src.services.monitor import MonitorService
+from src.services.analysis_pool import AnalysisPool
+from src.services.db import DatabaseManager
+from src.config import settings
 
 class Container:
     """
@@ -24,7 +27,7 @@ class Container:
     @classmethod
     def get_ai_engine(cls) -> AIAnalysisEngine:
         if cls._ai_instance is None:
-            cls._ai_instance = AIAnalysisEngine()
+            cls._ai_instance = AIAnalysisEngine(response_cache=DatabaseManager)
         return cls._ai_instance
 
     @classmethod
@@ -39,7 +42,14 @@ class Container:
             kb = cls.get_knowledge_base()
             ai = cls.get_ai_engine()
             translator = cls.get_translation_service()
-            cls._monitor_instance = MonitorService(kb=kb, ai_engine=ai, translator=translator)
+            pool = None
+            if settings.ANALYSIS_WORKERS > 0:
+                pool = AnalysisPool(
+                    workers=settings.ANALYSIS_WORKERS,
+                    max_queue=settings.ANALYSIS_QUEUE_SIZE,
+                    result_ttl=settings.ANALYSIS_RESULT_TTL
+                )
+            cls._monitor_instance = MonitorService(kb=kb, ai_engine=ai, translator=translator, pool=pool)
         return cls._monitor_instance
 
 # Global accessor using the Container
@@ -0,0 +1,105 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int                 # Estimated tokens of `text` (what the model has to prefill)
+    raw_tokens: int             # Estimated tokens of every retrieved passage, unpacked
+    sources: List[Tuple[str, int]] = field(default_factory=list) # (source, page_num) in prompt order
+    dropped: int = 0            # Passages that did not fit at all
+    trimmed: int = 0            # Passages that were cut to fit
+
+class ContextPacker:
+    """
+    Fits retrieved passages into a prompt token budget.
+    Passages that mention the alarm code always lead, earlier mentions first;
+    ties and passages without the code keep the retriever's (score) order.
+    They are added in that order with their source/page header; the
+    passage that crosses the budget is cut to
+    a window starting just before the code, or dropped when less than
+    `min_chars` would be left. The best passage is always kept.
+    Token counts use the cheap ~4 characters per token estimate.
+    """
+    CHARS_PER_TOKEN = 4
+    LEAD_CHARS = 120 # Text kept in front of the code when a passage is cut
+
+    def __init__(self, token_budget: int = 1500, min_chars: int = 200):
+        self.token_budget = token_budget
+        self.min_chars = min_chars
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.packed_tokens = 0
+        self.raw_tokens = 0
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        # ~4 characters per token for Llama-style tokenizers on English/technical text
+        return len(text) // cls.CHARS_PER_TOKEN + 1
+
+    @staticmethod
+    def header(doc: Mapping) -> str:
+        return f"--- Source: {doc['source']} (Page {doc['page_num']}) ---\n"
+
+    def rank(self, docs: Sequence[Mapping], codes: Sequence[str] = ()) -> List[Mapping]:
+        def key(item):
+            rank, doc = item
+            pos = self._code_position(doc["text"], codes)
+            if pos is None:
+                return (1, 0.0, rank)
+            return (0, pos / max(len(doc["text"]), 1), rank)
+        return [doc for _, doc in sorted(enumerate(docs), key=key)]
+
+    def pack(self, docs: Sequence[Mapping], codes: Sequence[str] = (),
+             token_budget: Optional[int] = None) -> PackedContext:
+        budget = self.token_budget if token_budget is None else token_budget
+        parts, sources, used, trimmed = [], [], 0, 0
+        ranked = self.rank(docs, codes)
+        for doc in ranked:
+            header, text = self.header(doc), doc["text"]
+            cost = self.estimate_tokens(header + text)
+            if used + cost > budget:
+                remaining = (budget - used - self.estimate_tokens(header)) * self.CHARS_PER_TOKEN
+                if parts and remaining < self.min_chars: break
+                text = self._window(text, codes, max(remaining, self.min_chars))
+                cost = self.estimate_tokens(header + text)
+                trimmed += 1
+            parts.append(header + text)
+            sources.append((doc["source"], doc["page_num"]))
+            used += cost
+            if used >= budget: break
+
+        packed = PackedContext(
+            text="\n\n".join(parts),
+            tokens=used,
+            raw_tokens=sum(self.estimate_tokens(self.header(d) + d["text"]) for d in docs),
+            sources=sources,
+            dropped=len(docs) - len(parts),
+            trimmed=trimmed
+        )
+        with self._lock:
+            self.requests += 1
+            self.packed_tokens += packed.tokens
+            self.raw_tokens += packed.raw_tokens
+        return packed
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "packed_tokens": self.packed_tokens,
+                "raw_tokens": self.raw_tokens,
+                "avg_packed_tokens": round(self.packed_tokens / self.requests, 1) if self.requests else 0.0,
+                "saved_ratio": round(1 - self.packed_tokens / self.raw_tokens, 3) if self.raw_tokens else 0.0
+            }
+
+    @staticmethod
+    def _code_position(text: str, codes: Sequence[str]) -> Optional[int]:
+        positions = [p for p in (text.find(code) for code in codes) if p >= 0]
+        return min(positions) if positions else None
+
+    def _window(self, text: str, codes: Sequence[str], chars: int) -> str:
+        pos = self._code_position(text, codes)
+        start = 0 if pos is None else max(0, min(pos - self.LEAD_CHARS, len(text) - chars))
+        return text[start:start + chars]
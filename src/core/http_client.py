@@ -0,0 +1,99 @@
+import threading
+import time
+import requests
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.config import settings
+
+class PooledHTTPClient:
+    """
+    Shared keep-alive HTTP client for ThingsBoard REST traffic.
+    One requests.Session with a bounded connection pool, retry with
+    exponential backoff and per-endpoint latency counters.
+    Authentication travels in headers only; cookies are disabled so the
+    session holds no per-user state and can be shared across threads.
+    """
+    def __init__(self, base_url: str, pool_size: int = 20, retries: int = 3,
+                 backoff: float = 0.3, timeout: float = 5):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False
+        )
+        # pool_block: callers wait for a free connection instead of opening extra ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    def request(self, method: str, path: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """`endpoint` names the counter bucket (paths with ids would explode the key space)."""
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        failed = True
+        try:
+            resp = self.session.request(method, url, **kwargs)
+            failed = resp.status_code >= 500
+            return resp
+        finally:
+            self._record(endpoint or f"{method} {path.split('?')[0]}", time.perf_counter() - start, failed)
+
+    def get(self, path: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def _record(self, endpoint: str, elapsed: float, failed: bool):
+        with self._stats_lock:
+            s = self._stats.setdefault(endpoint, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["count"] += 1
+            s["errors"] += int(failed)
+            s["total_ms"] += elapsed * 1000
+            s["max_ms"] = max(s["max_ms"], elapsed * 1000)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint request count, error count and mean/max latency (ms)."""
+        with self._stats_lock:
+            return {
+                name: {
+                    "count": int(s["count"]),
+                    "errors": int(s["errors"]),
+                    "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 2)
+                }
+                for name, s in self._stats.items()
+            }
+
+    def close(self):
+        self.session.close()
+
+_tb_client: Optional[PooledHTTPClient] = None
+_tb_client_lock = threading.Lock()
+
+def get_tb_client() -> PooledHTTPClient:
+    """Process-wide pooled client for the internal ThingsBoard REST API."""
+    global _tb_client
+    if _tb_client is None:
+        with _tb_client_lock:
+            if _tb_client is None:
+                _tb_client = PooledHTTPClient(
+                    settings.TB_INTERNAL_URL,
+                    pool_size=settings.TB_HTTP_POOL_SIZE,
+                    retries=settings.TB_HTTP_RETRIES,
+                    backoff=settings.TB_HTTP_BACKOFF
+                )
+    return _tb_client
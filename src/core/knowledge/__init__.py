@@ -0,0 +1 @@
+from src.core.knowledge.store import KnowledgeBase
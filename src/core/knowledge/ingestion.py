@@ -1,10 +1,88 @@
 from pypdf import PdfReader
 import os
-from typing import List, Dict, Any
+import re
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Tuple, Iterator, Optional
+
+CODE_PATTERN = re.compile(r'\b[A-Z]\d{3,7}\b') # F01662, E101 vb.
+
+# Compact record sent back by extraction workers: (page_num, flattened text)
+PageRecord = Tuple[int, str]
+
+class Chunker:
+    """
+    Paragraph-aware splitter for page text.
+    Paragraphs are packed into windows of at most `size` characters. A
+    paragraph mentioning an alarm code always opens a new window, so every
+    alarm description gets its own chunk; like any window that follows an
+    overflow, it starts with up to `overlap` characters of trailing context
+    (whole paragraphs) from the previous one.
+    """
+    PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+    SENTENCE_BREAK = re.compile(r'(?<=[.!?;:])\s+|\n')
+
+    def __init__(self, size: int = 1200, overlap: int = 200):
+        self.size = size
+        self.overlap = min(overlap, size // 2)
+
+    def split(self, raw_text: str) -> List[str]:
+        chunks: List[str] = []
+        current: List[str] = []
+        length = 0
+        for para in self._paragraphs(raw_text):
+            opens_alarm = CODE_PATTERN.search(para) is not None
+            if current and (opens_alarm or length + len(para) > self.size):
+                chunks.append(self._join(current))
+                current = self._tail(current)
+                length = sum(len(p) + 1 for p in current)
+                # The overlap is best effort: it never pushes a window past `size`
+                while current and length + len(para) > self.size:
+                    length -= len(current.pop(0)) + 1
+            current.append(para)
+            length += len(para) + 1
+        if current:
+            chunks.append(self._join(current))
+        return [c for c in chunks if c]
+
+    def _paragraphs(self, raw_text: str) -> List[str]:
+        paragraphs = []
+        for block in self.PARAGRAPH_BREAK.split(raw_text):
+            para = " ".join(block.split())
+            if len(para) <= self.size:
+                paragraphs.append(para)
+                continue
+            # Oversized paragraph (pypdf rarely emits blank lines): split into lines/sentences,
+            # the packing loop regroups them. Hard-cut as a last resort.
+            for piece in self.SENTENCE_BREAK.split(block):
+                piece = " ".join(piece.split())
+                while len(piece) > self.size:
+                    paragraphs.append(piece[:self.size])
+                    piece = piece[self.size:]
+                paragraphs.append(piece)
+        return [p for p in paragraphs if p]
+
+    def _tail(self, paragraphs: List[str]) -> List[str]:
+        tail, length = [], 0
+        for para in reversed(paragraphs):
+            if length + len(para) > self.overlap: break
+            tail.insert(0, para)
+            length += len(para) + 1
+        return tail
+
+    @staticmethod
+    def _join(paragraphs: List[str]) -> str:
+        return " ".join(paragraphs).strip()
+
+def _page_texts(raw_text: str, chunker: Optional[Chunker]) -> List[str]:
+    if chunker is None:
+        return [raw_text.replace('\n', ' ').strip()]
+    return chunker.split(raw_text)
 
 class PDFProcessor:
     @staticmethod
-    def extract_content(file_path: str) -> List[Dict[str, Any]]:
+    def extract_content(file_path: str, chunker: Optional[Chunker] = None) -> List[Dict[str, Any]]:
         pages = []
         try:
             reader = PdfReader(file_path)
@@ -12,12 +90,178 @@ class PDFProcessor:
             for i, page in enumerate(reader.pages):
                 text = page.extract_text()
                 if text:
-                    pages.append({
-                        "source": filename,
-                        "page_num": i + 1,
-                        "text": text.replace('\n', ' ').strip(),
-                        "raw_text": text
-                    })
+                    for chunk in _page_texts(text, chunker):
+                        pages.append({
+                            "source": filename,
+                            "page_num": i + 1,
+                            "text": chunk
+                        })
         except Exception as e:
             print(f"PDF Error ({file_path}): {e}")
         return pages
+
+    @staticmethod
+    def count_pages(file_path: str) -> int:
+        return len(PdfReader(file_path).pages)
+
+    @staticmethod
+    def extract_page_range(file_path: str, start: int, stop: int,
+                           chunker: Optional[Chunker] = None) -> List[PageRecord]:
+        """Extracts pages [start, stop) as compact records (one per chunk). Runs inside pool workers."""
+        reader = PdfReader(file_path)
+        records = []
+        for i in range(start, min(stop, len(reader.pages))):
+            text = reader.pages[i].extract_text()
+            if text:
+                records.extend((i + 1, chunk) for chunk in _page_texts(text, chunker))
+        return records
+
+@dataclass
+class ExtractionProgress:
+    """Streamed by ParallelExtractor; `pages` is set once a file is finished."""
+    path: str
+    pages_done: int
+    pages_total: int
+    pages: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.pages is not None or self.error is not None
+
+@dataclass
+class _FileJob:
+    path: str
+    pages_total: int = 0
+    pages_done: int = 0
+    futures: Dict[Future, int] = field(default_factory=dict)
+    batches: Dict[int, List[PageRecord]] = field(default_factory=dict)
+    active: float = 0.0 # Seconds during which a worker was busy with this file
+
+class ParallelExtractor:
+    """
+    Extracts a set of PDFs on a worker pool and streams progress.
+    'process' mode splits every file into page batches so one large manual is
+    spread across cores (pypdf is pure Python, threads are bound by the GIL).
+    'thread' mode keeps the legacy one-task-per-file behaviour.
+    """
+    def __init__(self, mode: str = "process", workers: int = 0,
+                 file_timeout: float = 0, batch_pages: int = 50, chunker: Optional[Chunker] = None):
+        self.mode = mode
+        self.chunker = chunker
+        self.workers = workers or os.cpu_count() or 1
+        self.file_timeout = file_timeout
+        self.batch_pages = max(1, batch_pages)
+
+    def extract(self, files: List[str]) -> Iterator[ExtractionProgress]:
+        if not files: return
+        if self.mode == "process":
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            if self.mode == "process":
+                yield from self._extract_pages(executor, files)
+            else:
+                yield from self._extract_files(executor, files)
+        finally:
+            # Timed-out workers cannot be interrupted; do not wait for them
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _extract_files(self, executor, files: List[str]) -> Iterator[ExtractionProgress]:
+        jobs = {}
+        for path in files:
+            job = _FileJob(path, pages_total=1)
+            job.futures[executor.submit(PDFProcessor.extract_content, path, self.chunker)] = 0
+            jobs[path] = job
+
+        for job, fut in self._drain(jobs):
+            del jobs[job.path]
+            pages = fut.result()
+            yield ExtractionProgress(job.path, len(pages), len(pages), pages=pages)
+
+        for job in jobs.values():
+            yield self._timeout(job)
+
+    def _extract_pages(self, executor, files: List[str]) -> Iterator[ExtractionProgress]:
+        jobs = {}
+        for path, count in zip(files, executor.map(self._safe_count, files)):
+            job = _FileJob(path, pages_total=count)
+            if count <= 0:
+                yield ExtractionProgress(path, 0, 0, error="unreadable PDF")
+                continue
+            for start in range(0, count, self.batch_pages):
+                fut = executor.submit(PDFProcessor.extract_page_range, path, start,
+                                      start + self.batch_pages, self.chunker)
+                job.futures[fut] = start
+            jobs[path] = job
+
+        for job, fut in self._drain(jobs):
+            start = job.futures.pop(fut)
+            try:
+                job.batches[start] = fut.result()
+            except Exception as e:
+                # A file with missing pages must not be cached as done: report it failed so
+                # the next incremental run extracts it again
+                print(f"PDF Error ({job.path}): {e}")
+                for other in job.futures:
+                    other.cancel()
+                del jobs[job.path]
+                yield ExtractionProgress(job.path, job.pages_done, job.pages_total, error=str(e) or type(e).__name__)
+                continue
+            job.pages_done = min(job.pages_total, job.pages_done + self.batch_pages)
+
+            if job.futures:
+                yield ExtractionProgress(job.path, job.pages_done, job.pages_total)
+            else:
+                del jobs[job.path]
+                yield ExtractionProgress(job.path, job.pages_total, job.pages_total,
+                                         pages=self._assemble(job))
+
+        for job in jobs.values():
+            yield self._timeout(job)
+
+    def _drain(self, jobs: Dict[str, _FileJob]) -> Iterator[Tuple[_FileJob, Future]]:
+        """Yields completed futures with their job; drops files that exceed the per-file timeout."""
+        owner = {fut: job for job in jobs.values() for fut in job.futures}
+        last = time.monotonic()
+        while owner:
+            done, _ = wait(list(owner), timeout=0.5, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            elapsed, last = now - last, now
+            for fut in done:
+                job = owner.pop(fut)
+                if job.path in jobs:
+                    yield job, fut
+
+            if not self.file_timeout: continue
+            for job in list(jobs.values()):
+                # The clock only runs while a worker is busy with the file, so batches
+                # queued behind other files do not count against it
+                if any(f.running() for f in job.futures):
+                    job.active += elapsed
+                if job.active > self.file_timeout:
+                    for fut in job.futures:
+                        fut.cancel()
+                        owner.pop(fut, None)
+
+    def _timeout(self, job: _FileJob) -> ExtractionProgress:
+        print(f"PDF Error ({job.path}): extraction exceeded {self.file_timeout}s, skipped")
+        return ExtractionProgress(job.path, job.pages_done, job.pages_total, error="timeout")
+
+    @staticmethod
+    def _assemble(job: _FileJob) -> List[Dict[str, Any]]:
+        filename = os.path.basename(job.path)
+        return [
+            {"source": filename, "page_num": page_num, "text": text}
+            for start in sorted(job.batches)
+            for page_num, text in job.batches[start]
+        ]
+
+    @staticmethod
+    def _safe_count(path: str) -> int:
+        try:
+            return PDFProcessor.count_pages(path)
+        except Exception as e:
+            print(f"PDF Error ({path}): {e}")
+            return 0
@@ -0,0 +1,105 @@
+import os
+import json
+import pickle
+import hashlib
+from typing import List, Dict, Any
+
+class LibraryManifest:
+    """
+    Per-document bookkeeping for the PDF library.
+    Tracks (path, size, mtime, content hash) for every manual and keeps the
+    extracted pages of each one in its own shard, so only added or changed
+    manuals have to be parsed again.
+    """
+    FILENAME = "manifest.json"
+    SHARD_DIR = "shards"
+    HASH_CHUNK = 1024 * 1024
+
+    def __init__(self, cache_dir: str, variant: str = ""):
+        """variant: extraction settings (e.g. chunking); shards and signature depend on it."""
+        self.cache_dir = cache_dir
+        self.variant = variant
+        self.path = os.path.join(cache_dir, self.FILENAME)
+        self.shard_dir = os.path.join(cache_dir, self.SHARD_DIR)
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path): return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("documents", {})
+        except Exception as e:
+            print(f"Manifest Error ({self.path}): {e}")
+            return {}
+
+    def refresh(self, files: List[str]):
+        """Syncs entries with the files on disk. Content is only hashed when size or mtime moved."""
+        entries = {}
+        for path in files:
+            stat = os.stat(path)
+            entry = self.entries.get(path)
+            if not entry or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                entry = {
+                    "path": path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "hash": self._hash_file(path)
+                }
+            entries[path] = entry
+        self.entries = entries
+
+    def _hash_file(self, path: str) -> str:
+        hasher = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def signature(self) -> str:
+        """Identifies the library content as a whole (independent of mtimes)."""
+        hasher = hashlib.md5(self.variant.encode())
+        for path in sorted(self.entries):
+            hasher.update(f"{os.path.basename(path)}:{self.entries[path]['hash']};".encode())
+        return hasher.hexdigest()
+
+    def _shard_name(self, path: str) -> str:
+        # Page records carry the filename, so a renamed copy gets its own shard
+        key = f"{os.path.basename(path)}:{self.entries[path]['hash']}:{self.variant}"
+        return hashlib.md5(key.encode()).hexdigest() + ".pkl"
+
+    def shard_path(self, path: str) -> str:
+        return os.path.join(self.shard_dir, self._shard_name(path))
+
+    def stale_files(self) -> List[str]:
+        """Documents without an up-to-date extracted shard."""
+        return [path for path in sorted(self.entries) if not os.path.exists(self.shard_path(path))]
+
+    def load_shard(self, path: str) -> List[Dict[str, Any]]:
+        with open(self.shard_path(path), "rb") as f:
+            return pickle.load(f)
+
+    def save_shard(self, path: str, pages: List[Dict[str, Any]]):
+        self._atomic_write(self.shard_path(path), pickle.dumps(pages, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def save(self):
+        payload = json.dumps({"documents": self.entries}, indent=2).encode("utf-8")
+        self._atomic_write(self.path, payload)
+        self._prune_shards()
+
+    def _prune_shards(self):
+        """Drops shards of removed or changed documents."""
+        live = {self._shard_name(path) for path in self.entries}
+        for name in os.listdir(self.shard_dir):
+            if name not in live:
+                try:
+                    os.remove(os.path.join(self.shard_dir, name))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _atomic_write(path: str, payload: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
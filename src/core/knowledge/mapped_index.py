@@ -0,0 +1,94 @@
+import os
+import mmap
+import errno
+import json
+import shutil
+import numpy as np
+from typing import Dict, Any, Sequence, Tuple
+from src.core.knowledge.pages import PageStore
+
+FORMAT_VERSION = 2
+META_FILE = "meta.json" # Written last, marks a complete index
+
+def save_index(path: str, pages: Sequence[Dict[str, Any]], scorer, code_index: Dict[str, Sequence[int]]):
+    """Writes the index into `path` atomically (built in a temp dir, then renamed)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # 1. Pages: offset-indexed text blob + columnar metadata
+    store = pages if isinstance(pages, PageStore) else PageStore.from_records(pages)
+    with open(os.path.join(tmp_path, "texts.bin"), "wb") as f:
+        f.write(store.buffer)
+    save_arrays(tmp_path, offsets=store.offsets, page_nums=store.page_nums, source_ids=store.source_ids)
+    save_json(tmp_path, "sources.json", store.sources)
+
+    # 2. Ranking engine state (raw CSR arrays + vocabulary, see scoring.py)
+    scorer.save(tmp_path)
+
+    # 3. Code index flattened into CSR-like postings
+    codes = sorted(code_index)
+    code_ptr = np.zeros(len(codes) + 1, dtype=np.int64)
+    for i, code in enumerate(codes):
+        code_ptr[i + 1] = code_ptr[i] + len(code_index[code])
+    postings = [np.asarray(code_index[c], dtype=np.int32) for c in codes]
+    code_pages = np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32)
+    save_json(tmp_path, "codes.json", codes)
+    save_arrays(tmp_path, code_ptr=code_ptr, code_pages=code_pages)
+
+    save_json(tmp_path, META_FILE, {"version": FORMAT_VERSION, "scorer": scorer.name})
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError as e:
+        if e.errno not in (errno.EEXIST, errno.ENOTEMPTY): raise
+        # Another process finished the same index first; theirs is identical
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def is_complete(path: str, scorer_name: str) -> bool:
+    if not os.path.exists(os.path.join(path, META_FILE)): return False
+    try:
+        meta = load_json(path, META_FILE)
+        return meta.get("version") == FORMAT_VERSION and meta.get("scorer") == scorer_name
+    except Exception:
+        return False
+
+def load_index(path: str, scorer_cls) -> Tuple[PageStore, Any, Dict[str, np.ndarray]]:
+    """Opens an index written by save_index. Arrays are memory-mapped, nothing is copied."""
+    pages = PageStore(
+        _map_blob(os.path.join(path, "texts.bin")),
+        load_array(path, "offsets"),
+        load_array(path, "page_nums"),
+        load_array(path, "source_ids"),
+        load_json(path, "sources.json")
+    )
+
+    scorer = scorer_cls.load(path)
+
+    code_ptr, code_pages = load_array(path, "code_ptr"), load_array(path, "code_pages")
+    code_index = {
+        code: code_pages[code_ptr[i]:code_ptr[i + 1]]
+        for i, code in enumerate(load_json(path, "codes.json"))
+    }
+    return pages, scorer, code_index
+
+def _map_blob(path: str):
+    if os.path.getsize(path) == 0: return b""
+    with open(path, "rb") as f:
+        # The mapping stays valid after the file object is closed
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def save_arrays(path: str, **arrays: np.ndarray):
+    for name, arr in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arr))
+
+def load_array(path: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+def save_json(path: str, name: str, obj: Any):
+    with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+def load_json(path: str, name: str) -> Any:
+    with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,96 @@
+import sys
+import numpy as np
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List
+
+PAGE_FIELDS = ("source", "page_num", "text")
+
+class PageRef(Mapping):
+    """
+    Lightweight read-only view of one page in a PageStore.
+    Behaves like the old page dict (doc['source'], doc['page_num'], doc['text'])
+    but only holds a reference to the store and a row number.
+    """
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store: "PageStore", idx: int):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "text": return self._store.text(self._idx)
+        if key == "source": return self._store.source(self._idx)
+        if key == "page_num": return self._store.page_num(self._idx)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(PAGE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(PAGE_FIELDS)
+
+    @property
+    def page_id(self) -> int:
+        return self._idx
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"PageRef({self['source']!r}, p.{self['page_num']})"
+
+class PageStore(Sequence):
+    """
+    Columnar page storage: page numbers and source ids in NumPy arrays, a
+    source-name table, and all texts in one UTF-8 buffer addressed by offsets.
+    The buffer may be bytes (freshly built) or an mmap (loaded index).
+    """
+    def __init__(self, buffer, offsets: np.ndarray, page_nums: np.ndarray,
+                 source_ids: np.ndarray, sources: List[str]):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.page_nums = page_nums
+        self.source_ids = source_ids
+        self.sources = [sys.intern(s) for s in sources]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping]) -> "PageStore":
+        buffer = bytearray()
+        offsets, page_nums, source_ids = [0], [], []
+        sources: Dict[str, int] = {}
+        for record in records:
+            buffer += record["text"].encode("utf-8")
+            offsets.append(len(buffer))
+            page_nums.append(record["page_num"])
+            source_ids.append(sources.setdefault(record["source"], len(sources)))
+        return cls(
+            bytes(buffer),
+            np.array(offsets, dtype=np.int64),
+            np.array(page_nums, dtype=np.int32),
+            np.array(source_ids, dtype=np.int32),
+            list(sources)
+        )
+
+    def __len__(self) -> int:
+        return len(self.page_nums)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [PageRef(self, i) for i in range(*idx.indices(len(self)))]
+        idx = int(idx)
+        if idx < 0: idx += len(self)
+        if not 0 <= idx < len(self): raise IndexError(idx)
+        return PageRef(self, idx)
+
+    def text(self, idx: int) -> str:
+        return self.buffer[int(self.offsets[idx]):int(self.offsets[idx + 1])].decode("utf-8")
+
+    def source(self, idx: int) -> str:
+        return self.sources[self.source_ids[idx]]
+
+    def page_num(self, idx: int) -> int:
+        return int(self.page_nums[idx])
+
+    def texts(self) -> Iterator[str]:
+        for idx in range(len(self)):
+            yield self.text(idx)
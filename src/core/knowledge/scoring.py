@@ -0,0 +1,145 @@
+from abc import ABC, abstractmethod
+import numpy as np
+from typing import Iterable, List, Optional
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from src.core.knowledge.mapped_index import save_arrays, load_array, save_json, load_json
+
+class Scorer(ABC):
+    """
+    Ranked retrieval engine behind KnowledgeBase.search.
+    `score` returns a (queries x pages) sparse matrix; only entries above
+    `threshold` are considered hits. Engines with `fuse_codes` have their
+    ranking fused with the exact code matches instead of only topping them up.
+    """
+    name = "base"
+    threshold = 0.0
+    fuse_codes = False
+
+    @abstractmethod
+    def fit(self, texts: Iterable[str]) -> "Scorer": ...
+
+    @abstractmethod
+    def score(self, queries: List[str]) -> csr_matrix: ...
+
+    @abstractmethod
+    def save(self, path: str): ...
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path: str) -> "Scorer": ...
+
+class TfidfScorer(Scorer):
+    """Cosine similarity over L2-normalized TF-IDF rows (the original fallback)."""
+    name = "tfidf"
+    threshold = 0.15
+
+    def __init__(self, vectorizer: Optional[TfidfVectorizer] = None, vectors: Optional[csr_matrix] = None):
+        self.vectorizer = vectorizer
+        self.vectors = vectors
+
+    def fit(self, texts: Iterable[str]) -> "TfidfScorer":
+        self.vectorizer = TfidfVectorizer()
+        self.vectors = self.vectorizer.fit_transform(texts)
+        return self
+
+    def score(self, queries: List[str]) -> csr_matrix:
+        # Rows are L2-normalized, so the dot product is the cosine similarity.
+        # pages x queries keeps the (large) corpus matrix in CSR, no per-call conversion.
+        query_vecs = self.vectorizer.transform(queries)
+        return (self.vectors @ query_vecs.T).T.tocsr()
+
+    def save(self, path: str):
+        _save_vocabulary(path, "vocab.json", self.vectorizer.vocabulary_)
+        save_arrays(path, idf=self.vectorizer.idf_, data=self.vectors.data,
+                    indices=self.vectors.indices, indptr=self.vectors.indptr)
+        save_json(path, "tfidf.json", {"shape": list(self.vectors.shape)})
+
+    @classmethod
+    def load(cls, path: str) -> "TfidfScorer":
+        meta = load_json(path, "tfidf.json")
+        vectors = csr_matrix(
+            (load_array(path, "data"), load_array(path, "indices"), load_array(path, "indptr")),
+            shape=tuple(meta["shape"]), copy=False
+        )
+        vectorizer = TfidfVectorizer()
+        vectorizer.vocabulary_ = _load_vocabulary(path, "vocab.json")
+        vectorizer.idf_ = np.array(load_array(path, "idf"))
+        return cls(vectorizer, vectors)
+
+class BM25Scorer(Scorer):
+    """
+    Okapi BM25 with precomputed postings.
+    Postings are a term-major CSR (term_ptr / doc_ids / weights) whose weights
+    already hold idf * saturated tf, so scoring a batch of queries is one
+    sparse accumulate: binary query-term matrix @ postings.
+    """
+    name = "bm25"
+    threshold = 0.0
+    fuse_codes = True
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.analyzer: Optional[CountVectorizer] = None
+        self.postings: Optional[csr_matrix] = None
+
+    def fit(self, texts: Iterable[str]) -> "BM25Scorer":
+        self.analyzer = CountVectorizer()
+        counts = self.analyzer.fit_transform(texts).tocsc()  # columns = terms
+        n_docs = counts.shape[0]
+        doc_len = np.asarray(counts.sum(axis=1)).ravel().astype(np.float32)
+        avg_len = doc_len.mean() if n_docs else 1.0
+        df = np.diff(counts.indptr)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        tf = counts.data.astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len[counts.indices] / avg_len)
+        term_of_entry = np.repeat(np.arange(len(df)), df)
+        weights = idf[term_of_entry] * tf * (self.k1 + 1) / (tf + norm)
+
+        # CSC of (docs x terms) is exactly the CSR of (terms x docs)
+        self.postings = csr_matrix(
+            (weights, counts.indices, counts.indptr),
+            shape=(counts.shape[1], n_docs)
+        )
+        return self
+
+    def score(self, queries: List[str]) -> csr_matrix:
+        query_terms = self.analyzer.transform(queries)
+        query_terms.data[:] = 1  # each query term counts once
+        return (query_terms.astype(np.float32) @ self.postings).tocsr()
+
+    def save(self, path: str):
+        _save_vocabulary(path, "bm25_vocab.json", self.analyzer.vocabulary_)
+        save_arrays(path, bm25_term_ptr=self.postings.indptr, bm25_doc_ids=self.postings.indices,
+                    bm25_weights=self.postings.data)
+        save_json(path, "bm25.json", {"shape": list(self.postings.shape), "k1": self.k1, "b": self.b})
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Scorer":
+        meta = load_json(path, "bm25.json")
+        scorer = cls(k1=meta["k1"], b=meta["b"])
+        scorer.analyzer = CountVectorizer()
+        scorer.analyzer.vocabulary_ = _load_vocabulary(path, "bm25_vocab.json")
+        scorer.postings = csr_matrix(
+            (load_array(path, "bm25_weights"), load_array(path, "bm25_doc_ids"), load_array(path, "bm25_term_ptr")),
+            shape=tuple(meta["shape"]), copy=False
+        )
+        return scorer
+
+SCORERS = {cls.name: cls for cls in (TfidfScorer, BM25Scorer)}
+
+def create_scorer(name: str) -> Scorer:
+    if name not in SCORERS:
+        raise ValueError(f"Unknown retrieval engine '{name}' (choose from {', '.join(SCORERS)})")
+    return SCORERS[name]()
+
+def _save_vocabulary(path: str, name: str, vocabulary: dict):
+    terms = [""] * len(vocabulary)
+    for term, col in vocabulary.items():
+        terms[col] = term
+    save_json(path, name, terms)
+
+def _load_vocabulary(path: str, name: str) -> dict:
+    return {term: col for col, term in enumerate(load_json(path, name))}
@@ -1,19 +1,44 @@
 import os
 import re
-import pickle
-import hashlib
-from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import shutil
+import bisect
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Sequence, Mapping
 from src.config import settings
-from src.core.knowledge.ingestion import PDFProcessor
+from src.core.knowledge.ingestion import ParallelExtractor, Chunker, CODE_PATTERN
+from src.core.knowledge.manifest import LibraryManifest
+from src.core.knowledge import mapped_index
+from src.core.knowledge.pages import PageStore
+from src.core.knowledge.scoring import Scorer, create_scorer
+
+MAX_RESULTS = 5
+# Letter + digits with no word boundary: a code occurs in a text exactly when it is a
+# prefix of one of these runs ("F01662" in "F016620", "alarmF01662", "F01662_x")
+CODE_RUN = re.compile(r'[A-Z]\d{3,}')
+RRF_K = 60 # Reciprocal-rank fusion constant
+
+@dataclass
+class CodeSearchResult:
+    docs: Dict[str, List[Mapping]]      # code -> retrieved documents (same as search(code))
+    hit_counts: Dict[str, int]       # code -> number of pages containing the code
 
 class KnowledgeBase:
-    def __init__(self):
-        self.pages: List[Dict] = []
-        self.vectorizer = None
-        self.vectors = None
+    def __init__(self, scorer: Optional[Scorer] = None, pages: Optional[Sequence[Mapping]] = None):
+        """
+        scorer: ranking engine (defaults to settings.RETRIEVAL_ENGINE).
+        pages: index these records in memory instead of loading the PDF library.
+        """
+        self.pages: Sequence[Mapping] = []  # PageStore once loaded; one record per chunk when chunking
+        self.scorer: Scorer = scorer or create_scorer(settings.RETRIEVAL_ENGINE)
+        self.is_fitted = False
+        self.code_index: Optional[Dict[str, Sequence[int]]] = None
+        self._code_keys: Optional[tuple] = None # (code_index, its sorted keys)
+
+        if pages is not None:
+            self.pages = PageStore.from_records(pages)
+            if self.pages: self._fit()
+            return
         
         if not os.path.exists(settings.CACHE_DIR):
             os.makedirs(settings.CACHE_DIR)
@@ -24,67 +49,210 @@ class KnowledgeBase:
         files = [os.path.join(settings.SOURCES_DIR, f) for f in os.listdir(settings.SOURCES_DIR) if f.lower().endswith('.pdf')]
         if not files: return
 
-        lib_hash = self._compute_hash(files)
-        cache_path = os.path.join(settings.CACHE_DIR, f"library_{lib_hash}.pkl")
+        chunker = Chunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP) if settings.CHUNK_SIZE > 0 else None
+        variant = f"chunks{settings.CHUNK_SIZE}-{settings.CHUNK_OVERLAP}" if chunker else "pages"
+        manifest = LibraryManifest(settings.CACHE_DIR, variant=variant)
+        manifest.refresh(files)
+        index_path = os.path.join(settings.CACHE_DIR, f"index_{manifest.signature()}_{self.scorer.name}")
 
-        if os.path.exists(cache_path):
-            self._load_cache(cache_path)
+        if mapped_index.is_complete(index_path, self.scorer.name):
+            self._load_cache(index_path)
         else:
-            self._build_index(files, cache_path)
+            self._build_index(manifest, index_path, chunker)
+            self._prune_library_caches(keep=index_path)
+        manifest.save()
 
-    def _compute_hash(self, files: List[str]) -> str:
-        hasher = hashlib.md5()
-        for path in sorted(files):
-            hasher.update(str(os.path.getmtime(path)).encode())
-        return hasher.hexdigest()
+    def _prune_library_caches(self, keep: str):
+        """Removes superseded indexes (and legacy pickle caches)."""
+        for name in os.listdir(settings.CACHE_DIR):
+            path = os.path.join(settings.CACHE_DIR, name)
+            if path == keep: continue
+            if name.startswith("index_") and name.endswith(".tmp"):
+                # Another process's build in progress (index_<sig>_<scorer>.<pid>.tmp);
+                # only leftovers of processes that died are removed
+                if not self._pid_alive(name.rsplit(".", 2)[-2]):
+                    shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith("index_") and os.path.isdir(path):
+                # Processes still mapping the old files keep their view on POSIX
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith("library_") and name.endswith(".pkl"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _pid_alive(pid: str) -> bool:
+        try:
+            os.kill(int(pid), 0)
+        except (ValueError, ProcessLookupError):
+            return False
+        except OSError:
+            return True # exists, owned by someone else
+        return True
 
     def _load_cache(self, path: str):
         print(f"⚡ Loading cache: {path}")
-        with open(path, "rb") as f:
-            data = pickle.load(f)
-            self.pages, self.vectorizer, self.vectors = data["pages"], data["vectorizer"], data["vectors"]
-
-    def _build_index(self, files: List[str], cache_path: str):
-        print("⚙️ Processing PDFs...")
-        with ThreadPoolExecutor() as executor:
-            results = list(executor.map(PDFProcessor.extract_content, files))
-        
-        for p in results: self.pages.extend(p)
+        self.pages, self.scorer, self.code_index = mapped_index.load_index(path, type(self.scorer))
+        self.is_fitted = True
+
+    def _build_index(self, manifest: LibraryManifest, index_path: str, chunker: Optional[Chunker] = None):
+        stale = manifest.stale_files()
+        print(f"⚙️ Processing PDFs ({len(stale)} of {len(manifest.entries)} changed)...")
+        extractor = ParallelExtractor(
+            mode=settings.INGEST_MODE,
+            workers=settings.INGEST_WORKERS,
+            file_timeout=settings.INGEST_FILE_TIMEOUT,
+            batch_pages=settings.INGEST_BATCH_PAGES,
+            chunker=chunker
+        )
+        failed, finished = set(), 0
+        for progress in extractor.extract(stale):
+            if not progress.finished: continue
+            finished += 1
+            name = os.path.basename(progress.path)
+            if progress.error:
+                failed.add(progress.path)
+                print(f"   ❌ [{finished}/{len(stale)}] {name}: {progress.error}")
+            else:
+                manifest.save_shard(progress.path, progress.pages)
+                print(f"   📄 [{finished}/{len(stale)}] {name} ({len(progress.pages)} records)")
+
+        # Unchanged manuals come straight from their shards, one at a time
+        self.pages = PageStore.from_records(
+            page
+            for path in sorted(manifest.entries) if path not in failed
+            for page in manifest.load_shard(path)
+        )
         
-        if self.pages:
-            try:
-                self.vectorizer = TfidfVectorizer()
-                self.vectors = self.vectorizer.fit_transform([p['text'] for p in self.pages])
-                with open(cache_path, "wb") as f:
-                    pickle.dump({"pages": self.pages, "vectorizer": self.vectorizer, "vectors": self.vectors}, f)
-            except Exception as e:
-                print(f"Vectorization Error: {e}")
+        if self.pages and self._fit():
+            if failed:
+                # Leave the library uncached so failed manuals are retried on next start
+                print(f"⚠️ {len(failed)} PDF(s) failed, library cache not written.")
+                return
+            mapped_index.save_index(index_path, self.pages, self.scorer, self.code_index)
+            # Serve from the mapped files so this process shares memory with the others
+            self._load_cache(index_path)
 
-    def search(self, query: str, top_k: int = 3) -> List[Dict]:
-        if not self.pages: return []
-        results, seen = [], set()
+    def _fit(self) -> bool:
+        self.code_index = self._build_code_index(self.pages)
+        try:
+            self.scorer.fit(self.pages.texts())
+            self.is_fitted = True
+        except Exception as e:
+            print(f"Vectorization Error: {e}")
+        return self.is_fitted
 
-        # 1. Regex Search
-        codes = re.findall(r'\b[A-Z]\d{3,7}\b', query.upper())
+    @staticmethod
+    def _build_code_index(pages: Sequence[Mapping]) -> Dict[str, List[int]]:
+        """Inverted index: code run (see CODE_RUN) -> ascending page ids containing it."""
+        index: Dict[str, List[int]] = {}
+        for idx, page in enumerate(pages):
+            for run in set(CODE_RUN.findall(page['text'])):
+                index.setdefault(run, []).append(idx)
+        return dict(sorted(index.items()))
+
+    def _sorted_codes(self) -> List[str]:
+        if self.code_index is None:
+            self.code_index = self._build_code_index(self.pages)
+        if self._code_keys is None or self._code_keys[0] is not self.code_index:
+            self._code_keys = (self.code_index, sorted(self.code_index))
+        return self._code_keys[1]
+
+    def _pages_with_code(self, code: str) -> List[int]:
+        # Codes shaped like alarm tokens resolve through the index: the runs they
+        # prefix are adjacent in sorted order, so this matches the substring scan
+        # in O(log n + hits). Free-form single words keep the scan.
+        if CODE_PATTERN.fullmatch(code):
+            keys = self._sorted_codes()
+            i = bisect.bisect_left(keys, code)
+            postings = []
+            while i < len(keys) and keys[i].startswith(code):
+                postings.append(self.code_index[keys[i]])
+                i += 1
+            if len(postings) == 1: return postings[0]
+            return sorted({int(idx) for ids in postings for idx in ids})
+        return [idx for idx, page in enumerate(self.pages) if code in page['text']]
+
+    def _code_hits(self, query: str) -> List[int]:
+        """Regex stage: ordered, de-duplicated ids of pages containing the query's codes."""
+        hits, seen = [], set()
+        codes = CODE_PATTERN.findall(query.upper())
         if not codes and " " not in query.strip() and len(query) > 3:
             codes = [query.strip()]
 
         for code in codes:
-            for idx, page in enumerate(self.pages):
-                if code in page['text'] and idx not in seen:
-                    results.append(page)
+            for idx in self._pages_with_code(code):
+                idx = int(idx)
+                if idx not in seen:
+                    hits.append(idx)
                     seen.add(idx)
+        return hits
+
+    @staticmethod
+    def _top_k(cols: np.ndarray, scores: np.ndarray, k: int, exclude: List[int], threshold: float) -> List[int]:
+        """Best `k` columns above the threshold, without sorting the whole row."""
+        mask = scores > threshold
+        if exclude:
+            mask &= ~np.isin(cols, exclude)
+        cols, scores = cols[mask], scores[mask]
+        if k <= 0 or not len(cols): return []
+        if len(cols) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            cols, scores = cols[part], scores[part]
+        return [int(c) for c in cols[np.argsort(-scores, kind="stable")]]
+
+    @staticmethod
+    def _fuse(*rankings: List[int]) -> List[int]:
+        """Reciprocal-rank fusion of several ranked page-id lists."""
+        fused: Dict[int, float] = {}
+        for ranking in rankings:
+            for rank, idx in enumerate(ranking):
+                fused[idx] = fused.get(idx, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(fused, key=lambda idx: -fused[idx])
+
+    def search(self, query: str, top_k: int = 3) -> List[Mapping]:
+        return self.search_many([query], top_k)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 3) -> List[List[Mapping]]:
+        """
+        Batched search: regex stage per query, then one scorer pass (one
+        transform + one sparse matmul) for every query that needs ranked results.
+        """
+        if not self.pages: return [[] for _ in queries]
 
-        # 2. Vector Search (Fallback)
-        if self.vectorizer and len(results) < 5:
+        # 1. Regex Search
+        hits = [self._code_hits(q) for q in queries]
+
+        # 2. Ranked Search: tops up code hits, or is fused with them (scorer.fuse_codes)
+        fuse = self.scorer.fuse_codes
+        pending = [i for i, h in enumerate(hits) if fuse or len(h) < MAX_RESULTS]
+        if self.is_fitted and pending:
             try:
-                vec = self.vectorizer.transform([query])
-                sims = cosine_similarity(vec, self.vectors).flatten()
-                for idx in sims.argsort()[::-1]:
-                    if len(results) >= 5: break
-                    if idx not in seen and sims[idx] > 0.15:
-                        results.append(self.pages[idx])
-                        seen.add(idx)
+                scores = self.scorer.score([queries[i] for i in pending])
+                for row, i in enumerate(pending):
+                    start, end = scores.indptr[row], scores.indptr[row + 1]
+                    cols, vals = scores.indices[start:end], scores.data[start:end]
+                    if fuse:
+                        ranked = self._top_k(cols, vals, MAX_RESULTS * 2, [], self.scorer.threshold)
+                        hits[i] = self._fuse(hits[i], ranked)
+                    else:
+                        hits[i] += self._top_k(cols, vals, MAX_RESULTS - len(hits[i]), hits[i],
+                                               self.scorer.threshold)
             except Exception: pass
-            
-        return results[:5]
+
+        return [[self.pages[idx] for idx in h[:MAX_RESULTS]] for h in hits]
+
+    def search_codes(self, codes: List[str]) -> CodeSearchResult:
+        """Bulk retrieval for many alarm codes in one pass (used by the cache warmer)."""
+        unique = list(dict.fromkeys(codes))
+        docs = self.search_many(unique)
+        return CodeSearchResult(
+            docs=dict(zip(unique, docs)),
+            hit_counts={code: len(self._pages_with_code(code)) for code in unique} if self.pages else {}
+        )
+
+    def code_hit_counts(self) -> Dict[str, int]:
+        """Corpus-wide page counts for every alarm code found in the library."""
+        if not self.pages: return {}
+        return {code: len(self._pages_with_code(code)) for code in self._sorted_codes() if CODE_PATTERN.fullmatch(code)}
@@ -0,0 +1,180 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from openai import APIError, APIStatusError
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+class NoHealthyBackend(Exception):
+    """Every backend's circuit is open."""
+
+class LLMBackend:
+    """
+    One OpenAI-compatible endpoint (an Ollama host) plus its routing state.
+    Circuit breaker: `failure_threshold` consecutive API errors open the
+    circuit for `cooldown` seconds; afterwards one trial request (half-open)
+    decides whether it closes again or re-opens.
+    """
+    def __init__(self, base_url: str, client: Any, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.latency_ewma = 0.0
+        self.output_chars = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0: return CLOSED
+        return OPEN if time.monotonic() < self.open_until else HALF_OPEN
+
+    @property
+    def available(self) -> bool:
+        state = self.state
+        # Half-open: a single trial request at a time
+        return state == CLOSED or (state == HALF_OPEN and self.outstanding == 0)
+
+    def record_success(self, elapsed: float, output_chars: int = 0):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.healthy = True
+        self.latency_ewma = elapsed if self.requests == 1 else 0.8 * self.latency_ewma + 0.2 * elapsed
+        self.output_chars += output_chars
+        self.busy_seconds += elapsed
+
+    def record_failure(self, elapsed: float):
+        self.requests += 1
+        self.errors += 1
+        self.consecutive_failures += 1
+        self.busy_seconds += elapsed
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"LLM backend {self.base_url} circuit opened for {self.cooldown:.0f}s")
+            self.open_until = time.monotonic() + self.cooldown
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.base_url,
+            "state": self.state,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ewma_s": round(self.latency_ewma, 3),
+            "chars_per_s": round(self.output_chars / self.busy_seconds, 1) if self.busy_seconds else 0.0
+        }
+
+class BackendPool:
+    """
+    Routes LLM requests over several OpenAI-compatible endpoints.
+    - Least outstanding requests wins; ties go to the lower latency EWMA,
+      then to the configured order.
+    - A backend that fails a health check (GET /models) is only used when
+      no healthy one is available; a backend with an open circuit is never
+      used until its cooldown has passed.
+    - A request that fails with a server-side API error is retried once on
+      every other backend, as long as `retryable()` still allows it (a
+      streamed answer that already reached the user is not restarted).
+    Everything runs on the LLM gateway's event loop, so the counters need no lock.
+    """
+    def __init__(self, urls: Sequence[str], client_factory: Callable[..., Any], api_key: str = "ollama",
+                 failure_threshold: int = 3, cooldown: float = 30.0, health_interval: float = 15.0,
+                 health_timeout: float = 5.0):
+        if not urls:
+            raise ValueError("BackendPool needs at least one URL")
+        # With a pool, failing over beats the client's own retries against the same host
+        retries = 2 if len(urls) == 1 else 0
+        self.backends: List[LLMBackend] = [
+            LLMBackend(url, client_factory(base_url=url, api_key=api_key, max_retries=retries),
+                       failure_threshold, cooldown)
+            for url in urls
+        ]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._health_task: Optional[asyncio.Task] = None
+
+    def pick(self, exclude: Sequence[LLMBackend] = ()) -> LLMBackend:
+        candidates = [b for b in self.backends if b not in exclude and b.available]
+        if not candidates:
+            raise NoHealthyBackend(f"No LLM backend available ({len(self.backends)} configured)")
+        healthy = [b for b in candidates if b.healthy] or candidates
+        return min(healthy, key=lambda b: (b.outstanding, b.latency_ewma))
+
+    async def call(self, fn: Callable[[Any], Awaitable[Any]],
+                   retryable: Callable[[], bool] = lambda: True) -> Any:
+        """Runs `fn(client)` on the chosen backend, failing over on server-side API errors."""
+        self._ensure_health_checks()
+        tried: List[LLMBackend] = []
+        while True:
+            backend = self.pick(exclude=tried)
+            backend.outstanding += 1
+            start = time.monotonic()
+            try:
+                result = await fn(backend.client)
+            except APIError as e:
+                elapsed = time.monotonic() - start
+                if not self._server_side(e):
+                    backend.record_success(elapsed) # The host answered; the request itself was wrong
+                    raise
+                backend.record_failure(elapsed)
+                tried.append(backend)
+                if not retryable() or not any(b.available for b in self.backends if b not in tried):
+                    raise
+                logger.warning(f"LLM backend {backend.base_url} failed ({e}), failing over")
+                continue
+            finally:
+                backend.outstanding -= 1
+            backend.record_success(time.monotonic() - start, len(result) if isinstance(result, str) else 0)
+            return result
+
+    async def check_health(self):
+        """Probes every backend; a passing probe also closes an expired circuit."""
+        async def probe(backend: LLMBackend):
+            try:
+                await asyncio.wait_for(backend.client.models.list(), self.health_timeout)
+                if not backend.healthy:
+                    logger.info(f"LLM backend {backend.base_url} is healthy again")
+                backend.healthy = True
+                if backend.state == HALF_OPEN:
+                    backend.open_until = 0.0
+                    backend.consecutive_failures = 0
+            except Exception as e:
+                if backend.healthy:
+                    logger.warning(f"LLM backend {backend.base_url} failed its health check: {e}")
+                backend.healthy = False
+        await asyncio.gather(*(probe(b) for b in self.backends))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [b.stats() for b in self.backends]
+
+    def close(self):
+        if self._health_task is not None:
+            self._health_task.get_loop().call_soon_threadsafe(self._health_task.cancel)
+            self._health_task = None
+
+    def _ensure_health_checks(self):
+        # Started lazily from the first call, i.e. on the loop that serves the requests.
+        # A single backend has nowhere to fail over to, so it is not probed.
+        if self._health_task is None and self.health_interval > 0 and len(self.backends) > 1:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    @staticmethod
+    def _server_side(e: APIError) -> bool:
+        # Connection errors and timeouts carry no status; 4xx means the host is fine
+        return not isinstance(e, APIStatusError) or e.status_code >= 500 or e.status_code == 429
@@ -1,17 +1,21 @@
 import json
 import threading
 import time
-import requests
 import websocket
+from typing import Dict, Iterable, List, Optional
 from src.config import settings
+from src.core.http_client import get_tb_client
+from src.core.telemetry_store import TelemetryStore, TelemetryEvent
 from src.utils import clean_telemetry_payload
 
+PAYLOAD_KEY = "llm_payload"
+
 class IoTClient:
     _instance = None
     _lock = threading.Lock()
-    _data_lock = threading.Lock()
+    _sub_lock = threading.Lock()
 
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(IoTClient, cls).__new__(cls)
@@ -20,42 +24,54 @@ class IoTClient:
 
     def __init__(self):
         if self._initialized: return
-        self.data = {}
+        self.store = TelemetryStore(history=settings.TELEMETRY_HISTORY)
         self.is_connected = False
         self.token = None
         self.ws = None
         self._initialized = True
-        
-        # Eğer Docker değilse 127.0.0.1 çalışır. 
+
+        # One WebSocket multiplexes every device: cmdId -> device id
+        self.device_ids: List[str] = list(settings.device_ids)
+        self.keys: List[str] = list(settings.telemetry_keys)
+        self._subscriptions: Dict[int, str] = {}
+
+        # Eğer Docker değilse 127.0.0.1 çalışır.
         # Verifier çalıştığına göre burası doğru.
-        self.local_base_url = "http://127.0.0.1:9090"
-        self.local_ws_url = "ws://127.0.0.1:9090"
-        
+        self.http = get_tb_client()
+        self.local_ws_url = settings.TB_INTERNAL_URL.replace("http", "ws", 1)
+
         self._start_background_worker()
 
     def _get_token(self):
         try:
-            resp = requests.post(
-                f"{self.local_base_url}/api/auth/login",
+            resp = self.http.post(
+                "/api/auth/login",
+                endpoint="auth_login",
                 json={"username": settings.TB_USER, "password": settings.TB_PASS},
                 timeout=5
             )
             return resp.json().get("token") if resp.status_code == 200 else None
         except Exception: return None
 
-    def _fetch_snapshot(self):
+    def _fetch_snapshot(self, device_ids: Optional[Iterable[str]] = None):
         """İlk bağlantıda son veriyi HTTP ile çek (Hızlı Başlangıç)"""
         if not self.token: return
+        for device_id in (device_ids or self.device_ids):
+            self._fetch_device_snapshot(device_id)
+
+    def _fetch_device_snapshot(self, device_id: str):
+        keys = ",".join(self.keys)
         try:
             # DEVICE ID BURADA KULLANILIYOR! YANLIŞSA BURASI PATLAR.
-            url = f"{self.local_base_url}/api/plugins/telemetry/DEVICE/{settings.TB_DEVICE_ID}/values/timeseries?keys=llm_payload"
-            resp = requests.get(url, headers={"X-Authorization": f"Bearer {self.token}"}, timeout=5)
+            url = f"/api/plugins/telemetry/DEVICE/{device_id}/values/timeseries?keys={keys}"
+            resp = self.http.get(url, endpoint="telemetry_snapshot",
+                                 headers={"X-Authorization": f"Bearer {self.token}"}, timeout=5)
             if resp.status_code == 200:
-                val = resp.json().get("llm_payload", [{}])[0].get("value")
-                if val:
-                    clean = clean_telemetry_payload(val)
-                    with self._data_lock:
-                        self.data["llm_payload"] = clean
+                series = resp.json()
+                for key in self.keys:
+                    if series.get(key):
+                        point = series[key][0]
+                        self._store_values(device_id, {key: point.get("value")}, point.get("ts"))
         except Exception: pass
 
     def _ws_loop(self):
@@ -64,12 +80,12 @@ class IoTClient:
             if not self.token:
                 time.sleep(5)
                 continue
-            
+
             # Bağlanmadan önce bir kere snapshot alalım
             self._fetch_snapshot()
-            
+
             ws_url = f"{self.local_ws_url}/api/ws/plugins/telemetry?token={self.token}"
-            
+
             self.ws = websocket.WebSocketApp(
                 ws_url,
                 on_open=self._on_open,
@@ -80,34 +96,98 @@ class IoTClient:
             self.ws.run_forever(ping_interval=30, ping_timeout=10)
             time.sleep(5)
 
+    def _subscription_cmd(self, device_ids: Iterable[str]) -> str:
+        """Builds one tsSubCmds frame; cmdIds are stable per device for the client's lifetime."""
+        cmds = []
+        with self._sub_lock:
+            known = {device: cmd_id for cmd_id, device in self._subscriptions.items()}
+            for device_id in device_ids:
+                cmd_id = known.get(device_id)
+                if cmd_id is None:
+                    cmd_id = len(self._subscriptions) + 1
+                    self._subscriptions[cmd_id] = device_id
+                cmds.append({
+                    "entityType": "DEVICE",
+                    "entityId": device_id,
+                    "scope": "LATEST_TELEMETRY",
+                    "keys": ",".join(self.keys),
+                    "cmdId": cmd_id
+                })
+        return json.dumps({"tsSubCmds": cmds})
+
     def _on_open(self, ws):
         self.is_connected = True
-        # DEVICE ID BURADA DA KULLANILIYOR
-        ws.send(json.dumps({
-            "tsSubCmds": [{
-                "entityType": "DEVICE", 
-                "entityId": settings.TB_DEVICE_ID, 
-                "scope": "LATEST_TELEMETRY", 
-                "cmdId": 1
-            }]
-        }))
+        # Tüm cihazlar tek mesajda abone olur
+        ws.send(self._subscription_cmd(self.device_ids))
 
     def _on_message(self, ws, msg):
         try:
             payload = json.loads(msg)
-            if "data" in payload and "llm_payload" in payload["data"]:
-                raw = payload["data"]["llm_payload"][0][1]
-                clean_val = clean_telemetry_payload(raw)
-                with self._data_lock:
-                    self.data["llm_payload"] = clean_val
+            device_id = self._subscriptions.get(payload.get("subscriptionId"))
+            data = payload.get("data")
+            if device_id and data:
+                # A frame may batch several points per key; replay them in time order
+                points = sorted(((point[0], key, point[1]) for key, series in data.items() for point in series),
+                                key=lambda p: p[0])
+                for ts, key, val in points:
+                    self._store_values(device_id, {key: val}, ts)
         except Exception: pass
 
+    def _store_values(self, device_id: str, values: Dict[str, object], ts_ms: Optional[int] = None):
+        values = {key: val for key, val in values.items() if val is not None}
+        if PAYLOAD_KEY in values:
+            values[PAYLOAD_KEY] = clean_telemetry_payload(values[PAYLOAD_KEY])
+        self.store.update(device_id, values, ts_ms / 1000 if ts_ms else None)
+
     def _start_background_worker(self):
         t = threading.Thread(target=self._ws_loop, daemon=True)
         t.start()
 
-    def get_latest_payload(self) -> str:
-        with self._data_lock:
-            # ARTIK YALAN YOK: Veri yoksa None dönüyor.
-            val = self.data.get("llm_payload", None)
-        return str(val) if val else None
\ No newline at end of file
+    def subscribe(self, device_ids: Iterable[str]):
+        """Adds devices to the shared connection (takes effect immediately when connected)."""
+        with self._sub_lock:
+            new = [d for d in device_ids if d not in self.device_ids]
+            if not new: return
+            # Copy-on-write: the connection thread iterates the old list undisturbed
+            self.device_ids = self.device_ids + new
+        if self.is_connected and self.ws:
+            try:
+                self.ws.send(self._subscription_cmd(new))
+            except Exception: pass
+
+    def get_latest_payloads(self, device_ids: Optional[Iterable[str]] = None, key: str = PAYLOAD_KEY) -> Dict[str, Optional[str]]:
+        """Latest value of `key` for each device; None where nothing was received yet."""
+        values = self.store.get_many(self.device_ids if device_ids is None else device_ids, key)
+        return {device_id: (str(val) if val else None) for device_id, val in values.items()}
+
+    @property
+    def version(self) -> int:
+        """Change counter of the telemetry store (any device, any key)."""
+        return self.store.version
+
+    def wait_for_change(self, version: int, timeout: Optional[float] = None) -> int:
+        return self.store.wait_for_change(version, timeout)
+
+    def read_since(self, seq: int = 0, device_id: Optional[str] = None, key: str = PAYLOAD_KEY) -> List[TelemetryEvent]:
+        """Every buffered value after sequence `seq` (oldest first), for exactly-once processing."""
+        device_id = device_id or (self.device_ids[0] if self.device_ids else "")
+        return self.store.read_since(device_id, key, seq)
+
+    def last_seq(self, device_id: Optional[str] = None, key: str = PAYLOAD_KEY) -> int:
+        """Sequence of the newest buffered value of a series (0 before the first one)."""
+        device_id = device_id or (self.device_ids[0] if self.device_ids else "")
+        return self.store.last_seq(device_id, key)
+
+    def get_latest_payload(self, device_id: Optional[str] = None) -> str:
+        device_id = device_id or (self.device_ids[0] if self.device_ids else "")
+        # ARTIK YALAN YOK: Veri yoksa None dönüyor.
+        return self.get_latest_payloads([device_id])[device_id]
+
+def create_iot_client() -> IoTClient:
+    """Telemetry client for settings.TELEMETRY_ENGINE (thread | asyncio)."""
+    if settings.TELEMETRY_ENGINE == "asyncio":
+        from src.core.telemetry_async import AsyncIoTClient
+        return AsyncIoTClient()
+    if settings.TELEMETRY_ENGINE != "thread":
+        raise ValueError(f"Unknown telemetry engine '{settings.TELEMETRY_ENGINE}' (choose from thread, asyncio)")
+    return IoTClient()
@@ -0,0 +1,167 @@
+import json
+import time
+import random
+import base64
+import asyncio
+import threading
+from typing import Iterable, List, Optional
+from websockets.asyncio.client import connect
+from src.config import settings
+from src.core.telemetry import IoTClient
+
+SUB_BATCH = 500 # Subscription commands per frame
+
+class AsyncIoTClient(IoTClient):
+    """
+    asyncio telemetry engine with the IoTClient interface.
+    One event loop (in a daemon thread) owns the WebSocket:
+    - a reader task pushes frames into a bounded queue; when the parser falls
+      behind, `put` blocks, the socket is no longer read and TCP pushes back
+      on the server instead of memory growing without bound;
+    - reconnects use exponential backoff with full jitter, so many consoles
+      don't stampede ThingsBoard after a restart;
+    - the token is refreshed ahead of its `exp` claim, so a reconnect never
+      starts with an expired token.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, queue_size: Optional[int] = None, reconnect_base: float = 0.5,
+                 reconnect_cap: float = 30.0, refresh_margin: Optional[float] = None):
+        if self._initialized: return
+        self.queue_size = queue_size or settings.TELEMETRY_QUEUE_SIZE
+        self.reconnect_base = reconnect_base
+        self.reconnect_cap = reconnect_cap
+        self.refresh_margin = settings.TELEMETRY_TOKEN_MARGIN if refresh_margin is None else refresh_margin
+        self.token_expiry = 0.0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready = threading.Event()
+        super().__init__()
+
+    # --- Lifecycle ---
+
+    def _start_background_worker(self):
+        t = threading.Thread(target=self._run_loop, daemon=True)
+        t.start()
+        self._ready.wait(timeout=5)
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ready.set()
+        self.loop.run_until_complete(self.run())
+
+    async def run(self):
+        """Connects forever; one iteration per WebSocket session."""
+        attempt = 0
+        refresher = asyncio.ensure_future(self._token_refresher())
+        try:
+            while True:
+                if not await self._ensure_token():
+                    await asyncio.sleep(self.backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                try:
+                    received = await self._session()
+                except Exception as e:
+                    print(f"IoT WS Error: {e}")
+                    received = False
+                self.is_connected = False
+                # A session that delivered data counts as healthy, start over
+                attempt = 0 if received else attempt + 1
+                await asyncio.sleep(self.backoff_delay(attempt))
+        finally:
+            refresher.cancel()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+        return random.uniform(0, min(self.reconnect_cap, self.reconnect_base * (2 ** attempt)))
+
+    # --- Authentication ---
+
+    @staticmethod
+    def token_exp(token: str) -> float:
+        """`exp` claim of a JWT (unverified, only used for scheduling). 0 if absent."""
+        try:
+            body = token.split(".")[1]
+            body += "=" * (-len(body) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(body)).get("exp", 0))
+        except Exception:
+            return 0.0
+
+    async def _ensure_token(self) -> bool:
+        if self.token and time.time() < self.token_expiry - self.refresh_margin:
+            return True
+        return await self._refresh_token()
+
+    async def _refresh_token(self) -> bool:
+        # The pooled REST client is synchronous; keep it off the event loop
+        token = await asyncio.to_thread(self._get_token)
+        if not token: return False
+        self.token = token
+        exp = self.token_exp(token)
+        self.token_expiry = exp if exp else time.time() + 3600
+        return True
+
+    async def _token_refresher(self):
+        while True:
+            wait = self.token_expiry - self.refresh_margin - time.time() if self.token else 0
+            await asyncio.sleep(max(1.0, wait))
+            if self.token and time.time() >= self.token_expiry - self.refresh_margin:
+                await self._refresh_token()
+
+    # --- Session ---
+
+    async def _fetch_snapshots(self):
+        """Per-device snapshots in parallel, bounded by the HTTP pool size, instead of N round-trips in a row."""
+        if not self.token: return
+        limit = asyncio.Semaphore(max(1, settings.TB_HTTP_POOL_SIZE))
+
+        async def fetch(device_id: str):
+            async with limit:
+                await asyncio.to_thread(self._fetch_device_snapshot, device_id)
+
+        await asyncio.gather(*(fetch(d) for d in list(self.device_ids)))
+
+    async def _session(self) -> bool:
+        await self._fetch_snapshots()
+        url = f"{self.local_ws_url}/api/ws/plugins/telemetry?token={self.token}"
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        received = False
+
+        async with connect(url, ping_interval=30, ping_timeout=10) as ws:
+            self.ws = ws
+            self.is_connected = True
+            for frame in self._subscription_frames(self.device_ids):
+                await ws.send(frame)
+
+            consumer = asyncio.ensure_future(self._consume(queue))
+            try:
+                async for msg in ws:
+                    received = True
+                    await queue.put(msg)  # blocks when the consumer lags (backpressure)
+                await queue.join()
+            finally:
+                consumer.cancel()
+                self.ws = None
+        return received
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            msg = await queue.get()
+            self._on_message(None, msg)
+            queue.task_done()
+
+    def _subscription_frames(self, device_ids: Iterable[str]) -> List[str]:
+        device_ids = list(device_ids)
+        return [self._subscription_cmd(device_ids[i:i + SUB_BATCH]) for i in range(0, len(device_ids), SUB_BATCH)]
+
+    def subscribe(self, device_ids: Iterable[str]):
+        with self._sub_lock:
+            new = [d for d in device_ids if d not in self.device_ids]
+            if not new: return
+            self.device_ids = self.device_ids + new
+        ws = self.ws
+        if self.is_connected and ws is not None and self.loop is not None:
+            for frame in self._subscription_frames(new):
+                asyncio.run_coroutine_threadsafe(ws.send(frame), self.loop)
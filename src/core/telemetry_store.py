@@ -0,0 +1,129 @@
+import time
+import threading
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+@dataclass
+class TelemetryEvent:
+    seq: int
+    ts: float
+    value: Any
+
+class TelemetryRing:
+    """
+    Fixed-capacity history of one (device, key) series in preallocated arrays.
+    Sequence numbers start at 1 and slot = seq % capacity. The (single)
+    writer clears a slot's seq, fills value/ts and publishes the seq last;
+    lock-free readers check the seqs before and after copying and drop slots
+    that were rewritten in between.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._seqs = np.zeros(self.capacity, dtype=np.int64)
+        self._ts = np.zeros(self.capacity, dtype=np.float64)
+        self._values = np.empty(self.capacity, dtype=object)
+        self.last_seq = 0
+        self.last_ts = float("-inf")
+
+    def append(self, value: Any, ts: float) -> int:
+        seq = self.last_seq + 1
+        slot = seq % self.capacity
+        self._seqs[slot] = 0
+        self._values[slot] = value
+        self._ts[slot] = ts
+        self._seqs[slot] = seq
+        self.last_seq = seq
+        self.last_ts = ts
+        return seq
+
+    def read_since(self, seq: int) -> List[TelemetryEvent]:
+        """Events with sequence > seq that are still in the buffer, oldest first."""
+        last = self.last_seq
+        first = max(seq + 1, last - self.capacity + 1, 1)
+        if first > last: return []
+        expected = np.arange(first, last + 1)
+        slots = expected % self.capacity
+        before = self._seqs[slots]
+        values, ts = self._values[slots], self._ts[slots]
+        # A concurrent append may have reused the oldest slots while copying
+        valid = (before == expected) & (self._seqs[slots] == expected)
+        return [TelemetryEvent(int(s), float(t), v) for s, t, v, ok in zip(expected, ts, values, valid) if ok]
+
+class TelemetryStore:
+    """
+    Latest telemetry value per (device, key), plus a TelemetryRing history
+    of the last `history` values of every series.
+    `version` increases with every update, so pollers can skip work with one
+    integer comparison; `wait_for_change` blocks on a condition instead.
+    A value not newer than its series' last timestamp is already in the
+    history (e.g. the snapshot re-fetched on every reconnect) and is ignored.
+    Writers serialize on a lock and publish fresh per-device dicts
+    (copy-on-write); readers never lock, they only dereference the current
+    dicts, so a render loop polling hundreds of devices never waits on the
+    WebSocket thread.
+    """
+    def __init__(self, history: int = 256):
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._rings: Dict[Tuple[str, str], TelemetryRing] = {}
+        self.history = history
+        self.version = 0
+        self._write_lock = threading.Lock()
+        self._changed = threading.Condition(self._write_lock)
+
+    def update(self, device_id: str, values: Dict[str, Any], ts: Optional[float] = None):
+        """Merges `values` into the device's latest values and appends them to the history."""
+        if not values: return
+        ts = time.time() if ts is None else ts
+        with self._write_lock:
+            fresh = {}
+            for key, val in values.items():
+                ring = self._rings.get((device_id, key))
+                if ring is None:
+                    ring = self._rings[(device_id, key)] = TelemetryRing(self.history)
+                elif ts <= ring.last_ts:
+                    continue
+                ring.append(val, ts)
+                fresh[key] = val
+            if not fresh: return
+            values = fresh
+            device = dict(self._latest.get(device_id, ()))
+            device.update(values)
+            if device_id in self._latest:
+                # Replacing the value of an existing key never resizes the outer dict
+                self._latest[device_id] = device
+            else:
+                latest = dict(self._latest)
+                latest[device_id] = device
+                self._latest = latest
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: Optional[float] = None) -> int:
+        """Blocks until the store moves past `version` (or timeout); returns the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def get(self, device_id: str, key: str) -> Optional[Any]:
+        return self._latest.get(device_id, {}).get(key)
+
+    def read_since(self, device_id: str, key: str, seq: int = 0) -> List[TelemetryEvent]:
+        ring = self._rings.get((device_id, key))
+        return ring.read_since(seq) if ring else []
+
+    def last_seq(self, device_id: str, key: str) -> int:
+        """Sequence of the newest value of a series (0 before the first one)."""
+        ring = self._rings.get((device_id, key))
+        return ring.last_seq if ring else 0
+
+    def get_many(self, device_ids: Iterable[str], key: str) -> Dict[str, Optional[Any]]:
+        latest = self._latest
+        return {device_id: latest.get(device_id, {}).get(key) for device_id in device_ids}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Consistent-per-device copy of everything received so far."""
+        return dict(self._latest)
+
+    def devices(self):
+        return list(self._latest)
@@ -1,8 +1,8 @@
 import streamlit as st
-import requests
 import logging
 from typing import Optional, Dict, Any
 from src.config import settings
+from src.core.http_client import get_tb_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,7 +16,8 @@ class UltraSecureVerifier:
         # SECURITY MASTER STROKE: 
         # We bypass the public URL and hit TB directly on the local port (9090).
         # This fixes the 'Internal authentication connection failed' error.
-        self.internal_auth_url = "http://127.0.0.1:9090/api/auth/user"
+        # All REST calls share one keep-alive pool, so a login storm reuses warm connections.
+        self.internal_auth_path = "/api/auth/user"
 
     def validate_session(self) -> Optional[Dict[str, Any]]:
         # 1. OPTIMIZATION: Check Cache First
@@ -39,8 +40,9 @@ class UltraSecureVerifier:
             headers = {"X-Authorization": f"Bearer {clean_token}"}
             
             # Internal request: No SSL validation needed for localhost
-            response = requests.get(
-                self.internal_auth_url, 
+            response = get_tb_client().get(
+                self.internal_auth_path,
+                endpoint="auth_user",
                 headers=headers, 
                 timeout=5, 
                 verify=False
@@ -1,6 +1,5 @@
 import os
 import sys
-import re
 import logging
 import time
 import pandas as pd
@@ -16,25 +15,18 @@ from src.core.knowledge.store import KnowledgeBase
 from src.services.db import DatabaseManager
 
 # Konfigürasyon
-MAX_WORKERS = 3 # Aynı anda kaç sorgu atılsın (Ollama'yı boğmamak için düşük tutun)
-REGEX_PATTERN = r'\b[A-Z]\d{3,7}\b' # F01662, E101 vb. yakalar
+MAX_WORKERS = settings.LLM_MAX_CONCURRENCY * len(settings.llm_base_urls) # As many as the LLM gateway runs at once
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("CacheWarmer")
 
 def extract_all_error_codes(kb: KnowledgeBase):
-    """PDF'lerdeki tüm olası hata kodlarını regex ile çıkarır."""
-    unique_codes = set()
-    logger.info("📚 Scanning Knowledge Base for error codes...")
-    
-    for page in kb.pages:
-        matches = re.findall(REGEX_PATTERN, page['text'])
-        for match in matches:
-            unique_codes.add(match)
-            
-    logger.info(f"✅ Found {len(unique_codes)} unique potential error codes.")
-    return list(unique_codes)
+    """PDF'lerdeki tüm olası hata kodlarını (kod indeksinden) çıkarır."""
+    logger.info("📚 Reading error codes from the Knowledge Base code index...")
+    hit_counts = kb.code_hit_counts()
+    logger.info(f"✅ Found {len(hit_counts)} unique potential error codes.")
+    return list(hit_counts)
 
 def extract_codes_from_excel(excel_path: str):
     """
@@ -96,12 +88,12 @@ def extract_codes_from_excel(excel_path: str):
         return []
 
 
-from src.core.ai_engine import AIAnalysisEngine
+from src.core.ai_engine import AIAnalysisEngine, PRIORITY_WARMUP
 
 # Global AI Engine (Thread safe enough for this script)
-ai_engine = AIAnalysisEngine()
+ai_engine = AIAnalysisEngine(response_cache=DatabaseManager)
 
-def process_code(kb: KnowledgeBase, code: str, excel_context: str = None):
+def process_code(kb: KnowledgeBase, code: str, excel_context: str = None, docs: list = None):
     """
     Tek bir kod için çözüm üretir ve SADECE CACHE'e yazar (Loglamaz).
     
@@ -109,6 +101,7 @@ def process_code(kb: KnowledgeBase, code: str, excel_context: str = None):
         kb: Knowledge base for PDF search
         code: Alarm code
         excel_context: Pre-built context from Excel (optional)
+        docs: Documents pre-fetched with kb.search_codes (optional)
     """
     # Veritabanında zaten var mı kontrol et
     try:
@@ -125,14 +118,14 @@ def process_code(kb: KnowledgeBase, code: str, excel_context: str = None):
                 'text': excel_context
             }]
             logger.info(f"📊 Using Excel context for {code}")
-        else:
+        elif docs is None:
             # PDF'lerden ara
             docs = kb.search(code)
             logger.info(f"📚 Using PDF search for {code}")
         
         # 2. AI Analiz (İngilizce)
         logger.info(f"🤖 Analyzing {code}...")
-        report_en = ai_engine.generate_report(code, docs)
+        report_en = ai_engine.generate_report(code, docs, priority=PRIORITY_WARMUP)
         
         # 3. Cache'e Yaz (Loglamadan!)
         if not report_en.startswith("AI Service Error"):
@@ -191,9 +184,10 @@ def main():
                 return
         else:
             pdf_codes = extract_all_error_codes(kb)
+            excel_codes = {task[0] for task in all_tasks}
             for code in pdf_codes:
                 # Excel'de yoksa ekle (both modunda duplicate önleme)
-                if not any(task[0] == code for task in all_tasks):
+                if code not in excel_codes:
                     all_tasks.append((code, None))  # None = use PDF search
             logger.info(f"📚 Added {len(pdf_codes)} codes from PDF")
     
@@ -201,13 +195,25 @@ def main():
         logger.warning("⚠️ No alarm codes found to process!")
         return
     
+    # Toplu Doküman Arama: tek geçişte tüm PDF kodları (tek transform + tek matmul)
+    pdf_task_codes = [code for code, context in all_tasks if context is None]
+    prefetched = {}
+    if pdf_task_codes:
+        start = time.perf_counter()
+        bulk = kb.search_codes(pdf_task_codes)
+        prefetched = bulk.docs
+        elapsed = time.perf_counter() - start
+        logger.info(f"📚 Retrieved documents for {len(pdf_task_codes)} codes in {elapsed:.2f}s")
+        top_codes = sorted(bulk.hit_counts.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        logger.info("📈 Most referenced codes: " + ", ".join(f"{c} ({n} pages)" for c, n in top_codes))
+
     logger.info(f"🚀 Processing {len(all_tasks)} unique codes with {MAX_WORKERS} workers...")
     
     # Paralel İşleme (Thread Pool)
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {}
         for code, context in all_tasks:
-            future = executor.submit(process_code, kb, code, context)
+            future = executor.submit(process_code, kb, code, context, prefetched.get(code))
             futures[future] = code
         
         completed = 0
@@ -216,6 +222,12 @@ def main():
             completed += 1
             print(f"[{completed}/{len(all_tasks)}] {result}")
 
+    stats = DatabaseManager.llm_response_stats()
+    logger.info(f"💾 LLM response cache: {stats['hits']} hits / {stats['misses']} misses "
+                f"(hit ratio {stats['hit_ratio']:.0%}), {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB")
+    context = ai_engine.context_stats()
+    logger.info(f"✂️ Prompt context: {context['avg_packed_tokens']:.0f} tokens per request on average, "
+                f"{context['saved_ratio']:.0%} of retrieved text trimmed")
     logger.info("🎉 Cache Warming Completed!")
 
 if __name__ == "__main__":
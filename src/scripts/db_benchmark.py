@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import logging
+import sqlite3
+import tempfile
+import numpy as np
+
+# Ensure root directory is in sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from src.services.db import DatabaseManager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("DBBenchmark")
+
+SELECT_SOLUTION = "SELECT solution FROM error_solutions WHERE error_code = ?"
+
+def fresh_connection():
+    """Per-call connection as DatabaseManager opened it before connections were reused."""
+    conn = sqlite3.connect(DatabaseManager.DB_NAME, timeout=DatabaseManager.TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+def time_calls(fn, n: int):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+    return float(np.mean(latencies)), float(np.percentile(latencies, 95))
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Per-call latency of DatabaseManager queries: fresh vs reused connections')
+    parser.add_argument('--calls', type=int, default=2000, help='Calls per scenario')
+    parser.add_argument('--codes', type=int, default=500, help='Rows in error_solutions')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseManager.DB_NAME = os.path.join(tmp, "benchmark.db")
+        DatabaseManager.init_db()
+        codes = [f"F{i:05d}" for i in range(args.codes)]
+        for code in codes:
+            DatabaseManager.upsert_solution(code, f"Remediation for {code} " * 20)
+        logger.info(f"🗄️ Benchmark DB with {len(codes)} solutions: {DatabaseManager.DB_NAME}")
+
+        def fresh_lookup(i):
+            conn = fresh_connection()
+            try:
+                conn.execute(SELECT_SOLUTION, (codes[i % len(codes)],)).fetchone()
+            finally:
+                conn.close()
+
+        def reused_lookup(i):
+            with DatabaseManager._get_connection() as conn:
+                conn.execute(SELECT_SOLUTION, (codes[i % len(codes)],)).fetchone()
+
+        def fresh_insert(i):
+            conn = fresh_connection()
+            try:
+                with conn:
+                    conn.execute("INSERT INTO logs (timestamp, error_code, ai_analysis) VALUES (?, ?, ?)",
+                                 ("2024-01-01 00:00:00", codes[i % len(codes)], "report"))
+            finally:
+                conn.close()
+
+        def reused_insert(i):
+            with DatabaseManager._get_connection() as conn:
+                conn.execute("INSERT INTO logs (timestamp, error_code, ai_analysis) VALUES (?, ?, ?)",
+                             ("2024-01-01 00:00:00", codes[i % len(codes)], "report"))
+
+        print(f"\n{'scenario':<16} {'connection':<10} {'mean us':>9} {'p95 us':>9}")
+        for label, fresh, reused in (("solution lookup", fresh_lookup, reused_lookup),
+                                     ("log insert", fresh_insert, reused_insert)):
+            for mode, fn in (("fresh", fresh), ("reused", reused)):
+                mean_us, p95_us = time_calls(fn, args.calls)
+                print(f"{label:<16} {mode:<10} {mean_us:>9.1f} {p95_us:>9.1f}")
+
+        DatabaseManager.close_all()
+
+if __name__ == "__main__":
+    main()
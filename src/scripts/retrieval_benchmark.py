@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import random
+import logging
+import numpy as np
+
+# Ensure root directory is in sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from src.core.knowledge.store import KnowledgeBase
+from src.core.knowledge.scoring import SCORERS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("RetrievalBenchmark")
+
+COMPONENTS = ["fan", "encoder", "brake", "resistor", "capacitor", "fuse", "contactor", "motor", "cable",
+              "sensor", "bearing", "inverter", "rectifier", "heatsink", "relay", "terminal", "filter", "choke"]
+FAULTS = ["overtemperature", "overvoltage", "undervoltage", "overcurrent", "short", "ground", "wear",
+          "vibration", "communication", "timeout", "phase", "imbalance", "leakage", "interruption"]
+FILLER = ["the", "drive", "operator", "must", "check", "parameter", "value", "manual", "section", "see",
+          "also", "unit", "system", "power", "module", "control", "setting", "commissioning", "note"]
+
+def build_fixture_corpus(n_pages: int, seed: int):
+    """
+    Synthetic manual: one description page per alarm code, long filler pages,
+    and alarm index pages that list many codes (the classic false hit for
+    exact matching). Returns (pages, ground_truth) where ground_truth maps
+    every code to the page id that actually documents it.
+    """
+    rng = random.Random(seed)
+    pages, truth = [], {}
+    n_codes = n_pages // 2
+    codes = [f"{rng.choice('AF')}{rng.randint(1000, 99999):05d}" for _ in range(n_codes)]
+    codes = list(dict.fromkeys(codes))
+
+    for code in codes:
+        topic = rng.sample(COMPONENTS, 2) + rng.sample(FAULTS, 2)
+        body = rng.choices(FILLER, k=rng.randint(40, 120)) + topic * 3
+        rng.shuffle(body)
+        truth[code] = len(pages)
+        pages.append({"source": "fixture_manual.pdf", "page_num": len(pages) + 1,
+                      "text": f"{code} " + " ".join(body) + f" Reaction to {code}: OFF2",
+                      "topic": " ".join(topic)})
+
+    while len(pages) < n_pages:
+        if rng.random() < 0.3:
+            listed = rng.sample(codes, min(150, len(codes)))
+            text = "Alarm index: " + " ".join(f"{c} {rng.choice(FAULTS)} p.{rng.randint(1, n_pages)}" for c in listed)
+        else:
+            words = rng.choices(FILLER, k=rng.randint(150, 400)) + rng.choices(COMPONENTS + FAULTS, k=12)
+            rng.shuffle(words)
+            text = " ".join(words)
+        pages.append({"source": "fixture_manual.pdf", "page_num": len(pages) + 1, "text": text})
+
+    rng.shuffle(pages)
+    truth = {}
+    for idx, page in enumerate(pages):
+        if "topic" in page:
+            truth[page["text"].split(" ", 1)[0]] = (idx, page.pop("topic"))
+    return pages, truth
+
+def recall_at_5(kb: KnowledgeBase, queries, relevant) -> float:
+    found = 0
+    for docs, target in zip(kb.search_many(queries), relevant):
+        found += any(doc.page_id == target for doc in docs)
+    return found / max(1, len(queries))
+
+def time_single(kb: KnowledgeBase, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        kb.search(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.mean(latencies)), float(np.percentile(latencies, 95))
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Retrieval benchmark (latency and recall@5) on a fixture corpus')
+    parser.add_argument('--pages', type=int, default=4000, help='Fixture corpus size in pages')
+    parser.add_argument('--queries', type=int, default=300, help='Queries per query set')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--engines', type=str, default=",".join(SCORERS), help='Comma separated engines')
+    args = parser.parse_args()
+
+    pages, truth = build_fixture_corpus(args.pages, args.seed)
+    rng = random.Random(args.seed + 1)
+    sample = rng.sample(sorted(truth), min(args.queries, len(truth)))
+    code_queries = sample
+    text_queries = [truth[code][1] for code in sample]
+    relevant = [truth[code][0] for code in sample]
+    logger.info(f"📚 Fixture corpus: {len(pages)} pages, {len(truth)} documented codes")
+
+    print(f"\n{'engine':<8} {'build s':>8} {'query':<5} {'mean ms':>8} {'p95 ms':>8} {'batch ms':>9} {'recall@5':>9}")
+    for name in args.engines.split(","):
+        start = time.perf_counter()
+        kb = KnowledgeBase(scorer=SCORERS[name](), pages=pages)
+        build = time.perf_counter() - start
+
+        for label, queries in (("code", code_queries), ("text", text_queries)):
+            mean_ms, p95_ms = time_single(kb, queries)
+            start = time.perf_counter()
+            kb.search_many(queries)
+            batch_ms = (time.perf_counter() - start) * 1000
+            recall = recall_at_5(kb, queries, relevant)
+            print(f"{name:<8} {build:>8.2f} {label:<5} {mean_ms:>8.2f} {p95_ms:>8.2f} {batch_ms:>9.1f} {recall:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import time
+import heapq
+import logging
+import threading
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "QUEUED", "RUNNING", "DONE", "FAILED", "CANCELLED"
+
+@dataclass
+class AnalysisJob:
+    key: Hashable
+    fn: Callable[[], Any]
+    seq: int
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[BaseException] = None
+    interest: int = 0
+    sources: Optional[List[Dict]] = None
+    finished_at: float = 0.0
+    done: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class AnalysisPool:
+    """
+    Background workers for LLM analyses, one job per key.
+    - Bounded: when `max_queue` jobs are waiting, the oldest waiting job is
+      dropped (cancelled) to make room.
+    - Newest first: the queue is a heap on the submission sequence, so a fresh
+      alarm is analysed before older ones that piled up behind a slow model.
+    - Interest counting: callers `submit(..., acquire=True)` once and
+      `release` when they no longer care; a queued job nobody is interested
+      in any more is cancelled before it reaches the model. Running jobs are
+      left to finish (their result still fills the solution cache).
+    Finished jobs stay visible for `result_ttl` seconds so every waiting
+    session can collect the outcome; after that a submit starts a new job.
+    """
+    def __init__(self, workers: int = 2, max_queue: int = 32, result_ttl: float = 30.0):
+        self.max_queue = max(1, max_queue)
+        self.result_ttl = result_ttl
+        self._jobs: Dict[Hashable, AnalysisJob] = {}
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._queued = 0
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"analysis-{i}", daemon=True).start()
+
+    def submit(self, key: Hashable, fn: Callable[[], Any], acquire: bool = False,
+               sources: Optional[List[Dict]] = None) -> AnalysisJob:
+        """Returns the live (or recently finished) job for `key`, queueing `fn` if there is none."""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None or (job.finished and time.time() - job.finished_at > self.result_ttl) \
+                    or job.status == CANCELLED:
+                job = AnalysisJob(key=key, fn=fn, seq=next(self._counter), sources=sources)
+                self._jobs[key] = job
+                if self._queued >= self.max_queue:
+                    self._drop_oldest()
+                heapq.heappush(self._heap, (-job.seq, job.seq, key))
+                self._queued += 1
+                self._cond.notify()
+            if acquire and not job.finished:
+                job.interest += 1
+            return job
+
+    def get(self, key: Hashable) -> Optional[AnalysisJob]:
+        with self._cond:
+            return self._jobs.get(key)
+
+    def release(self, key: Hashable):
+        """Drops one unit of interest; a queued job without interest is cancelled."""
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None or job.finished: return
+            job.interest = max(0, job.interest - 1)
+            if job.interest == 0 and job.status == QUEUED:
+                self._cancel(job)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def _drop_oldest(self):
+        # Caller holds the lock. The heap is ordered newest-first, so scan for the lowest seq.
+        queued = [job for job in self._jobs.values() if job.status == QUEUED]
+        if queued:
+            oldest = min(queued, key=lambda j: j.seq)
+            logger.warning(f"Analysis queue full, dropping {oldest.key}")
+            self._cancel(oldest)
+
+    def _cancel(self, job: AnalysisJob):
+        job.status = CANCELLED
+        job.finished_at = time.time()
+        self._queued -= 1
+        job.done.set()
+
+    def _next_job(self) -> AnalysisJob:
+        with self._cond:
+            while True:
+                while self._heap:
+                    _, seq, key = heapq.heappop(self._heap)
+                    job = self._jobs.get(key)
+                    # Skip heap entries of cancelled or superseded jobs
+                    if job is not None and job.seq == seq and job.status == QUEUED:
+                        job.status = RUNNING
+                        self._queued -= 1
+                        return job
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            try:
+                result, error, status = job.fn(), None, DONE
+            except BaseException as e:
+                logger.error(f"Analysis failed for {job.key}: {e}")
+                result, error, status = None, e, FAILED
+            with self._cond:
+                job.result, job.error, job.status = result, error, status
+                job.finished_at = time.time()
+                self._prune()
+            job.done.set()
+
+    def _prune(self):
+        now = time.time()
+        for key in [k for k, j in self._jobs.items() if j.finished and now - j.finished_at > self.result_ttl]:
+            del self._jobs[key]
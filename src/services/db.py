@@ -1,24 +1,93 @@
+import time
+import atexit
 import sqlite3
+import threading
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 import logging
+from src.config import settings
+from src.services.solution_cache import SolutionCache, MISSING
+from src.services.log_writer import LogWriter
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     DB_NAME = "maintenance_logs.db"
     TIMEOUT = 30  # Seconds for SQLite busy timeout
+    # In-process LRU in front of error_solutions: an ongoing alarm never touches disk
+    solution_cache = SolutionCache(
+        max_entries=settings.SOLUTION_CACHE_SIZE,
+        ttl=settings.SOLUTION_CACHE_TTL
+    )
+
+    # Hit/miss counters of the LLM response cache (this process)
+    _response_stats = {"hits": 0, "misses": 0}
+    _response_lock = threading.Lock()
+
+    STATEMENT_CACHE = 256 # Prepared statements kept per connection
+    SCHEMA_VERSION = 1 # Stored in PRAGMA user_version, see _migrate
+    LOG_COLUMNS = "id, timestamp, error_code, ai_analysis" # What the UI and reports see
+
+    # One connection per thread, opened and configured once
+    _local = threading.local()
+    _connections: Dict[int, sqlite3.Connection] = {}
+    _conn_lock = threading.Lock()
+    _generation = 0 # Bumped by close_all, invalidates every thread's cached connection
 
     @staticmethod
     def _get_connection():
-        """Creates a new database connection with proper configuration."""
-        conn = sqlite3.connect(DatabaseManager.DB_NAME, timeout=DatabaseManager.TIMEOUT)
+        """Returns this thread's database connection, creating it on first use."""
+        local = DatabaseManager._local
+        if getattr(local, "conn", None) is not None and local.generation == DatabaseManager._generation \
+                and local.db_name == DatabaseManager.DB_NAME:
+            return local.conn
+
+        conn = sqlite3.connect(
+            DatabaseManager.DB_NAME,
+            timeout=DatabaseManager.TIMEOUT,
+            cached_statements=DatabaseManager.STATEMENT_CACHE,
+            check_same_thread=False  # only so close_all can close it at shutdown
+        )
         conn.execute("PRAGMA journal_mode=WAL;")  # Enable Write-Ahead Logging for concurrency
         conn.execute("PRAGMA synchronous=NORMAL;") # Faster writes, safe enough for WAL
+
+        with DatabaseManager._conn_lock:
+            stale = DatabaseManager._connections.pop(threading.get_ident(), None)
+            # Connections of threads that have exited
+            alive = {t.ident for t in threading.enumerate()}
+            for ident in [i for i in DatabaseManager._connections if i not in alive]:
+                DatabaseManager._connections.pop(ident).close()
+            DatabaseManager._connections[threading.get_ident()] = conn
+        if stale is not None:
+            stale.close()
+
+        local.conn, local.generation, local.db_name = conn, DatabaseManager._generation, DatabaseManager.DB_NAME
         return conn
 
+    @staticmethod
+    def close_all():
+        """Closes every thread's connection (shutdown, or before switching DB_NAME)."""
+        with DatabaseManager._conn_lock:
+            DatabaseManager._generation += 1
+            connections = list(DatabaseManager._connections.values())
+            DatabaseManager._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"DB Close Error: {e}")
+
     @staticmethod
     def init_db():
+        # DB_NAME may have changed (tests): finish pending writes, then drop connections
+        # and cached rows of the previous file
+        DatabaseManager.flush_logs(timeout=5)
+        DatabaseManager.log_writer.reset()
+        DatabaseManager.close_all()
+        DatabaseManager.solution_cache.clear()
+        with DatabaseManager._response_lock:
+            DatabaseManager._response_stats = {"hits": 0, "misses": 0}
         try:
             with DatabaseManager._get_connection() as conn:
                 c = conn.cursor()
@@ -27,7 +96,8 @@ class DatabaseManager:
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         timestamp TEXT,
                         error_code TEXT,
-                        ai_analysis TEXT
+                        ai_analysis TEXT,
+                        ts_epoch INTEGER
                     )
                 ''')
                 c.execute('''
@@ -37,14 +107,57 @@ class DatabaseManager:
                         last_updated TEXT
                     )
                 ''')
+                c.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_responses (
+                        key TEXT PRIMARY KEY,
+                        error_code TEXT,
+                        model TEXT,
+                        response TEXT,
+                        size INTEGER,
+                        last_used REAL
+                    )
+                ''')
+                c.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_used ON llm_responses(last_used)")
+                # Running byte total of llm_responses, so writes never re-sum the table
+                c.execute("CREATE TABLE IF NOT EXISTS llm_cache_meta (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER)")
+                c.execute("INSERT OR IGNORE INTO llm_cache_meta (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM llm_responses")
                 conn.commit()
+                DatabaseManager._migrate(conn)
         except Exception as e:
             logger.critical(f"DB Init Error: {e}")
 
+    @staticmethod
+    def _migrate(conn):
+        """Brings older databases up to SCHEMA_VERSION (idempotent, one transaction per step)."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # v1: integer epoch timestamps (local time -> UTC epoch) + indexes for time and code queries
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(logs)")}
+            with conn:
+                if "ts_epoch" not in columns:
+                    conn.execute("ALTER TABLE logs ADD COLUMN ts_epoch INTEGER")
+                conn.execute("""
+                    UPDATE logs SET ts_epoch = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+                    WHERE ts_epoch IS NULL
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(ts_epoch)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_code_ts ON logs(error_code, ts_epoch)")
+                conn.execute("PRAGMA user_version = 1")
+            logger.info("DB migrated to schema v1 (ts_epoch + indexes)")
+
     @staticmethod
     def log_fault(error_code, ai_analysis):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        """Queues the alarm for the background log writer; never blocks on SQLite."""
+        now = datetime.now()
+        DatabaseManager.log_writer.submit((now.strftime("%Y-%m-%d %H:%M:%S"), int(now.timestamp()), error_code, ai_analysis))
+
+    @staticmethod
+    def flush_logs(timeout: Optional[float] = None) -> bool:
+        """Blocks until queued alarms are in the database."""
+        return DatabaseManager.log_writer.flush(timeout)
 
+    @staticmethod
+    def _write_log_batch(rows):
         try:
             with DatabaseManager._get_connection() as conn:
                 c = conn.cursor()
@@ -52,13 +165,19 @@ class DatabaseManager:
                 # Check for duplicate in the very last entry to avoid spamming
                 c.execute('SELECT error_code FROM logs ORDER BY id DESC LIMIT 1')
                 row = c.fetchone()
-                if row and str(row[0]) == str(error_code):
-                    return
+                last_code = str(row[0]) if row else None
 
-                c.execute('''
-                    INSERT INTO logs (timestamp, error_code, ai_analysis)
-                    VALUES (?, ?, ?)
-                ''', (timestamp, error_code, ai_analysis))
+                fresh = []
+                for timestamp, ts_epoch, error_code, ai_analysis in rows:
+                    if str(error_code) == last_code:
+                        continue
+                    fresh.append((timestamp, ts_epoch, error_code, ai_analysis))
+                    last_code = str(error_code)
+
+                c.executemany('''
+                    INSERT INTO logs (timestamp, ts_epoch, error_code, ai_analysis)
+                    VALUES (?, ?, ?, ?)
+                ''', fresh)
                 conn.commit()
                 
         except sqlite3.OperationalError as e:
@@ -69,12 +188,17 @@ class DatabaseManager:
     @staticmethod
     def get_cached_solution(error_code: str) -> str | None:
         """Cache'den çözüm getirir."""
+        cached = DatabaseManager.solution_cache.get(error_code)
+        if cached is not MISSING:
+            return cached
         try:
             with DatabaseManager._get_connection() as conn:
                 c = conn.cursor()
                 c.execute("SELECT solution FROM error_solutions WHERE error_code = ?", (error_code,))
                 row = c.fetchone()
-                return row[0] if row else None
+                solution = row[0] if row else None
+            DatabaseManager.solution_cache.put(error_code, solution, overwrite=False)
+            return solution
         except Exception as e:
             logger.warning(f"Cache Read Error: {e}")
             return None
@@ -83,6 +207,7 @@ class DatabaseManager:
     def upsert_solution(error_code: str, solution: str):
         """Çözümü cache'e yazar veya günceller."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        DatabaseManager.solution_cache.invalidate(error_code)
         try:
             with DatabaseManager._get_connection() as conn:
                 c = conn.cursor()
@@ -94,14 +219,78 @@ class DatabaseManager:
                         last_updated=excluded.last_updated
                 ''', (error_code, solution, timestamp))
                 conn.commit()
+            DatabaseManager.solution_cache.put(error_code, solution)
         except Exception as e:
             logger.error(f"Cache Write Error: {e}")
 
+    @staticmethod
+    def get_llm_response(key: str) -> str | None:
+        """Content-addressed LLM answer (see AIAnalysisEngine._response_key), or None."""
+        if settings.LLM_RESPONSE_CACHE_BYTES <= 0: return None
+        try:
+            with DatabaseManager._get_connection() as conn:
+                row = conn.execute("SELECT response FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        except Exception as e:
+            logger.warning(f"Response Cache Read Error: {e}")
+            row = None
+        with DatabaseManager._response_lock:
+            DatabaseManager._response_stats["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    @staticmethod
+    def put_llm_response(key: str, error_code: str, model: str, response: str):
+        """Stores an answer, then evicts least recently used ones beyond LLM_RESPONSE_CACHE_BYTES."""
+        max_bytes = settings.LLM_RESPONSE_CACHE_BYTES
+        if max_bytes <= 0: return
+        size = len(response.encode("utf-8"))
+        try:
+            with DatabaseManager._get_connection() as conn:
+                # Written first: takes the write lock, so the replaced row's size can't change under us
+                conn.execute(
+                    "UPDATE llm_cache_meta SET bytes = bytes + ? - COALESCE((SELECT size FROM llm_responses WHERE key = ?), 0)",
+                    (size, key))
+                conn.execute('''
+                    INSERT OR REPLACE INTO llm_responses (key, error_code, model, response, size, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (key, error_code, model, response, size, time.time()))
+                excess = conn.execute("SELECT bytes FROM llm_cache_meta").fetchone()[0] - max_bytes
+                if excess > 0:
+                    victims, freed = [], 0
+                    for victim, victim_size in conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used"):
+                        if freed >= excess: break
+                        victims.append((victim,))
+                        freed += victim_size
+                    conn.executemany("DELETE FROM llm_responses WHERE key = ?", victims)
+                    conn.execute("UPDATE llm_cache_meta SET bytes = bytes - ?", (freed,))
+        except Exception as e:
+            logger.error(f"Response Cache Write Error: {e}")
+
+    @staticmethod
+    def llm_response_stats() -> Dict[str, float]:
+        try:
+            with DatabaseManager._get_connection() as conn:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+        except Exception as e:
+            logger.warning(f"Response Cache Stats Error: {e}")
+            entries, size = 0, 0
+        with DatabaseManager._response_lock:
+            hits, misses = DatabaseManager._response_stats["hits"], DatabaseManager._response_stats["misses"]
+        total = hits + misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 3) if total else 0.0
+        }
+
     @staticmethod
     def get_logs_as_df(limit: int = 0):
         try:
             with DatabaseManager._get_connection() as conn:
-                query = "SELECT * FROM logs ORDER BY id DESC"
+                query = f"SELECT {DatabaseManager.LOG_COLUMNS} FROM logs ORDER BY id DESC"
                 if limit > 0:
                     query += f" LIMIT {limit}"
                 return pd.read_sql_query(query, conn)
@@ -110,17 +299,74 @@ class DatabaseManager:
             return pd.DataFrame()
 
     @staticmethod
-    def get_daily_logs_as_df():
-        """Bugüne ait logları getirir."""
-        today = datetime.now().strftime("%Y-%m-%d")
+    def get_logs_page(before: Optional[Tuple[int, int]] = None, limit: int = 50,
+                      error_code: Optional[str] = None):
+        """
+        Keyset pagination, newest first. `before` is the (ts_epoch, id) cursor
+        returned with the previous page; each page is an index range scan, so
+        its cost does not depend on how deep into the history it is.
+        Returns (df, cursor of the next older page or None).
+        """
+        conditions, params = [], []
+        if error_code:
+            conditions.append("error_code = ?")
+            params.append(error_code)
+        if before is not None:
+            conditions.append("(ts_epoch, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         try:
             with DatabaseManager._get_connection() as conn:
-                # SQLite timestamp stores as TEXT "YYYY-MM-DD HH:MM:SS"
-                # We filter where timestamp starts with today's date
-                return pd.read_sql_query(f"SELECT * FROM logs WHERE timestamp LIKE '{today}%' ORDER BY id DESC", conn)
+                df = pd.read_sql_query(
+                    f"SELECT {DatabaseManager.LOG_COLUMNS}, ts_epoch FROM logs {where} "
+                    f"ORDER BY ts_epoch DESC, id DESC LIMIT ?",
+                    conn, params=params + [limit + 1]
+                )
         except Exception as e:
-            logger.error(f"Daily Log Read Error: {e}")
+            logger.error(f"Log Page Read Error: {e}")
+            return pd.DataFrame(), None
+
+        cursor = None
+        if len(df) > limit:
+            df = df.iloc[:limit]
+            last = df.iloc[-1]
+            cursor = (int(last["ts_epoch"]), int(last["id"]))
+        return df.drop(columns=["ts_epoch"]), cursor
+
+    @staticmethod
+    def get_logs_between(start_epoch: int, end_epoch: int, error_code: Optional[str] = None):
+        """Logs with start_epoch <= ts_epoch < end_epoch, newest first."""
+        query = f"SELECT {DatabaseManager.LOG_COLUMNS} FROM logs WHERE ts_epoch >= ? AND ts_epoch < ?"
+        params = [int(start_epoch), int(end_epoch)]
+        if error_code:
+            query += " AND error_code = ?"
+            params.append(error_code)
+        try:
+            with DatabaseManager._get_connection() as conn:
+                return pd.read_sql_query(query + " ORDER BY ts_epoch DESC, id DESC", conn, params=params)
+        except Exception as e:
+            logger.error(f"Log Range Read Error: {e}")
             return pd.DataFrame()
 
+    @staticmethod
+    def get_daily_logs_as_df():
+        """Bugüne ait logları getirir."""
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return DatabaseManager.get_logs_between(midnight.timestamp(), (midnight + timedelta(days=1)).timestamp())
+
+# Alarm log rows are written in batches by a background thread
+DatabaseManager.log_writer = LogWriter(
+    DatabaseManager._write_log_batch,
+    max_queue=settings.LOG_QUEUE_SIZE,
+    batch_rows=settings.LOG_BATCH_ROWS,
+    flush_interval=settings.LOG_FLUSH_INTERVAL,
+    coalesce_key=lambda row: str(row[2])
+)
+
+@atexit.register
+def _shutdown():
+    DatabaseManager.flush_logs(timeout=5)
+    DatabaseManager.close_all()
+
 # Initialize on module load
 DatabaseManager.init_db()
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class LogWriter:
+    """
+    Background writer for append-only rows.
+    `submit` never blocks: rows go into a bounded queue (dropped and counted
+    when it is full), consecutive rows with the same `coalesce_key` are
+    collapsed in memory, and one thread hands them to `write_batch` in
+    batches of up to `batch_rows`, at least every `flush_interval` seconds.
+    """
+    def __init__(self, write_batch: Callable[[List[Sequence[Any]]], None], max_queue: int = 10000,
+                 batch_rows: int = 200, flush_interval: float = 0.25,
+                 coalesce_key: Optional[Callable[[Sequence[Any]], Any]] = None):
+        self.write_batch = write_batch
+        self.batch_rows = max(1, batch_rows)
+        self.flush_interval = flush_interval
+        self.coalesce_key = coalesce_key
+        self.dropped = 0
+        self.written_batches = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._last_key = object()
+        self._submit_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, row: Sequence[Any]) -> bool:
+        with self._submit_lock:
+            if self.coalesce_key is not None:
+                key = self.coalesce_key(row)
+                if key == self._last_key:
+                    return True
+            self._ensure_started()
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                # Not remembered: the next row with this key must still get its chance
+                self.dropped += 1
+                logger.warning(f"Log queue full, dropped row ({self.dropped} so far)")
+                return False
+            if self.coalesce_key is not None:
+                self._last_key = key
+            return True
+
+    def reset(self):
+        """Forgets the last submitted key (the next row is never coalesced away)."""
+        with self._submit_lock:
+            self._last_key = object()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every submitted row has been written (or the timeout passes)."""
+        if self._thread is None: return True
+        # Queue.join() without its unbounded wait: task_done notifies this condition
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                # Collect more rows until the batch is full or the interval is over
+                while len(batch) < self.batch_rows:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+            try:
+                self.write_batch(batch)
+                self.written_batches += 1
+            except Exception as e:
+                logger.error(f"Log batch write failed ({len(batch)} rows): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -13,6 +13,11 @@ class AlarmLogger:
     def get_logs():
         return DatabaseManager.get_logs_as_df()
 
+    @staticmethod
+    def get_logs_page(before=None, limit: int = 50):
+        """Bir sayfa log (en yenisi önce) ve bir sonraki sayfanın imleci."""
+        return DatabaseManager.get_logs_page(before=before, limit=limit)
+
     @staticmethod
     def get_daily_logs():
         """Sadece bugünün loglarını getirir."""
@@ -1,8 +1,12 @@
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Callable
 import logging
+import threading
 from src.services.logger import AlarmLogger
 from src.services.db import DatabaseManager
+from src.services.singleflight import SingleFlight
+from src.services.analysis_pool import AnalysisPool, CANCELLED
+from src.config import settings
 # Type Hinting only
 from src.core.knowledge.store import KnowledgeBase 
 from src.core.ai_engine import AIAnalysisEngine
@@ -20,20 +24,36 @@ class CycleResult:
     ai_report: Optional[str] = None
     sources: Optional[List[Dict]] = None
     is_new_alarm: bool = False
+    partial_report: Optional[str] = None # Streamed so far while PENDING
 
 class MonitorService:
-    def __init__(self, kb: KnowledgeBase, ai_engine: AIAnalysisEngine, translator: TranslationService):
+    def __init__(self, kb: KnowledgeBase, ai_engine: AIAnalysisEngine, translator: TranslationService,
+                 pool: Optional[AnalysisPool] = None):
         self.kb = kb
         self.ai = ai_engine
         self.translator = translator
+        # With a pool, cache misses are analysed in the background and cycles return PENDING
+        self.pool = pool
+        # Shared across sessions through the Container: one analysis per code,
+        # one translation per (code, language), however many dashboards miss at once.
+        self._analysis_flight = SingleFlight()
+        self._translation_flight = SingleFlight()
+        # Text streamed so far by background analyses, per code
+        self._partials: Dict[str, str] = {}
+        self._partials_lock = threading.Lock()
 
-    def process_cycle(self, current_payload: str, last_processed_payload: str, language: str = "en") -> CycleResult:
+    def process_cycle(self, current_payload: str, last_processed_payload: str, language: str = "en",
+                      on_token: Optional[Callable[[str], None]] = None) -> CycleResult:
+        """on_token: receives report deltas while a synchronous analysis streams (leader only)."""
         # 1. Input Validation & Stability Check
         if not current_payload or current_payload in IGNORED_SIGNALS or current_payload == STABLE_SIGNAL:
+            self._release(last_processed_payload)
             return CycleResult(status="STABLE", payload=STABLE_SIGNAL)
 
         # 2. State Change Detection
         is_new = (current_payload != last_processed_payload)
+        if is_new:
+            self._release(last_processed_payload)
 
         # 3. Analysis or Cache Retrieval
         cached_solution = DatabaseManager.get_cached_solution(current_payload)
@@ -47,22 +67,39 @@ class MonitorService:
             if is_new:
                logger.info(f"Triggering Analysis for payload: {current_payload}")
             
-            docs = self.kb.search(current_payload)
-            # Always analyze in English for cache consistency
-            report_en = self.ai.generate_report(current_payload, docs)
-            
-            # Cache English result
-            if not report_en.startswith("AI Service Error"):
-                DatabaseManager.upsert_solution(current_payload, report_en)
-                report = report_en
+            if self.pool is not None:
+                job = self._submit_analysis(current_payload, acquire=is_new)
+                if job.status == CANCELLED:
+                    # Dropped after we joined it (queue overflow, another session's release): queue it again
+                    job = self._submit_analysis(current_payload, acquire=True)
+                if not job.finished or job.status == CANCELLED:
+                    return self._pending(current_payload, is_new, job.sources)
+                report, docs = job.outcome()
             else:
-                logger.error(f"AI Service Error for payload {current_payload}: {report_en}")
-                report = report_en
+                try:
+                    report, docs = self._analysis_flight.do(
+                        current_payload,
+                        lambda: self._analyze(current_payload, on_token=on_token),
+                        timeout=settings.ANALYSIS_WAIT_TIMEOUT
+                    )
+                except TimeoutError as e:
+                    # Still in flight for another session: a later cycle collects it
+                    logger.warning(str(e))
+                    return self._pending(current_payload, is_new)
 
         # 4. Translation (if needed)
         if language != "en" and not report.startswith("AI Service Error"):
             # Note: Translating cached/fresh English report to target language
-            report = self.translator.translate_content(report, language)
+            english = report
+            try:
+                report = self._translation_flight.do(
+                    (current_payload, language),
+                    lambda: self.translator.translate_content(english, language),
+                    timeout=settings.ANALYSIS_WAIT_TIMEOUT
+                )
+            except TimeoutError as e:
+                logger.warning(str(e))
+                return self._pending(current_payload, is_new, docs)
         
         # 5. Persistent Logging
         # We log every cycle for history trace, even if cached
@@ -78,4 +115,53 @@ class MonitorService:
             ai_report=report,
             sources=docs,
             is_new_alarm=is_new
-        )
\ No newline at end of file
+        )
+
+    def _pending(self, payload: str, is_new: bool, sources: Optional[List[Dict]] = None) -> CycleResult:
+        return CycleResult(status="PENDING", payload=payload, sources=sources, is_new_alarm=is_new,
+                           partial_report=self._partials.get(payload))
+
+    def _submit_analysis(self, payload: str, acquire: bool):
+        """Queues (or joins) the background analysis; sources are retrieved up front for the PENDING view."""
+        job = self.pool.get(payload)
+        docs = job.sources if job is not None and not job.finished else self.kb.search(payload)
+        return self.pool.submit(payload, lambda: self._analyze_streaming(payload, docs), acquire=acquire, sources=docs)
+
+    def _analyze_streaming(self, payload: str, docs: List[Dict]):
+        """Pool job: streams into _partials so PENDING cycles can show the report as it is written."""
+        def collect(delta: str):
+            with self._partials_lock:
+                self._partials[payload] = self._partials.get(payload, "") + delta
+        try:
+            return self._analyze(payload, docs, on_token=collect)
+        finally:
+            with self._partials_lock:
+                self._partials.pop(payload, None)
+
+    def _release(self, payload: Optional[str]):
+        """The caller moved on from `payload`; a still-queued analysis nobody waits for is cancelled."""
+        if self.pool is not None and payload:
+            self.pool.release(payload)
+
+    def _analyze(self, payload: str, docs: Optional[List[Dict]] = None,
+                 on_token: Optional[Callable[[str], None]] = None):
+        """Retrieval + LLM for one code (single-flight leader or pool worker). Returns (report, docs)."""
+        # A previous leader may have finished between our cache miss and taking the lead
+        cached_solution = DatabaseManager.get_cached_solution(payload)
+        if cached_solution:
+            return cached_solution, []
+
+        if docs is None:
+            docs = self.kb.search(payload)
+        # Always analyze in English for cache consistency
+        if on_token is not None:
+            report_en = self.ai.generate_report(payload, docs, on_token=on_token)
+        else:
+            report_en = self.ai.generate_report(payload, docs)
+        
+        # Cache English result
+        if not report_en.startswith("AI Service Error"):
+            DatabaseManager.upsert_solution(payload, report_en)
+        else:
+            logger.error(f"AI Service Error for payload {payload}: {report_en}")
+        return report_en, docs
\ No newline at end of file
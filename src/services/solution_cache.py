@@ -0,0 +1,78 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+MISSING = object() # Returned by get() when the cache knows nothing about a key
+
+class SolutionCache:
+    """
+    Thread-safe LRU for error_solutions rows.
+    Bounded by entry count and by total characters of cached reports;
+    entries expire after `ttl` seconds so writes from other processes
+    (e.g. the cache warmer) show up eventually. Misses are cached too, with
+    the shorter `negative_ttl`, so a pending alarm doesn't hit SQLite on
+    every cycle either.
+    """
+    def __init__(self, max_entries: int = 256, max_chars: int = 4_000_000,
+                 ttl: float = 300.0, negative_ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """Cached value (None = known miss), or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Optional[str], overwrite: bool = True):
+        """overwrite=False is for read-fills: never replace what a concurrent writer stored meanwhile."""
+        if self.max_entries <= 0: return
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            if not overwrite and key in self._entries: return
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._chars += len(value or "")
+            while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+            self.hits = self.misses = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._chars -= len(entry[0] or "")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0
+            }
@@ -1,4 +1,6 @@
+import time
 import streamlit as st
+from dataclasses import replace
 from src.core.container import get_service
 from src.ui.localization import get_text
 from src.ui.dashboard import render_logs_expander
@@ -15,7 +17,9 @@ def smart_monitoring_cycle():
     service = get_service()
     plc = st.session_state.plc
     
-    # 1. VERİ OKUMA
+    # 1. DEĞİŞİKLİK KONTROLÜ: the monitored series' seq is read first, so anything arriving later
+    # triggers the next run; traffic of other devices or keys does not
+    seq = plc.last_seq()
     raw_payload = plc.get_latest_payload()
     
     # 2. BAĞLANTI KONTROLÜ
@@ -23,17 +27,56 @@ def smart_monitoring_cycle():
         st.warning(get_text("connecting"), icon="⏳")
         return
 
-    # 3. İŞLEME
-    last_proc = st.session_state.get("last_processed_payload", None)
     curr_lang = st.session_state.get("language", "en")
+    cycle_key = (seq, curr_lang)
+    last_cycle = st.session_state.get("last_cycle")
+    if st.session_state.get("cycle_key") == cycle_key and last_cycle is not None and _is_final(last_cycle):
+        # Nothing changed: redraw the last result without touching the monitor or SQLite
+        _render_result(st.session_state.last_cycle)
+        return
+
+    # 3. İŞLEME: every value since the last refresh, not just the latest
+    events = _new_events(plc, st.session_state)
     
     try:
-        result = service.process_cycle(raw_payload, last_processed_payload=last_proc, language=curr_lang)
+        # Transitions that flipped and cleared between two refreshes are processed once each
+        _process_transitions(service, events[:-1], curr_lang)
+        if events:
+            raw_payload = events[-1].value
+        last_proc = st.session_state.get("last_processed_payload", None)
+        stream_card = _StreamingCard()
+        result = service.process_cycle(raw_payload, last_processed_payload=last_proc, language=curr_lang,
+                                       on_token=stream_card)
+        stream_card.clear()
     except Exception as e:
         logger.error(f"Cycle Error: {e}")
         st.error(f"{get_text('system_malfunction')}: {e}", icon="❌")
         return
 
+    # Only now are these events handled; after a failure the next cycle reads them again
+    if events:
+        st.session_state.telemetry_seq = events[-1].seq
+
+    # Cached for redraws; a redraw must not count as a new alarm again
+    st.session_state.cycle_key = cycle_key
+    st.session_state.last_cycle = replace(result, is_new_alarm=False)
+    _render_result(result)
+
+def _is_final(result) -> bool:
+    """A result that can be redrawn as is; PENDING and failed analyses are retried every cycle."""
+    return result.status != "PENDING" and not (result.ai_report or "").startswith("AI Service Error")
+
+def _new_events(plc, state):
+    """
+    Values since this session's cursor. A new session (tab, reload) starts
+    at the newest value: transitions buffered before it opened are already
+    over and were handled (and logged) by the sessions that saw them.
+    """
+    if "telemetry_seq" not in state:
+        state["telemetry_seq"] = max(plc.last_seq() - 1, 0)
+    return plc.read_since(state["telemetry_seq"])
+
+def _render_result(result):
     # --- UI RENDERING ---
     
     # A. NORMAL DURUM
@@ -41,11 +84,28 @@ def smart_monitoring_cycle():
         st.success(f"{get_text('system_nominal')}  •  {get_text('signal_label')}: {result.payload}", icon="✅")
         st.session_state.last_processed_payload = None
              
-    # B. ALARM DURUMU
+    # B. ANALİZ SÜRÜYOR: the report is produced in the background, a later cycle picks it up
+    elif result.status == "PENDING":
+        st.error(f"{get_text('critical_fault')}: {result.payload}", icon="🔥")
+        if result.partial_report:
+            with st.container(border=True):
+                st.markdown(f"### 🛠️ {get_text('remediation_protocol')}")
+                st.markdown(result.partial_report + " ▌")
+        else:
+            st.info(get_text("analysis_pending"), icon="⏳")
+        if result.sources:
+            refs = " | ".join([f"{d['source']} (p.{d['page_num']})" for d in result.sources])
+            st.caption(f"📄 **{get_text('reference_documents')}:** {refs}")
+        if result.is_new_alarm:
+            st.session_state.last_processed_payload = result.payload
+            st.session_state.last_docs = result.sources
+            st.session_state.pop("last_report", None)
+
+    # C. ALARM DURUMU
     else:
         st.error(f"{get_text('critical_fault')}: {result.payload}", icon="🔥")
 
-        # C. DIAGNOSTIC CARD
+        # D. DIAGNOSTIC CARD
         if result.ai_report:
             st.session_state.last_report = result.ai_report
         
@@ -68,6 +128,50 @@ def smart_monitoring_cycle():
                 st.session_state.last_docs = result.sources
                 st.rerun()
 
+class _StreamingCard:
+    """
+    on_token callback for synchronous analyses: shows the report while the
+    model writes it (redraws throttled), replaced by the final card afterwards.
+    """
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.text = ""
+        self.placeholder = None
+        self.last_draw = 0.0
+
+    def __call__(self, delta: str):
+        self.text += delta
+        if self.placeholder is None:
+            self.placeholder = st.empty()
+        now = time.monotonic()
+        if now - self.last_draw >= self.interval:
+            with self.placeholder.container(border=True):
+                st.markdown(f"### 🛠️ {get_text('remediation_protocol')}")
+                st.markdown(self.text + " ▌")
+            self.last_draw = now
+
+    def clear(self):
+        if self.placeholder is not None:
+            self.placeholder.empty()
+
+def _process_transitions(service, events, language):
+    """Runs intermediate telemetry values through the monitor (analysis + logging) without rendering."""
+    previous = None
+    for event in events:
+        if event.value == previous:
+            continue
+        previous = event.value
+        result = service.process_cycle(event.value,
+                                       last_processed_payload=st.session_state.get("last_processed_payload"),
+                                       language=language)
+        if result.status == "STABLE":
+            st.session_state.last_processed_payload = None
+        elif result.is_new_alarm:
+            st.session_state.last_processed_payload = result.payload
+            st.session_state.last_docs = result.sources
+            if result.ai_report:
+                st.session_state.last_report = result.ai_report
+
 def run_dashboard():
     """Main dashboard runner"""
     try:
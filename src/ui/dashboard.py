@@ -4,16 +4,30 @@ import pandas as pd
 from src.services.logger import AlarmLogger
 from src.ui.localization import get_text
 
+PAGE_SIZE = 50
+
 def render_logs_expander():
     st.markdown(f"### 📋 {get_text('system_logs')}")
     with st.expander(get_text("view_alarm_history")):
-        df = AlarmLogger.get_logs()
+        # Keyset pagination: a stack of cursors, one page is read per rerun
+        cursors = st.session_state.setdefault("log_page_cursors", [None])
+        df, next_cursor = AlarmLogger.get_logs_page(before=cursors[-1], limit=PAGE_SIZE)
         if not df.empty:
             st.dataframe(df, width="stretch", height=300)
-            
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False)
-            st.download_button(f"📥 {get_text('download_report')}", buffer.getvalue(), "industaiq_logs.xlsx")
+
+            col_newer, col_older, col_export = st.columns(3)
+            if col_newer.button(f"◀ {get_text('newer_logs')}", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+            if col_older.button(f"{get_text('older_logs')} ▶", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
+
+            # The full export is only built on request, not on every rerun
+            if col_export.button(f"📦 {get_text('prepare_export')}"):
+                buffer = io.BytesIO()
+                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                    AlarmLogger.get_logs().to_excel(writer, index=False)
+                st.download_button(f"📥 {get_text('download_report')}", buffer.getvalue(), "industaiq_logs.xlsx")
         else:
             st.info(get_text("no_data"))
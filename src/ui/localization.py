@@ -9,11 +9,15 @@ TRANSLATIONS = {
         "system_nominal": "SYSTEM NOMINAL",
         "signal_label": "Signal",
         "critical_fault": "CRITICAL FAULT EVENT",
+        "analysis_pending": "Analysing fault, report in progress...",
         "remediation_protocol": "Remediation Protocol",
         "reference_documents": "Reference Documents",
         "system_logs": "System Logs",
         "view_alarm_history": "View Alarm History",
         "download_report": "Download Report",
+        "newer_logs": "Newer",
+        "older_logs": "Older",
+        "prepare_export": "Prepare Export",
         "no_data": "No historical data available.",
         "runtime_exception": "Runtime Exception",
         "user_badge": "Operator"
@@ -26,11 +30,15 @@ TRANSLATIONS = {
         "system_nominal": "SİSTEM NORMAL",
         "signal_label": "Sinyal",
         "critical_fault": "KRİTİK ARIZA OLAYI",
+        "analysis_pending": "Arıza analiz ediliyor, rapor hazırlanıyor...",
         "remediation_protocol": "Çözüm Protokolü",
         "reference_documents": "Referans Belgeler",
         "system_logs": "Sistem Günlükleri",
         "view_alarm_history": "Alarm Geçmişini Görüntüle",
         "download_report": "Raporu İndir",
+        "newer_logs": "Daha Yeni",
+        "older_logs": "Daha Eski",
+        "prepare_export": "Dışa Aktarımı Hazırla",
         "no_data": "Geçmiş veri bulunamadı.",
         "runtime_exception": "Çalışma Zamanı Hatası",
         "user_badge": "Operatör"
@@ -43,11 +51,15 @@ TRANSLATIONS = {
         "system_nominal": "SYSTEM NOMINAL",
         "signal_label": "Signal",
         "critical_fault": "KRITISCHES STÖRUNGS EREIGNIS",
+        "analysis_pending": "Störung wird analysiert, Bericht in Arbeit...",
         "remediation_protocol": "Abhilfeprotokoll",
         "reference_documents": "Referenzdokumente",
         "system_logs": "Systemprotokolle",
         "view_alarm_history": "Alarmverlauf anzeigen",
         "download_report": "Bericht herunterladen",
+        "newer_logs": "Neuere",
+        "older_logs": "Ältere",
+        "prepare_export": "Export vorbereiten",
         "no_data": "Keine historischen Daten verfügbar.",
         "runtime_exception": "Laufzeitfehler",
         "user_badge": "Bediener"
@@ -60,11 +72,15 @@ TRANSLATIONS = {
         "system_nominal": "SISTEMA NOMINAL",
         "signal_label": "Señal",
         "critical_fault": "EVENTO DE FALLO CRÍTICO",
+        "analysis_pending": "Analizando el fallo, informe en curso...",
         "remediation_protocol": "Protocolo de Remediación",
         "reference_documents": "Documentos de Referencia",
         "system_logs": "Registros del Sistema",
         "view_alarm_history": "Ver Historial de Alarmas",
         "download_report": "Descargar Informe",
+        "newer_logs": "Más recientes",
+        "older_logs": "Más antiguos",
+        "prepare_export": "Preparar exportación",
         "no_data": "No hay datos históricos disponibles.",
         "runtime_exception": "Excepción en tiempo de ejecución",
         "user_badge": "Operador"
@@ -77,11 +93,15 @@ TRANSLATIONS = {
         "system_nominal": "SYSTÈME NOMINAL",
         "signal_label": "Signal",
         "critical_fault": "ÉVÉNEMENT DE DÉFAILLANCE CRITIQUE",
+        "analysis_pending": "Analyse du défaut, rapport en cours...",
         "remediation_protocol": "Protocole de Remédiation",
         "reference_documents": "Documents de Référence",
         "system_logs": "Journaux Système",
         "view_alarm_history": "Voir l'Historique des Alarmes",
         "download_report": "Télécharger le Rapport",
+        "newer_logs": "Plus récents",
+        "older_logs": "Plus anciens",
+        "prepare_export": "Préparer l'export",
         "no_data": "Aucune donnée historique disponible.",
         "runtime_exception": "Exception d'exécution",
         "user_badge": "Opérateur"
@@ -94,11 +114,15 @@ TRANSLATIONS = {
         "system_nominal": "系统正常",
         "signal_label": "信号",
         "critical_fault": "严重故障事件",
+        "analysis_pending": "正在分析故障，报告生成中...",
         "remediation_protocol": "补救协议",
         "reference_documents": "参考文档",
         "system_logs": "系统日志",
         "view_alarm_history": "查看报警历史",
         "download_report": "下载报告",
+        "newer_logs": "较新",
+        "older_logs": "较早",
+        "prepare_export": "准备导出",
         "no_data": "暂无历史数据。",
         "runtime_exception": "运行时异常",
         "user_badge": "操作员"
@@ -111,11 +135,15 @@ TRANSLATIONS = {
         "system_nominal": "システム正常",
         "signal_label": "信号",
         "critical_fault": "重大な障害イベント",
+        "analysis_pending": "故障を分析中、レポート作成中...",
         "remediation_protocol": "修復プロトコル",
         "reference_documents": "参照ドキュメント",
         "system_logs": "システムログ",
         "view_alarm_history": "アラーム履歴を表示",
         "download_report": "レポートをダウンロード",
+        "newer_logs": "新しい",
+        "older_logs": "古い",
+        "prepare_export": "エクスポートを準備",
         "no_data": "履歴データはありません。",
         "runtime_exception": "実行時例外",
         "user_badge": "オペレーター"
@@ -128,11 +156,15 @@ TRANSLATIONS = {
         "system_nominal": "SISTEMA NOMINAL",
         "signal_label": "Sinal",
         "critical_fault": "EVENTO DE FALHA CRÍTICA",
+        "analysis_pending": "Analisando a falha, relatório em andamento...",
         "remediation_protocol": "Protocolo de Correção",
         "reference_documents": "Documentos de Referência",
         "system_logs": "Logs do Sistema",
         "view_alarm_history": "Ver Histórico de Alarmes",
         "download_report": "Baixar Relatório",
+        "newer_logs": "Mais recentes",
+        "older_logs": "Mais antigos",
+        "prepare_export": "Preparar exportação",
         "no_data": "Não há dados históricos disponíveis.",
         "runtime_exception": "Exceção de tempo de execução",
         "user_badge": "Operador"
@@ -145,11 +177,15 @@ TRANSLATIONS = {
         "system_nominal": "СИСТЕМА В НОРМЕ",
         "signal_label": "Сигнал",
         "critical_fault": "КРИТИЧЕСКИЙ СБОЙ",
+        "analysis_pending": "Анализ неисправности, отчёт готовится...",
         "remediation_protocol": "Протокол восстановления",
         "reference_documents": "Справочные документы",
         "system_logs": "Системные журналы",
         "view_alarm_history": "Просмотр истории сигналов",
         "download_report": "Скачать отчет",
+        "newer_logs": "Новее",
+        "older_logs": "Старее",
+        "prepare_export": "Подготовить экспорт",
         "no_data": "Нет исторических данных.",
         "runtime_exception": "Ошибка выполнения",
         "user_badge": "Оператор"
@@ -162,11 +198,15 @@ TRANSLATIONS = {
         "system_nominal": "SISTEMA NOMINALE",
         "signal_label": "Segnale",
         "critical_fault": "EVENTO DI GUASTO CRITICO",
+        "analysis_pending": "Analisi del guasto, rapporto in corso...",
         "remediation_protocol": "Protocollo di Ripristino",
         "reference_documents": "Documenti di Riferimento",
         "system_logs": "Log di Sistema",
         "view_alarm_history": "Visualizza Cronologia Allarmi",
         "download_report": "Scarica Rapporto",
+        "newer_logs": "Più recenti",
+        "older_logs": "Meno recenti",
+        "prepare_export": "Prepara esportazione",
         "no_data": "Nessun dato storico disponibile.",
         "runtime_exception": "Eccezione di Runtime",
         "user_badge": "Operatore"
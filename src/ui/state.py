@@ -1,6 +1,6 @@
 import streamlit as st
 from src.core.container import Container
-from src.core.telemetry import IoTClient
+from src.core.telemetry import create_iot_client
 from src.ui.localization import TRANSLATIONS
 
 def init_session_state():
@@ -9,7 +9,7 @@ def init_session_state():
         # We rely on the Controller to initialize the full stack via Container when needed.
         # However, if we need to store something in session state, we can.
         
-        st.session_state.plc = IoTClient() 
+        st.session_state.plc = create_iot_client()
         st.session_state.last_logged_alarm = None
         
         # Localization Init
@@ -1,9 +1,16 @@
+import time
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 import sqlite3
 import os
 from src.services.monitor import MonitorService
 from src.services.db import DatabaseManager
+from src.services.analysis_pool import AnalysisPool
+from src.services.solution_cache import SolutionCache, MISSING
+from datetime import datetime
+from dataclasses import replace
+from src.config import settings
 
 class TestCaching(unittest.TestCase):
     
@@ -16,6 +23,7 @@ class TestCaching(unittest.TestCase):
         
     def tearDown(self):
         # Cleanup
+        DatabaseManager.flush_logs(timeout=5)
         if os.path.exists(self.test_db):
             os.remove(self.test_db)
 
@@ -62,5 +70,240 @@ class TestCaching(unittest.TestCase):
         mock_ai_instance.generate_report.assert_not_called()
         print("[Test] AI Engine was skipped as expected.")
 
+    def test_concurrent_sessions_share_one_analysis(self):
+        """N sessions missing the cache at once trigger one search + one LLM call, one translation per language."""
+        mock_ai = MagicMock()
+        mock_ai.generate_report.side_effect = lambda code, docs: time.sleep(0.2) or "Shared Solution"
+        mock_kb = MagicMock()
+        mock_kb.search.return_value = []
+        mock_translator = MagicMock()
+        mock_translator.translate_content.side_effect = lambda text, lang: time.sleep(0.1) or f"{lang}:{text}"
+        service = MonitorService(kb=mock_kb, ai_engine=mock_ai, translator=mock_translator)
+
+        results = []
+        threads = [threading.Thread(target=lambda lang=lang: results.append(
+            service.process_cycle("E02", last_processed_payload=None, language=lang)))
+            for lang in ["en", "en", "tr", "tr", "tr"]]
+        for t in threads: t.start()
+        for t in threads: t.join(timeout=5)
+
+        self.assertEqual(sorted(r.ai_report for r in results),
+                         ["Shared Solution"] * 2 + ["tr:Shared Solution"] * 3)
+        mock_ai.generate_report.assert_called_once()
+        mock_kb.search.assert_called_once()
+        mock_translator.translate_content.assert_called_once()
+
+    def test_waiter_timeout_degrades_to_pending(self):
+        """A session that gives up on another session's analysis gets PENDING, not an error."""
+        gate = threading.Event()
+        mock_ai = MagicMock()
+        mock_ai.generate_report.side_effect = lambda code, docs: gate.wait(5) and "Slow Solution"
+        mock_kb = MagicMock()
+        mock_kb.search.return_value = []
+        service = MonitorService(kb=mock_kb, ai_engine=mock_ai, translator=MagicMock())
+
+        leader = threading.Thread(target=service.process_cycle, args=("E10", None))
+        leader.start()
+        deadline = time.time() + 5
+        while not service._analysis_flight.in_flight("E10") and time.time() < deadline:
+            time.sleep(0.01)
+        with patch("src.services.monitor.settings", replace(settings, ANALYSIS_WAIT_TIMEOUT=0.05)):
+            waiter = service.process_cycle("E10", last_processed_payload=None)
+        self.assertEqual((waiter.status, waiter.is_new_alarm), ("PENDING", True))
+
+        gate.set()
+        leader.join(timeout=5)
+        done = service.process_cycle("E10", last_processed_payload="E10")
+        self.assertEqual((done.status, done.ai_report), ("ALARM", "Slow Solution"))
+
+    def test_background_analysis_returns_pending_then_report(self):
+        gate = threading.Event()
+        mock_ai = MagicMock()
+        def streaming_report(code, docs, on_token=None):
+            on_token("Background ")
+            gate.wait(5)
+            on_token("Solution")
+            return "Background Solution"
+        mock_ai.generate_report.side_effect = streaming_report
+        mock_kb = MagicMock()
+        mock_kb.search.return_value = [{"source": "manual.pdf", "page_num": 3, "text": "E03"}]
+        service = MonitorService(kb=mock_kb, ai_engine=mock_ai, translator=MagicMock(), pool=AnalysisPool(workers=1))
+
+        pending = service.process_cycle("E03", last_processed_payload=None)
+        self.assertEqual((pending.status, pending.is_new_alarm), ("PENDING", True))
+        self.assertEqual(pending.sources, mock_kb.search.return_value)
+        deadline = time.time() + 5
+        while not service._partials.get("E03") and time.time() < deadline:
+            time.sleep(0.01)
+        pending = service.process_cycle("E03", last_processed_payload="E03")
+        self.assertEqual((pending.status, pending.partial_report), ("PENDING", "Background "))
+
+        gate.set()
+        service.pool.get("E03").done.wait(5)
+        done = service.process_cycle("E03", last_processed_payload="E03")
+        self.assertEqual((done.status, done.ai_report), ("ALARM", "Background Solution"))
+        mock_ai.generate_report.assert_called_once()
+        mock_kb.search.assert_called_once()
+
+    def test_job_cancelled_mid_cycle_is_queued_again(self):
+        """Another session's release cancels the job right after our submit: PENDING, not a crash."""
+        gate = threading.Event()
+        mock_ai = MagicMock()
+        mock_ai.generate_report.side_effect = lambda code, docs, on_token=None: "Requeued Solution"
+        mock_kb = MagicMock()
+        mock_kb.search.return_value = []
+        pool = AnalysisPool(workers=1)
+        pool.submit("busy", lambda: gate.wait(5))  # keeps E09 queued
+        service = MonitorService(kb=mock_kb, ai_engine=mock_ai, translator=MagicMock(), pool=pool)
+
+        submit, calls = pool.submit, []
+        def submit_then_release(key, fn, acquire=False, sources=None):
+            job = submit(key, fn, acquire=acquire, sources=sources)
+            calls.append(job)
+            if len(calls) == 1:
+                pool.release(key)
+            return job
+        with patch.object(pool, "submit", side_effect=submit_then_release):
+            pending = service.process_cycle("E09", last_processed_payload="E09")
+        self.assertEqual(pending.status, "PENDING")
+        self.assertEqual([job.status for job in calls], ["CANCELLED", "QUEUED"])
+        self.assertEqual(calls[1].interest, 1)
+
+        gate.set()
+        calls[1].done.wait(5)
+        done = service.process_cycle("E09", last_processed_payload="E09")
+        self.assertEqual((done.status, done.ai_report), ("ALARM", "Requeued Solution"))
+
+    def test_solution_lookups_are_served_from_memory(self):
+        DatabaseManager.upsert_solution("E04", "Cached Fix")
+        with patch.object(DatabaseManager, "_get_connection") as mock_conn:
+            for _ in range(5):
+                self.assertEqual(DatabaseManager.get_cached_solution("E04"), "Cached Fix")
+            mock_conn.assert_not_called()
+
+        self.assertIsNone(DatabaseManager.get_cached_solution("E05"))  # miss is remembered too
+        DatabaseManager.upsert_solution("E05", "New Fix")  # upsert invalidates it
+        self.assertEqual(DatabaseManager.get_cached_solution("E05"), "New Fix")
+        self.assertGreaterEqual(DatabaseManager.solution_cache.stats()["hits"], 6)
+
+    def test_connections_are_reused_per_thread(self):
+        conn = DatabaseManager._get_connection()
+        self.assertIs(DatabaseManager._get_connection(), conn)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+        other = []
+        t = threading.Thread(target=lambda: other.append(DatabaseManager._get_connection()))
+        t.start(); t.join()
+        self.assertIsNot(other[0], conn)
+
+        DatabaseManager.close_all()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        self.assertIsNot(DatabaseManager._get_connection(), conn)  # reopened on demand
+
+    def test_log_fault_is_written_in_background(self):
+        for code in ["E06", "E06", "E07", "E06"]:
+            DatabaseManager.log_fault(code, f"Report {code}")
+        self.assertTrue(DatabaseManager.flush_logs(timeout=5))
+
+        logs = DatabaseManager.get_logs_as_df()
+        self.assertEqual(list(logs["error_code"]), ["E06", "E07", "E06"])
+
+    def _insert_logs(self, rows):
+        with DatabaseManager._get_connection() as conn:
+            conn.executemany("INSERT INTO logs (timestamp, ts_epoch, error_code, ai_analysis) VALUES (?, ?, ?, ?)", rows)
+
+    def test_keyset_pagination_and_time_range(self):
+        # Two rows share a timestamp: the id breaks the tie, nothing is skipped or repeated
+        self._insert_logs([("t", 1000 + i // 2, f"E{i % 3}", f"r{i}") for i in range(7)])
+
+        pages, cursor = [], None
+        while True:
+            df, cursor = DatabaseManager.get_logs_page(before=cursor, limit=3)
+            pages.append(list(df["ai_analysis"]))
+            if cursor is None: break
+        self.assertEqual(pages, [["r6", "r5", "r4"], ["r3", "r2", "r1"], ["r0"]])
+        self.assertEqual(list(df.columns), ["id", "timestamp", "error_code", "ai_analysis"])
+
+        df, _ = DatabaseManager.get_logs_page(limit=10, error_code="E1")
+        self.assertEqual(list(df["ai_analysis"]), ["r4", "r1"])
+        self.assertEqual(list(DatabaseManager.get_logs_between(1001, 1003)["ai_analysis"]), ["r5", "r4", "r3", "r2"])
+
+    def test_migrates_legacy_logs_table(self):
+        DatabaseManager.close_all()
+        os.remove(self.test_db)
+        with sqlite3.connect(self.test_db) as conn:
+            conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, error_code TEXT, ai_analysis TEXT)")
+            conn.execute("INSERT INTO logs (timestamp, error_code, ai_analysis) VALUES ('2024-03-01 12:00:00', 'E08', 'old')")
+        conn.close()
+
+        DatabaseManager.init_db()
+        conn = DatabaseManager._get_connection()
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], DatabaseManager.SCHEMA_VERSION)
+        expected = int(datetime(2024, 3, 1, 12).timestamp())
+        self.assertEqual(conn.execute("SELECT ts_epoch FROM logs").fetchone()[0], expected)
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM logs WHERE error_code = 'E08' AND ts_epoch < 5 ORDER BY ts_epoch DESC"))
+        self.assertIn("idx_logs_code_ts", plan)
+
+        DatabaseManager.init_db()  # idempotent
+        self.assertEqual(len(DatabaseManager.get_logs_between(expected, expected + 1)), 1)
+
+    def test_llm_response_cache_evicts_least_recently_used(self):
+        with patch("src.services.db.settings", replace(settings, LLM_RESPONSE_CACHE_BYTES=250)):
+            for key in ("a", "b", "c"):
+                DatabaseManager.put_llm_response(key, "F01662", "llama3.1", key * 100)
+            self.assertIsNone(DatabaseManager.get_llm_response("a"))
+            self.assertEqual(DatabaseManager.get_llm_response("b"), "b" * 100)
+
+            DatabaseManager.put_llm_response("d", "F01662", "llama3.1", "d" * 100)
+            # "b" was just used, so "c" goes
+            self.assertEqual(DatabaseManager.get_llm_response("b"), "b" * 100)
+            self.assertIsNone(DatabaseManager.get_llm_response("c"))
+
+        stats = DatabaseManager.llm_response_stats()
+        self.assertEqual((stats["entries"], stats["bytes"]), (2, 200))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_llm_response_cache_keeps_a_running_byte_total(self):
+        for key, text in [("a", "x" * 10), ("b", "y" * 20), ("a", "z" * 5)]:
+            DatabaseManager.put_llm_response(key, "F01662", "llama3.1", text)
+        conn = DatabaseManager._get_connection()
+        self.assertEqual(conn.execute("SELECT bytes FROM llm_cache_meta").fetchone()[0], 25)
+
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            DatabaseManager.put_llm_response("c", "F01662", "llama3.1", "w" * 7)
+        finally:
+            conn.set_trace_callback(None)
+        self.assertFalse([sql for sql in statements if "SUM(" in sql])
+        self.assertEqual(conn.execute("SELECT bytes FROM llm_cache_meta").fetchone()[0],
+                         conn.execute("SELECT SUM(size) FROM llm_responses").fetchone()[0])
+
+class TestSolutionCache(unittest.TestCase):
+
+    def test_lru_eviction_by_entries_and_size(self):
+        cache = SolutionCache(max_entries=2, max_chars=10)
+        cache.put("A", "aaa")
+        cache.put("B", "bbb")
+        cache.get("A")  # A becomes most recent
+        cache.put("C", "ccc")
+        self.assertIs(cache.get("B"), MISSING)
+        self.assertEqual((cache.get("A"), cache.get("C")), ("aaa", "ccc"))
+
+        cache.put("D", "dddddddd")  # 3 + 8 chars > 10: evicts down to fit
+        self.assertIs(cache.get("A"), MISSING)
+        self.assertEqual(cache.stats()["chars"], 8)
+
+    def test_ttl_and_read_fill_does_not_overwrite(self):
+        cache = SolutionCache(ttl=0.05, negative_ttl=0.01)
+        cache.put("A", "fresh")
+        cache.put("A", None, overwrite=False)
+        self.assertEqual(cache.get("A"), "fresh")
+        time.sleep(0.06)
+        self.assertIs(cache.get("A"), MISSING)
+        self.assertEqual(cache.stats()["misses"], 1)
+
 if __name__ == "__main__":
     unittest.main()
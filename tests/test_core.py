@@ -1,17 +1,48 @@
+import os
+import random
+import asyncio
+import tempfile
 import unittest
-from unittest.mock import MagicMock, patch, mock_open
-from src.core.ai_engine import AIAnalysisEngine
-from src.core.knowledge import KnowledgeBase
-from src.core.knowledge.ingestion import PDFProcessor
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch, mock_open
+from openai import AsyncOpenAI
+from src.core.ai_engine import AIAnalysisEngine, LLMGateway, PRIORITY_LIVE, PRIORITY_WARMUP
+from src.config import settings
+from src.services.db import DatabaseManager
+from src.core.context_packer import ContextPacker
+from src.core.llm_backends import BackendPool, NoHealthyBackend, OPEN
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from src.core.knowledge import KnowledgeBase, mapped_index
+from src.core.knowledge.pages import PageStore
+from src.core.knowledge.scoring import Scorer, TfidfScorer, BM25Scorer
+from concurrent.futures import ThreadPoolExecutor
+from src.core.knowledge.ingestion import PDFProcessor, ParallelExtractor, Chunker
+
+def _use_temp_db(test: unittest.TestCase):
+    """Points DatabaseManager (and so the LLM response cache) at a throwaway file."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    test.addCleanup(DatabaseManager.init_db)
+    test.addCleanup(setattr, DatabaseManager, "DB_NAME", DatabaseManager.DB_NAME)
+    DatabaseManager.DB_NAME = os.path.join(tmp.name, "test_core.db")
+    DatabaseManager.init_db()
 
 class TestCoreModules(unittest.TestCase):
 
+    def setUp(self):
+        _use_temp_db(self)
+
     # --- AI ENGINE TESTS ---
-    @patch("src.core.ai_engine.Groq")  # Mock Groq library
-    def test_ai_generate_report(self, mock_groq):
+    @patch("src.core.ai_engine.AsyncOpenAI")  # Mock OpenAI client (Ollama)
+    def test_ai_generate_report(self, mock_openai):
         """Does AI Engine generate correct prompt and return response?"""
         # Setup
-        mock_client = mock_groq.return_value
+        mock_client = mock_openai.return_value
+        mock_client.chat.completions.create = AsyncMock()
         mock_client.chat.completions.create.return_value.choices[0].message.content = "Mocked Report"
         
         engine = AIAnalysisEngine()
@@ -37,6 +68,177 @@ class TestCoreModules(unittest.TestCase):
         report = engine.generate_report("E01", [])
         self.assertIn("No Data Found", report)
 
+    @staticmethod
+    async def _chunks(*deltas):
+        for delta in deltas:
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = delta
+            yield chunk
+
+    @patch("src.core.ai_engine.AsyncOpenAI")
+    def test_ai_streams_report_tokens(self, mock_openai):
+        """Deltas reach the callback as they arrive; the joined text is returned."""
+        mock_client = mock_openai.return_value
+        mock_client.chat.completions.create = AsyncMock(return_value=self._chunks("Root ", None, "Cause", ""))
+        engine = AIAnalysisEngine(response_cache=DatabaseManager)
+        docs = [{"source": "test.pdf", "page_num": 1, "text": "Error details..."}]
+
+        seen = []
+        report = engine.generate_report("E01", docs, on_token=seen.append)
+
+        self.assertEqual(report, "Root Cause")
+        self.assertEqual(seen, ["Root ", "Cause"])
+        self.assertTrue(mock_client.chat.completions.create.call_args[1]["stream"])
+
+        mock_client.chat.completions.create.return_value = self._chunks("Another ", "report")
+        other_docs = [{"source": "test.pdf", "page_num": 2, "text": "Other details..."}]
+        self.assertEqual("".join(engine.stream_report("E01", other_docs)), "Another report")
+        # Streamed answers are stored like any other
+        self.assertEqual(list(engine.stream_report("E01", docs)), ["Root Cause"])
+
+    @patch("src.core.ai_engine.AsyncOpenAI")
+    def test_ai_stream_failure_is_an_error_not_a_report(self, mock_openai):
+        async def broken_stream():
+            async for chunk in self._chunks("Half a "):
+                yield chunk
+            raise ConnectionError("socket closed")
+        mock_openai.return_value.chat.completions.create = AsyncMock(return_value=broken_stream())
+        engine = AIAnalysisEngine()
+
+        seen = []
+        report = engine.generate_report("E01", [{"source": "t.pdf", "page_num": 1, "text": "x"}], on_token=seen.append)
+        self.assertTrue(report.startswith("AI Service Error"))
+        self.assertEqual(seen[0], "Half a ")
+
+    @patch("src.core.ai_engine.AsyncOpenAI")
+    def test_ai_response_cache_is_keyed_on_content(self, mock_openai):
+        """Same code + same retrieved pages is answered from SQLite; changed pages are not."""
+        create = mock_openai.return_value.chat.completions.create = AsyncMock()
+        create.return_value.choices[0].message.content = "Cached Report"
+        engine = AIAnalysisEngine(response_cache=DatabaseManager)
+        docs = [{"source": "m.pdf", "page_num": 4, "text": "F01662 overvoltage"}]
+
+        self.assertEqual(engine.generate_report("CODE=F01662", docs), "Cached Report")
+        self.assertEqual(engine.generate_report("f01662", docs), "Cached Report")
+        seen = []
+        self.assertEqual(engine.generate_report("F01662", docs, on_token=seen.append), "Cached Report")
+        self.assertEqual(seen, ["Cached Report"])
+        self.assertEqual(create.await_count, 1)
+
+        rebuilt = [{"source": "m.pdf", "page_num": 4, "text": "F01662 overvoltage (rev. B)"}]
+        engine.generate_report("F01662", rebuilt)
+        self.assertEqual(create.await_count, 2)
+        stats = DatabaseManager.llm_response_stats()
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (2, 2, 2))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+        # Errors are never cached
+        create.side_effect = ConnectionError("down")
+        self.assertTrue(engine.generate_report("F07800", docs).startswith("AI Service Error"))
+        self.assertEqual(DatabaseManager.llm_response_stats()["entries"], 2)
+
+    def test_llm_gateway_runs_live_requests_before_warmup(self):
+        """With one slot busy, a later live request overtakes queued warm-up work."""
+        gateway = LLMGateway(max_concurrency=1, min_concurrency=1, target_latency=10)
+        order = []
+
+        def job(name, delay=0.0):
+            async def run():
+                await asyncio.sleep(delay)
+                order.append(name)
+                return name
+            return run
+
+        blocker = gateway.submit(job("blocker", 0.2), PRIORITY_WARMUP)
+        time.sleep(0.05) # blocker is running, the rest queue up
+        warm = [gateway.submit(job(f"warm{i}"), PRIORITY_WARMUP) for i in range(3)]
+        live = gateway.submit(job("live"), PRIORITY_LIVE)
+
+        self.assertEqual(live.result(timeout=5), "live")
+        for f in warm: f.result(timeout=5)
+        blocker.result(timeout=5)
+        self.assertEqual(order, ["blocker", "live", "warm0", "warm1", "warm2"])
+        self.assertEqual(gateway.stats()["in_flight"], 0)
+
+    def test_llm_gateway_deadlines_and_backoff(self):
+        """Expired requests fail with TimeoutError; slow or timed-out calls shrink the limit."""
+        gateway = LLMGateway(max_concurrency=4, min_concurrency=1, target_latency=0.05)
+
+        async def slow():
+            await asyncio.sleep(0.3)
+            return "late"
+
+        with self.assertRaises(TimeoutError):
+            gateway.submit(slow, timeout=0.1).result(timeout=5)
+        self.assertLess(gateway.limit, 4)
+
+        # A deadline that passes while the request waits in the queue
+        gateway.limit = 1.0
+        running = gateway.submit(slow)
+        queued = gateway.submit(slow, timeout=0.05)
+        with self.assertRaises(TimeoutError):
+            queued.result(timeout=5)
+        self.assertEqual(running.result(timeout=5), "late")
+        self.assertEqual(gateway.stats()["expired"], 2)
+
+        # Fast completions grow it back additively, never above the maximum
+        async def fast():
+            return "ok"
+        for _ in range(40):
+            gateway.submit(fast).result(timeout=5)
+        self.assertEqual(gateway.concurrency, 4)
+
+    def test_llm_gateway_decreases_once_per_congestion_event(self):
+        """Four slow requests in flight together shrink the limit once, not four times."""
+        gateway = LLMGateway(max_concurrency=4, min_concurrency=1, target_latency=0.05)
+
+        async def slow():
+            await asyncio.sleep(0.2)
+            return "slow"
+
+        futures = [gateway.submit(slow) for _ in range(4)]
+        for f in futures: f.result(timeout=5)
+        self.assertAlmostEqual(gateway.limit, 4 * 0.7)
+
+        # A request started after that decrease is a new event
+        gateway.submit(slow).result(timeout=5)
+        self.assertAlmostEqual(gateway.limit, 4 * 0.7 * 0.7)
+
+        # A caller may cancel a request that is still queued (limit is 1 now)
+        blocker = gateway.submit(slow)
+        time.sleep(0.05)
+        cancelled = gateway.submit(slow, PRIORITY_WARMUP)
+        self.assertTrue(cancelled.cancel())
+        self.assertEqual(blocker.result(timeout=5), "slow")
+        self.assertEqual(gateway.submit(slow).result(timeout=5), "slow")
+        self.assertEqual(gateway.stats()["in_flight"], 0)
+
+    def test_llm_gateway_warmup_timeout_starts_at_dispatch(self):
+        """Warm-up work may queue behind slow calls; only its own execution is timed."""
+        gateway = LLMGateway(max_concurrency=1, min_concurrency=1, target_latency=10)
+
+        async def slow():
+            await asyncio.sleep(0.3)
+            return "done"
+
+        running = gateway.submit(slow, PRIORITY_WARMUP, timeout=1)
+        queued = [gateway.submit(slow, PRIORITY_WARMUP, timeout=0.5) for _ in range(3)]
+        self.assertEqual([f.result(timeout=5) for f in [running] + queued], ["done"] * 4)
+        self.assertEqual(gateway.stats()["expired"], 0)
+
+        with self.assertRaises(TimeoutError):
+            gateway.submit(slow, PRIORITY_WARMUP, timeout=0.1).result(timeout=5)
+
+    @patch("src.core.ai_engine.AsyncOpenAI")
+    def test_ai_deadline_is_reported_as_service_error(self, mock_openai):
+        async def hang(**kwargs):
+            await asyncio.sleep(1)
+        mock_openai.return_value.chat.completions.create = hang
+        engine = AIAnalysisEngine()
+
+        report = engine.generate_report("E01", [{"source": "t.pdf", "page_num": 1, "text": "x"}], timeout=0.1)
+        self.assertTrue(report.startswith("AI Service Error: Request timed out"))
+
     # --- KNOWLEDGE BASE TESTS ---
     @patch("src.core.knowledge.store.os.path.exists")
     @patch("src.core.knowledge.store.os.listdir")
@@ -61,6 +263,295 @@ class TestCoreModules(unittest.TestCase):
             self.assertEqual(len(results), 1)
             self.assertEqual(results[0]['page_num'], 1)
 
+    def test_code_index_matches_page_scan(self):
+        """Inverted code index should return the same pages as a full scan."""
+        with patch.object(KnowledgeBase, '_initialize_library'):
+            kb = KnowledgeBase()
+            kb.pages = [
+                {"text": "F01662 overvoltage, see also A01590.", "page_num": 1, "source": "a.pdf"},
+                {"text": "Nothing here.", "page_num": 2, "source": "a.pdf"},
+                {"text": "A01590 fan fault. A01590 repeated.", "page_num": 3, "source": "b.pdf"}
+            ]
+
+            index = KnowledgeBase._build_code_index(kb.pages)
+            self.assertEqual(index["A01590"], [0, 2])
+            self.assertEqual(index["F01662"], [0])
+
+            results = kb.search("A01590")
+            self.assertEqual([r['page_num'] for r in results], [1, 3])
+
+    def test_code_lookup_matches_substring_scan_for_glued_codes(self):
+        """Codes inside longer tokens (prefixes, glued words) are found like the old substring scan."""
+        with patch.object(KnowledgeBase, '_initialize_library'):
+            kb = KnowledgeBase()
+        kb.pages = [
+            {"text": "Parameter F016620 limits.", "page_num": 1, "source": "a.pdf"},
+            {"text": "See alarmF01662 in the list.", "page_num": 2, "source": "a.pdf"},
+            {"text": "F01662_x overvoltage, A01590 fan.", "page_num": 3, "source": "a.pdf"},
+            {"text": "F0166 is something else.", "page_num": 4, "source": "a.pdf"}
+        ]
+        for code in ["F01662", "F0166", "A0159", "A01590", "F016620", "Z9999"]:
+            scan = [idx for idx, page in enumerate(kb.pages) if code in page['text']]
+            self.assertEqual(list(kb._pages_with_code(code)), scan, code)
+        self.assertEqual(kb.code_hit_counts()["F01662"], 3)
+
+    def test_search_codes_bulk(self):
+        """Bulk code search returns per-code documents and page hit counts."""
+        with patch.object(KnowledgeBase, '_initialize_library'):
+            kb = KnowledgeBase()
+        kb.pages = [
+            {"text": "F01662 overvoltage, see also A01590.", "page_num": 1, "source": "a.pdf"},
+            {"text": "A01590 fan fault.", "page_num": 2, "source": "a.pdf"}
+        ]
+
+        result = kb.search_codes(["A01590", "F01662", "A01590", "Z99999"])
+
+        self.assertEqual(list(result.docs), ["A01590", "F01662", "Z99999"])
+        self.assertEqual([d['page_num'] for d in result.docs["A01590"]], [1, 2])
+        self.assertEqual(result.docs["Z99999"], [])
+        self.assertEqual(result.hit_counts, {"A01590": 2, "F01662": 1, "Z99999": 0})
+        self.assertEqual(kb.code_hit_counts(), {"A01590": 2, "F01662": 1})
+
+    def test_incremental_reindex_only_extracts_changed_files(self):
+        """Touching one manual should re-extract only that manual."""
+        with tempfile.TemporaryDirectory() as tmp:
+            sources, cache = os.path.join(tmp, "sources"), os.path.join(tmp, "cache")
+            os.makedirs(sources)
+            for name in ("a.pdf", "b.pdf"):
+                with open(os.path.join(sources, name), "w") as f:
+                    f.write(name)
+
+            def fake_extract(path, chunker=None):
+                return [{"source": os.path.basename(path), "page_num": 1, "text": f"F01662 in {os.path.basename(path)}"}]
+
+            mock_settings = MagicMock(SOURCES_DIR=sources, CACHE_DIR=cache, INGEST_MODE="thread",
+                                      INGEST_WORKERS=2, INGEST_FILE_TIMEOUT=0, INGEST_BATCH_PAGES=50,
+                                      RETRIEVAL_ENGINE="tfidf", CHUNK_SIZE=0, CHUNK_OVERLAP=0)
+            with patch("src.core.knowledge.store.settings", mock_settings), \
+                 patch("src.core.knowledge.ingestion.PDFProcessor.extract_content", side_effect=fake_extract) as mock_extract:
+                kb = KnowledgeBase()
+                self.assertEqual(mock_extract.call_count, 2)
+                self.assertEqual(len(kb.pages), 2)
+
+                # Unchanged library: served from cache, nothing extracted
+                mock_extract.reset_mock()
+                KnowledgeBase()
+                mock_extract.assert_not_called()
+
+                # One manual changed, one removed, one added
+                with open(os.path.join(sources, "a.pdf"), "w") as f:
+                    f.write("a.pdf v2")
+                os.remove(os.path.join(sources, "b.pdf"))
+                with open(os.path.join(sources, "c.pdf"), "w") as f:
+                    f.write("c.pdf")
+
+                mock_extract.reset_mock()
+                kb = KnowledgeBase()
+                extracted = sorted(os.path.basename(c.args[0]) for c in mock_extract.call_args_list)
+                self.assertEqual(extracted, ["a.pdf", "c.pdf"])
+                self.assertEqual(sorted(p['source'] for p in kb.pages), ["a.pdf", "c.pdf"])
+                self.assertEqual(len(os.listdir(os.path.join(cache, "shards"))), 2)
+
+    def test_mapped_index_roundtrip(self):
+        """Index saved to the mmap format should search exactly like the in-memory one."""
+        pages = [
+            {"source": "a.pdf", "page_num": 3, "text": "F01662 DC link overvoltage, check supply."},
+            {"source": "b.pdf", "page_num": 7, "text": "Überhitzung: A01590 fan failure, replace fan."},
+            {"source": "a.pdf", "page_num": 9, "text": "Motor encoder wiring and shielding."}
+        ]
+        built = KnowledgeBase(scorer=TfidfScorer(), pages=pages)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index_test")
+            mapped_index.save_index(path, built.pages, built.scorer, built.code_index)
+            self.assertTrue(mapped_index.is_complete(path, "tfidf"))
+            self.assertFalse(mapped_index.is_complete(path, "bm25"))
+
+            with patch.object(KnowledgeBase, '_initialize_library'):
+                loaded = KnowledgeBase()
+            loaded._load_cache(path)
+
+            self.assertEqual(list(loaded.pages), pages)
+            # Read-only arrays: CSR buffers are served straight from the mmap'ed .npy files
+            self.assertFalse(loaded.scorer.vectors.data.flags.writeable)
+            self.assertFalse(loaded.scorer.vectors.indices.flags.writeable)
+            for query in ("A01590", "encoder shielding", "F01662"):
+                self.assertEqual(loaded.search(query), built.search(query))
+            del loaded
+
+    def test_save_index_loses_rename_race_quietly(self):
+        """A second process finishing the same index keeps the first one and cleans up its temp dir."""
+        kb = KnowledgeBase(scorer=TfidfScorer(), pages=[{"source": "a.pdf", "page_num": 1, "text": "F01662 overvoltage"}])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index_test")
+            mapped_index.save_index(path, kb.pages, kb.scorer, kb.code_index)
+            mapped_index.save_index(path, kb.pages, kb.scorer, kb.code_index)
+            self.assertEqual(os.listdir(tmp), ["index_test"])
+            self.assertTrue(mapped_index.is_complete(path, "tfidf"))
+
+    def test_prune_keeps_other_processes_index_builds(self):
+        """Superseded indexes go; another live process's .tmp build directory stays."""
+        with tempfile.TemporaryDirectory() as cache:
+            names = ["index_old_tfidf", "index_new_tfidf", f"index_new_bm25.{os.getpid()}.tmp",
+                     "index_new_bm25.999999999.tmp"]
+            for name in names:
+                os.makedirs(os.path.join(cache, name))
+            open(os.path.join(cache, "library_old.pkl"), "wb").close()
+
+            with patch("src.core.knowledge.store.settings", MagicMock(CACHE_DIR=cache, RETRIEVAL_ENGINE="tfidf")), \
+                    patch.object(KnowledgeBase, '_initialize_library'):
+                KnowledgeBase()._prune_library_caches(keep=os.path.join(cache, "index_new_tfidf"))
+
+            self.assertEqual(sorted(os.listdir(cache)), ["index_new_bm25.%d.tmp" % os.getpid(), "index_new_tfidf"])
+
+    def test_vector_top_k_matches_full_sort(self):
+        """argpartition top-k and batched search should equal the full cosine argsort."""
+        rng = random.Random(7)
+        words = ["motor", "fan", "encoder", "voltage", "supply", "brake", "cable", "sensor", "drive", "fuse"]
+        pages = [{"source": "m.pdf", "page_num": i + 1, "text": " ".join(rng.choices(words, k=12))}
+                 for i in range(60)]
+        kb = KnowledgeBase(scorer=TfidfScorer(), pages=pages)
+
+        queries = ["motor brake", "fan voltage sensor", "drive cable fuse", "nothing matches here"]
+        for query in queries:
+            sims = cosine_similarity(kb.scorer.vectorizer.transform([query]), kb.scorer.vectors).flatten()
+            expected = [i for i in np.argsort(-sims, kind="stable") if sims[i] > 0.15][:5]
+            self.assertEqual([p['page_num'] - 1 for p in kb.search(query)], expected)
+
+        self.assertEqual(kb.search_many(queries), [kb.search(q) for q in queries])
+
+    def test_incomplete_scorer_fails_at_construction(self):
+        class Partial(Scorer):
+            name = "partial"
+            def fit(self, texts): return self
+        with self.assertRaises(TypeError):
+            Partial()
+
+    def test_bm25_scorer_and_fusion(self):
+        """BM25 ranks the most relevant page first and fuses code hits with its ranking."""
+        pages = [
+            {"source": "m.pdf", "page_num": 1, "text": "Fan failure A01590: check the fan supply and replace the fan."},
+            {"source": "m.pdf", "page_num": 2, "text": "General safety notes. " * 20 + "fan"},
+            {"source": "m.pdf", "page_num": 3, "text": "Brake resistor overheating F07801, check brake chopper."},
+            {"source": "m.pdf", "page_num": 4, "text": "Index of alarms: A01590 F07801 F01662"}
+        ]
+        kb = KnowledgeBase(scorer=BM25Scorer(), pages=pages)
+
+        scores = kb.scorer.score(["replace fan"]).toarray().ravel()
+        self.assertEqual(int(np.argmax(scores)), 0)
+
+        # Code hits (pages 1 and 4) lead; BM25 fills in and reorders by fused rank
+        results = kb.search("A01590 fan")
+        self.assertEqual(results[0]['page_num'], 1)
+        self.assertIn(4, [r['page_num'] for r in results])
+        self.assertLessEqual(len(results), 5)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index_bm25")
+            mapped_index.save_index(path, kb.pages, kb.scorer, kb.code_index)
+            pages_loaded, scorer, _ = mapped_index.load_index(path, BM25Scorer)
+            np.testing.assert_allclose(scorer.score(["replace fan"]).toarray().ravel(), scores)
+            del pages_loaded, scorer
+
+    def test_page_store_views(self):
+        """Compact page store keeps the dict-style access pattern."""
+        records = [
+            {"source": "a.pdf", "page_num": 1, "text": "Überstrom F07801"},
+            {"source": "b.pdf", "page_num": 4, "text": "Lüfter A01590"},
+            {"source": "a.pdf", "page_num": 2, "text": ""}
+        ]
+        store = PageStore.from_records(records)
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.sources, ["a.pdf", "b.pdf"])
+        self.assertEqual(store.source_ids.tolist(), [0, 1, 0])
+        self.assertIs(store[0]['source'], store[2]['source'])  # one interned name per file
+
+        doc = store[1]
+        self.assertEqual((doc['source'], doc['page_num'], doc['text']), ("b.pdf", 4, "Lüfter A01590"))
+        self.assertEqual(doc, records[1])
+        self.assertEqual(doc.get("missing", "-"), "-")
+        self.assertFalse(hasattr(doc, "__dict__"))
+        self.assertEqual(list(store.texts()), [r['text'] for r in records])
+
+    def test_chunker_splits_on_alarm_codes(self):
+        """Chunks stay within size, overlap with the previous window and open at alarm codes."""
+        raw = ("Safety instructions for the converter.\n" + "Read the commissioning section first.\n" * 20 +
+               "F01662 DC link overvoltage\nCause: supply voltage too high.\n\n"
+               "A01590 Fan failure\nRemedy: replace the fan.")
+        chunks = Chunker(size=250, overlap=60).split(raw)
+
+        self.assertTrue(all(len(c) <= 250 for c in chunks))
+        self.assertTrue(chunks[0].startswith("Safety instructions"))
+        # Continuation chunks repeat trailing context from the previous window
+        self.assertTrue(chunks[1].startswith("Read the commissioning section first."))
+        self.assertTrue(chunks[0].endswith("Read the commissioning section first."))
+        # So do alarm chunks: the text just before the heading is shared
+        self.assertEqual(chunks[-2], "Read the commissioning section first. "
+                                     "F01662 DC link overvoltage Cause: supply voltage too high.")
+        self.assertEqual(chunks[-1], "F01662 DC link overvoltage Cause: supply voltage too high. "
+                                     "A01590 Fan failure Remedy: replace the fan.")
+
+    def test_chunker_overlap_never_exceeds_size(self):
+        """A continuation window with overlap still fits when the next paragraph is long."""
+        raw = "\n\n".join(["short tail text", "x" * 90, "tail part", "y" * 95, "z" * 60, "w" * 99])
+        for size, overlap in ((100, 40), (120, 60), (250, 100)):
+            chunks = Chunker(size=size, overlap=overlap).split(raw)
+            self.assertLessEqual(max(len(c) for c in chunks), size)
+            self.assertGreaterEqual("".join(chunks).count("y"), 95) # nothing lost
+
+    def test_prompt_context_respects_token_budget(self):
+        """Context packing keeps attribution and stops at the token budget."""
+        packer = ContextPacker(token_budget=1000)
+        docs = [{"source": "m.pdf", "page_num": i, "text": "x" * 2000} for i in range(1, 6)]
+
+        packed = packer.pack(docs)
+
+        self.assertLessEqual(packer.estimate_tokens(packed.text), 1000 + 10)
+        self.assertIn("--- Source: m.pdf (Page 1) ---", packed.text)
+        self.assertIn("(Page 2)", packed.text)
+        self.assertNotIn("(Page 3)", packed.text)
+        self.assertEqual(packed.sources, [("m.pdf", 1), ("m.pdf", 2)])
+        self.assertEqual((packed.trimmed, packed.dropped), (1, 3))
+        self.assertEqual(packed.tokens, packer.estimate_tokens(packed.text) - 1)
+
+    def test_context_packer_ranks_by_code_and_keeps_it_when_trimming(self):
+        docs = [
+            {"source": "a.pdf", "page_num": 1, "text": "General safety notes. " * 40},
+            {"source": "a.pdf", "page_num": 7, "text": "Intro. " * 100 + "F01662 overvoltage: check the DC link."},
+            {"source": "b.pdf", "page_num": 3, "text": "F01662 DC link overvoltage, reduce braking energy."},
+            {"source": "b.pdf", "page_num": 9, "text": "Braking resistor sizing."},
+        ]
+        packer = ContextPacker(token_budget=160, min_chars=100)
+
+        # Passages with the code first (earliest mention leads), the rest in retrieval order
+        self.assertEqual([d["page_num"] for d in packer.rank(docs, ["F01662"])], [3, 7, 1, 9])
+        bm25_scale = [{"text": "no code", "score": 7.5}, {"text": "F01662 overvoltage", "score": 3.1}]
+        self.assertEqual([d["text"] for d in packer.rank(bm25_scale, ["F01662"])], ["F01662 overvoltage", "no code"])
+
+        packed = packer.pack(docs, ["F01662"])
+        self.assertEqual(packed.sources, [("b.pdf", 3), ("a.pdf", 7)])
+        self.assertIn("F01662 overvoltage: check the DC link.", packed.text) # window moved to the code
+        self.assertLessEqual(packed.tokens, 160)
+        stats = packer.stats()
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["saved_ratio"], 0)
+
+    @patch("src.core.ai_engine.AsyncOpenAI")
+    def test_ai_engine_records_packed_tokens(self, mock_openai):
+        mock_openai.return_value.chat.completions.create = AsyncMock()
+        engine = AIAnalysisEngine()
+        docs = [{"source": "m.pdf", "page_num": i, "text": "F01662 " + "y" * 20000} for i in range(1, 4)]
+
+        engine.generate_report("F01662", docs)
+
+        sent = mock_openai.return_value.chat.completions.create.call_args[1]["messages"][1]["content"]
+        stats = engine.context_stats()
+        self.assertEqual(stats["requests"], 1)
+        self.assertLessEqual(stats["packed_tokens"], settings.PROMPT_TOKEN_BUDGET)
+        self.assertGreater(stats["raw_tokens"], 15000)
+        self.assertIn("(Page 1)", sent)
+
     # --- PDF PROCESSOR TEST ---
     @patch("src.core.knowledge.ingestion.PdfReader")
     def test_pdf_extraction(self, mock_reader):
@@ -79,4 +570,194 @@ class TestCoreModules(unittest.TestCase):
         # Assert: Should return only the page with text
         self.assertEqual(len(pages), 1)
         self.assertEqual(pages[0]['text'], "Page 1 Detail")
-        self.assertEqual(pages[0]['source'], "dummy.pdf")
\ No newline at end of file
+        self.assertEqual(pages[0]['source'], "dummy.pdf")
+
+    @patch("src.core.knowledge.ingestion.PdfReader")
+    def test_parallel_extraction_page_batches(self, mock_reader):
+        """Page batches of one file are reassembled in order with streamed progress."""
+        pages = []
+        for i in range(5):
+            page = MagicMock()
+            page.extract_text.return_value = f"Page {i + 1}\nText" if i != 2 else ""
+            pages.append(page)
+        mock_reader.return_value.pages = pages
+
+        extractor = ParallelExtractor(mode="process", workers=2, batch_pages=2)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            events = list(extractor._extract_pages(executor, ["manual.pdf"]))
+
+        self.assertEqual(len(events), 3)  # 3 batches -> 2 progress events + final
+        final = events[-1]
+        self.assertTrue(final.finished)
+        self.assertEqual(final.pages_total, 5)
+        self.assertEqual([p['page_num'] for p in final.pages], [1, 2, 4, 5])
+        self.assertEqual(final.pages[0], {"source": "manual.pdf", "page_num": 1, "text": "Page 1 Text"})
+
+    @patch("src.core.knowledge.ingestion.PdfReader")
+    def test_parallel_extraction_failed_batch_fails_the_file(self, mock_reader):
+        """A file with a failed page batch is reported as an error, never as a (partial) success."""
+        good, bad = MagicMock(), MagicMock()
+        good.extract_text.return_value = "Page text"
+        bad.extract_text.side_effect = ValueError("broken content stream")
+        mock_reader.return_value.pages = [good, good, bad, good]
+
+        extractor = ParallelExtractor(mode="process", workers=1, batch_pages=2)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            events = list(extractor._extract_pages(executor, ["manual.pdf"]))
+
+        final = events[-1]
+        self.assertTrue(final.finished)
+        self.assertIsNone(final.pages)
+        self.assertEqual(final.error, "broken content stream")
+
+    def test_parallel_extraction_on_process_pool(self):
+        """Real PDFs through the process pool: batches are spread over workers and reassembled."""
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for name, count in (("a.pdf", 5), ("b.pdf", 3)):
+                path = os.path.join(tmp, name)
+                _write_pdf(path, [f"{name} page {i + 1} F0{i + 1}001" for i in range(count)])
+                files.append(path)
+
+            events = list(ParallelExtractor(mode="process", workers=2, batch_pages=2).extract(files))
+
+        finals = {os.path.basename(e.path): e for e in events if e.finished}
+        self.assertEqual(set(finals), {"a.pdf", "b.pdf"})
+        self.assertTrue(all(e.error is None for e in finals.values()))
+        self.assertEqual([p["page_num"] for p in finals["a.pdf"].pages], [1, 2, 3, 4, 5])
+        self.assertIn("a.pdf page 4 F04001", finals["a.pdf"].pages[3]["text"])
+        self.assertEqual(len(finals["b.pdf"].pages), 3)
+
+
+def _write_pdf(path: str, page_texts):
+    """Minimal text PDF (one Helvetica line per page), enough for pypdf's extract_text."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out, offsets = b"%PDF-1.4\n", []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+class _FakeOllama:
+    """Local stand-in for an OpenAI-compatible host: fixed answer, optional delay or HTTP 500."""
+    def __init__(self, answer: str, delay: float = 0.0, status: int = 200):
+        self.answer, self.delay, self.status = answer, delay, status
+        self.completions = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply(200, {"object": "list", "data": [{"id": "llama3.1", "object": "model", "created": 0, "owned_by": "me"}]})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.completions += 1
+                time.sleep(fake.delay)
+                if fake.status != 200:
+                    return self._reply(fake.status, {"error": {"message": "model crashed"}})
+                self._reply(200, {
+                    "id": "c1", "object": "chat.completion", "created": 0, "model": "llama3.1",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": fake.answer}}]
+                })
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestLLMBackends(unittest.TestCase):
+
+    def setUp(self):
+        _use_temp_db(self)
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def _serve(self, *args, **kwargs) -> _FakeOllama:
+        server = _FakeOllama(*args, **kwargs)
+        self.servers.append(server)
+        return server
+
+    @staticmethod
+    async def _ask(client):
+        response = await client.chat.completions.create(model="llama3.1", messages=[{"role": "user", "content": "E01"}])
+        return response.choices[0].message.content
+
+    def test_least_outstanding_spreads_concurrent_requests(self):
+        a, b = self._serve("A", delay=0.2), self._serve("B", delay=0.2)
+        pool = BackendPool([a.url, b.url], AsyncOpenAI, health_interval=0)
+
+        async def burst():
+            return await asyncio.gather(*(pool.call(self._ask) for _ in range(4)))
+
+        self.assertEqual(sorted(asyncio.run(burst())), ["A", "A", "B", "B"])
+        self.assertEqual((a.completions, b.completions), (2, 2))
+        stats = pool.stats()
+        self.assertEqual([s["requests"] for s in stats], [2, 2])
+        self.assertTrue(all(s["latency_ewma_s"] >= 0.2 and s["chars_per_s"] > 0 for s in stats))
+
+    def test_server_errors_fail_over_and_open_the_circuit(self):
+        broken, good = self._serve("broken", status=500), self._serve("ok")
+        engine = AIAnalysisEngine()
+        engine.backends = BackendPool([broken.url, good.url], AsyncOpenAI, failure_threshold=1,
+                                      cooldown=60, health_interval=0)
+        docs = [{"source": "t.pdf", "page_num": 1, "text": "x"}]
+
+        self.assertEqual(engine.generate_report("E01", docs), "ok")
+        self.assertEqual(engine.backend_stats()[0]["state"], OPEN)
+        self.assertEqual(engine.generate_report("E02", docs), "ok")
+        self.assertEqual(broken.completions, 1) # not retried while the circuit is open
+
+        good.status = 500
+        report = engine.generate_report("E03", docs)
+        self.assertTrue(report.startswith("AI Service Error: Connection to Local LLM failed"))
+        self.assertEqual(engine.backend_stats()[1]["errors"], 1)
+
+        async def no_backend():
+            return await engine.backends.call(self._ask)
+        with self.assertRaises(NoHealthyBackend):
+            asyncio.run(no_backend())
+
+    def test_health_check_routes_around_a_dead_host(self):
+        a, b = self._serve("A"), self._serve("B")
+        pool = BackendPool([a.url, b.url], AsyncOpenAI, health_interval=0, health_timeout=2)
+        a.stop()
+        self.servers.remove(a)
+
+        async def probe_then_ask():
+            await pool.check_health()
+            return await pool.call(self._ask)
+
+        self.assertEqual(asyncio.run(probe_then_ask()), "B")
+        self.assertEqual([s["healthy"] for s in pool.stats()], [False, True])
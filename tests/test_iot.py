@@ -1,6 +1,17 @@
+import json
+import time
+import base64
+import asyncio
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
+from websockets.asyncio.server import serve
 from src.core.telemetry import IoTClient
+from src.core.http_client import PooledHTTPClient
+from src.core.telemetry_async import AsyncIoTClient
+from src.core.telemetry_store import TelemetryEvent, TelemetryRing, TelemetryStore
+from src.services.monitor import CycleResult
+from src.ui.controller import _new_events, smart_monitoring_cycle
 
 class TestIoT(unittest.TestCase):
     
@@ -8,7 +19,7 @@ class TestIoT(unittest.TestCase):
         # Reset singleton instance (for test isolation)
         IoTClient._instance = None
     
-    @patch("src.core.telemetry.requests.post")
+    @patch("src.core.http_client.requests.Session.request")
     def test_get_token_success(self, mock_post):
         """Should return string if token retrieval succeeds."""
         mock_post.return_value.status_code = 200
@@ -20,7 +31,7 @@ class TestIoT(unittest.TestCase):
             token = client._get_token()
             self.assertEqual(token, "SECRET_TOKEN")
 
-    @patch("src.core.telemetry.requests.post")
+    @patch("src.core.http_client.requests.Session.request")
     def test_get_token_fail(self, mock_post):
         """Should return None if login fails."""
         mock_post.return_value.status_code = 401
@@ -28,4 +39,306 @@ class TestIoT(unittest.TestCase):
         with patch.object(IoTClient, '_start_background_worker'):
             client = IoTClient()
             token = client._get_token()
-            self.assertIsNone(token)
\ No newline at end of file
+            self.assertIsNone(token)
+
+    def _client(self, devices):
+        with patch.object(IoTClient, '_start_background_worker'):
+            client = IoTClient()
+        client.device_ids = list(devices)
+        client.keys = ["llm_payload", "temperature"]
+        return client
+
+    def test_multiplexed_subscriptions(self):
+        """One subscription frame covers every device; updates are routed by subscriptionId."""
+        client = self._client(["dev-a", "dev-b"])
+        ws = MagicMock()
+        client._on_open(ws)
+
+        cmds = json.loads(ws.send.call_args.args[0])["tsSubCmds"]
+        self.assertEqual([c["entityId"] for c in cmds], ["dev-a", "dev-b"])
+        self.assertEqual(cmds[0]["keys"], "llm_payload,temperature")
+        ids = {c["entityId"]: c["cmdId"] for c in cmds}
+
+        client._on_message(ws, json.dumps({"subscriptionId": ids["dev-b"], "data": {
+            "llm_payload": [[1, "CODE=F30001"]], "temperature": [[1, "71.5"]]}}))
+        client._on_message(ws, json.dumps({"subscriptionId": ids["dev-a"], "data": {"llm_payload": [[2, "BH"]]}}))
+        client._on_message(ws, json.dumps({"subscriptionId": 99, "data": {"llm_payload": [[3, "X"]]}}))
+
+        self.assertEqual(client.get_latest_payloads(), {"dev-a": "BH", "dev-b": "F30001"})
+        self.assertEqual(client.get_latest_payloads(["dev-b"], key="temperature"), {"dev-b": "71.5"})
+        self.assertEqual(client.get_latest_payload(), "BH")
+        self.assertEqual(client.get_latest_payload("dev-b"), "F30001")
+        self.assertIsNone(client.get_latest_payload("dev-c"))
+
+    def test_subscribe_adds_devices_on_live_connection(self):
+        client = self._client(["dev-a"])
+        client._on_open(MagicMock())
+        client.ws, client.is_connected = MagicMock(), True
+
+        client.subscribe(["dev-a", "dev-c"])
+        cmds = json.loads(client.ws.send.call_args.args[0])["tsSubCmds"]
+        self.assertEqual([(c["entityId"], c["cmdId"]) for c in cmds], [("dev-c", 2)])
+        self.assertEqual(client.device_ids, ["dev-a", "dev-c"])
+
+    def test_history_keeps_transitions_between_reads(self):
+        """A fault that flips and clears within one refresh is still visible via read_since."""
+        client = self._client(["dev-a"])
+        client._on_open(MagicMock())
+        client._on_message(None, json.dumps({"subscriptionId": 1, "data": {
+            "llm_payload": [[3000, "BH"], [1000, "BH"], [2000, "CODE=F07011"]]}}))
+
+        events = client.read_since(0)
+        self.assertEqual([e.value for e in events], ["BH", "F07011", "BH"])
+        self.assertEqual([e.ts for e in events], [1.0, 2.0, 3.0])
+        self.assertEqual(client.get_latest_payload(), "BH")
+
+        client._on_message(None, json.dumps({"subscriptionId": 1, "data": {"llm_payload": [[4000, "A01009"]]}}))
+        self.assertEqual([(e.seq, e.value) for e in client.read_since(events[-1].seq)], [(4, "A01009")])
+        self.assertEqual(client.read_since(4), [])
+
+    def test_reconnect_snapshot_does_not_repeat_history(self):
+        """The snapshot fetched on every reconnect re-sends the latest point; it is only stored once."""
+        client = self._client(["dev-a"])
+        client._on_open(MagicMock())
+        client._on_message(None, json.dumps({"subscriptionId": 1, "data": {
+            "llm_payload": [[1000, "CODE=F07011"], [2000, "BH"]]}}))
+
+        client.token, client.http = "t", MagicMock()
+        client.http.get.return_value.status_code = 200
+        client.http.get.return_value.json.return_value = {"llm_payload": [{"ts": 2000, "value": "BH"}]}
+        client._fetch_device_snapshot("dev-a")
+        self.assertEqual([e.value for e in client.read_since(0)], ["F07011", "BH"])
+
+        client.http.get.return_value.json.return_value = {"llm_payload": [{"ts": 3000, "value": "CODE=A01009"}]}
+        client._fetch_device_snapshot("dev-a")
+        self.assertEqual([e.value for e in client.read_since(2)], ["A01009"])
+
+    def test_new_session_starts_at_latest_value(self):
+        """A fresh tab must not replay the (full) history ring through the monitor."""
+        client = self._client(["dev-a"])
+        client._on_open(MagicMock())
+        points = [[i * 1000, "BH" if i % 2 else f"CODE=F{i:05d}"] for i in range(1, 301)]
+        client._on_message(None, json.dumps({"subscriptionId": 1, "data": {"llm_payload": points}}))
+        self.assertEqual(len(client.read_since(0)), client.store.history)
+
+        session = {}
+        events = _new_events(client, session)
+        self.assertEqual([(e.seq, e.value) for e in events], [(300, "F00300")])
+        self.assertEqual(session["telemetry_seq"], 299)
+
+        # The cursor is only set once: later refreshes continue from it
+        session["telemetry_seq"] = 300
+        client._on_message(None, json.dumps({"subscriptionId": 1, "data": {"llm_payload": [[301000, "BH"]]}}))
+        self.assertEqual([e.value for e in _new_events(client, session)], ["BH"])
+
+class _SessionState(dict):
+    """Stands in for st.session_state (item and attribute access)."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+class TestMonitoringCycle(unittest.TestCase):
+
+    def _session(self, events):
+        """Session state whose PLC serves `events` (appended to by the test as telemetry arrives)."""
+        plc = MagicMock()
+        plc.last_seq.side_effect = lambda: events[-1].seq
+        plc.get_latest_payload.side_effect = lambda: events[-1].value
+        plc.read_since.side_effect = lambda seq: [e for e in events if e.seq > seq]
+        return _SessionState(plc=plc, language="en")
+
+    def _run_cycles(self, service, state, cycles=1):
+        with patch("src.ui.controller.st", new=MagicMock(session_state=state)), \
+                patch("src.ui.controller.get_service", return_value=service), \
+                patch("src.ui.controller.get_text", new=str):
+            for _ in range(cycles):
+                smart_monitoring_cycle.__wrapped__()
+
+    def test_unchanged_telemetry_redraws_last_report(self):
+        service = MagicMock()
+        service.process_cycle.return_value = CycleResult(status="ALARM", payload="F01", ai_report="Fix")
+        self._run_cycles(service, self._session([TelemetryEvent(1, 1.0, "F01")]), cycles=3)
+        service.process_cycle.assert_called_once()
+
+    def test_failed_analysis_is_retried(self):
+        """An AI Service Error report must not be cached as the cycle's result."""
+        service = MagicMock()
+        service.process_cycle.side_effect = [
+            CycleResult(status="ALARM", payload="F01", ai_report="AI Service Error: timeout"),
+            CycleResult(status="ALARM", payload="F01", ai_report="Fix")]
+        state = self._session([TelemetryEvent(1, 1.0, "F01")])
+        self._run_cycles(service, state, cycles=3)
+        self.assertEqual(service.process_cycle.call_count, 2)
+        self.assertEqual(state.last_cycle.ai_report, "Fix")
+
+    def test_cursor_moves_only_after_processing(self):
+        """Events of a failed cycle are read again, so their transitions are not lost."""
+        events = [TelemetryEvent(1, 1.0, "F01")]
+        service = MagicMock()
+        service.process_cycle.side_effect = [
+            RuntimeError("database is locked"),
+            CycleResult(status="ALARM", payload="F01", ai_report="Fix"),
+            CycleResult(status="STABLE", payload="BH")]
+        state = self._session(events)
+        self._run_cycles(service, state)
+        self.assertEqual(state.telemetry_seq, 0)
+
+        events.append(TelemetryEvent(2, 2.0, "BH"))
+        self._run_cycles(service, state)
+        self.assertEqual([c.args[0] for c in service.process_cycle.call_args_list], ["F01", "F01", "BH"])
+        self.assertEqual(state.telemetry_seq, 2)
+
+class TestTelemetryRing(unittest.TestCase):
+
+    def test_wraps_and_keeps_last_capacity_values(self):
+        ring = TelemetryRing(4)
+        for i in range(10):
+            ring.append(f"v{i}", float(i))
+        self.assertEqual([(e.seq, e.value) for e in ring.read_since(0)], [(7, "v6"), (8, "v7"), (9, "v8"), (10, "v9")])
+        self.assertEqual([e.value for e in ring.read_since(8)], ["v8", "v9"])
+        self.assertEqual(ring.read_since(10), [])
+
+    def test_drops_slots_rewritten_during_read(self):
+        ring = TelemetryRing(4)
+        for i in range(4):
+            ring.append(i, float(i))
+        ring._seqs[1] = 0  # writer is midway through reusing seq 1's slot
+        self.assertEqual([e.seq for e in ring.read_since(0)], [2, 3, 4])
+
+class TestTelemetryStore(unittest.TestCase):
+
+    def test_version_and_change_notification(self):
+        store = TelemetryStore()
+        self.assertEqual(store.version, 0)
+        self.assertEqual(store.wait_for_change(0, timeout=0.01), 0)  # nothing changed, times out
+
+        waiter = threading.Thread(target=lambda: results.append(store.wait_for_change(0, timeout=5)))
+        results = []
+        waiter.start()
+        store.update("dev-a", {"llm_payload": "F30001"})
+        waiter.join(timeout=5)
+
+        self.assertEqual(results, [1])
+        store.update("dev-a", {})  # empty updates are not changes
+        self.assertEqual(store.version, 1)
+
+    def test_last_seq_tracks_one_series(self):
+        """Per-series change check: other devices and keys leave it alone."""
+        store = TelemetryStore()
+        store.update("dev-a", {"llm_payload": "BH"})
+        store.update("dev-b", {"llm_payload": "F30001"})
+        store.update("dev-a", {"temperature": 71.5})
+        self.assertEqual(store.last_seq("dev-a", "llm_payload"), 1)
+        self.assertEqual(store.version, 3)
+        store.update("dev-a", {"llm_payload": "F30001"})
+        self.assertEqual(store.last_seq("dev-a", "llm_payload"), 2)
+        self.assertEqual(store.last_seq("dev-c", "llm_payload"), 0)
+
+class TestPooledHTTPClient(unittest.TestCase):
+
+    def test_reuses_session_and_tracks_latency(self):
+        """All calls go through one pooled session; counters are kept per endpoint."""
+        client = PooledHTTPClient("http://tb.local:9090/", pool_size=4)
+        adapter = client.session.get_adapter("http://tb.local:9090")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(adapter.max_retries.total > 0)
+
+        with patch.object(client.session, "request") as mock_request:
+            mock_request.side_effect = [MagicMock(status_code=200), MagicMock(status_code=503),
+                                        MagicMock(status_code=200)]
+            client.get("/api/a?keys=x", endpoint="snapshot")
+            client.get("/api/b?keys=y", endpoint="snapshot")
+            client.post("/api/auth/login")
+
+            self.assertEqual(mock_request.call_args_list[0].args, ("GET", "http://tb.local:9090/api/a?keys=x"))
+            self.assertEqual(mock_request.call_args_list[0].kwargs["timeout"], 5)
+
+        stats = client.stats()
+        self.assertEqual(stats["snapshot"]["count"], 2)
+        self.assertEqual(stats["snapshot"]["errors"], 1)
+        self.assertEqual(stats["POST /api/auth/login"]["count"], 1)
+
+def _jwt(exp: float) -> str:
+    body = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{body}.signature"
+
+class TestAsyncIoTClient(unittest.TestCase):
+
+    def setUp(self):
+        AsyncIoTClient._instance = None
+
+    def _client(self, devices, **kwargs):
+        with patch.object(AsyncIoTClient, '_start_background_worker'):
+            client = AsyncIoTClient(**kwargs)
+        client.device_ids = list(devices)
+        client._fetch_device_snapshot = lambda *a: None
+        return client
+
+    def test_snapshots_are_fetched_concurrently(self):
+        client = self._client([f"dev-{i}" for i in range(8)])
+        client.token = "t"
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def fetch(device_id):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.1)
+            with lock:
+                active[0] -= 1
+            client._store_values(device_id, {"llm_payload": "BH"}, 1000)
+        client._fetch_device_snapshot = fetch
+
+        start = time.monotonic()
+        asyncio.run(client._fetch_snapshots())
+        self.assertLess(time.monotonic() - start, 0.5) # 8 x 0.1s one after another would take 0.8s
+        self.assertGreater(peak[0], 1)
+        self.assertEqual(set(client.get_latest_payloads().values()), {"BH"})
+
+    def test_streams_from_local_server_with_backpressure(self):
+        """Every frame of a burst is consumed through a 2-slot queue; the last value wins."""
+        client = self._client([f"dev-{i}" for i in range(3)], queue_size=2)
+        client._get_token = lambda: _jwt(time.time() + 3600)
+        seen_paths = []
+
+        async def handler(ws):
+            seen_paths.append(ws.request.path)
+            cmds = json.loads(await ws.recv())["tsSubCmds"]
+            for n in range(200):
+                for cmd in cmds:
+                    await ws.send(json.dumps({"subscriptionId": cmd["cmdId"],
+                                              "data": {"llm_payload": [[1000 + n, f"CODE=F{n:05d}"]]}}))
+            await ws.close()
+
+        async def scenario():
+            async with serve(handler, "127.0.0.1", 0) as server:
+                port = server.sockets[0].getsockname()[1]
+                client.local_ws_url = f"ws://127.0.0.1:{port}"
+                self.assertTrue(await client._ensure_token())
+                received = await asyncio.wait_for(client._session(), timeout=10)
+                self.assertTrue(received)
+
+        asyncio.run(scenario())
+        self.assertTrue(seen_paths[0].startswith("/api/ws/plugins/telemetry?token=header."))
+        self.assertEqual(set(client.get_latest_payloads().values()), {"F00199"})
+
+    def test_token_refreshed_before_expiry(self):
+        client = self._client(["dev-a"], refresh_margin=60)
+        logins = []
+        client._get_token = lambda: logins.append(1) or _jwt(time.time() + 3600)
+
+        async def scenario():
+            await client._ensure_token()
+            await client._ensure_token()  # still valid, no login
+            client.token_expiry = time.time() + 30  # inside the refresh margin
+            await client._ensure_token()
+
+        asyncio.run(scenario())
+        self.assertEqual(len(logins), 2)
+        self.assertAlmostEqual(client.token_expiry, time.time() + 3600, delta=5)
+
+    def test_jittered_backoff_is_capped(self):
+        client = self._client(["dev-a"], reconnect_base=0.5, reconnect_cap=4.0)
+        delays = [client.backoff_delay(attempt) for attempt in range(10) for _ in range(20)]
+        self.assertTrue(all(0 <= d <= 4.0 for d in delays))
+        self.assertTrue(max(client.backoff_delay(0) for _ in range(50)) <= 0.5)
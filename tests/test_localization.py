@@ -22,6 +22,8 @@ from src.ui.localization import get_text
 
 # Reload module to ensure translations are loaded if they were dynamic (here they are static)
 import src.ui.localization
+# Other test modules may have imported the UI with the real streamlit first
+src.ui.localization.st = st
 # Access the TRANSLATIONS dict directly or test behaviors
 # Since TRANSLATIONS is not exported in my previous code, I'll rely on get_text behavior.
 # Wait, I didn't export TRANSLATIONS in localization.py? I defined it there.
@@ -1,6 +1,11 @@
+import time
+import threading
 import unittest
 from unittest.mock import patch
 from src.services.logger import AlarmLogger
+from src.services.singleflight import SingleFlight
+from src.services.log_writer import LogWriter
+from src.services.analysis_pool import AnalysisPool, CANCELLED, DONE, FAILED
 
 class TestLogger(unittest.TestCase):
 
@@ -18,4 +23,160 @@ class TestLogger(unittest.TestCase):
     def test_get_logs_calls_db(self, mock_db_manager):
         """Test if get_logs calls DatabaseManager.get_logs_as_df."""
         AlarmLogger.get_logs()
-        mock_db_manager.get_logs_as_df.assert_called_once()
\ No newline at end of file
+        mock_db_manager.get_logs_as_df.assert_called_once()
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_concurrently(self, n, target):
+        results, errors = [], []
+        def worker():
+            try:
+                results.append(target())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads: t.start()
+        for t in threads: t.join(timeout=5)
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight, calls = SingleFlight(), []
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "report"
+
+        results, errors = self._run_concurrently(5, lambda: flight.do("F30001", slow, timeout=5))
+        self.assertEqual(results, ["report"] * 5)
+        self.assertEqual((len(calls), errors), (1, []))
+        self.assertFalse(flight.in_flight("F30001"))
+
+        flight.do("F30001", slow)  # finished keys run again
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_propagate_to_all_waiters(self):
+        flight = SingleFlight()
+        def failing():
+            time.sleep(0.2)
+            raise ValueError("LLM down")
+
+        results, errors = self._run_concurrently(3, lambda: flight.do("F30001", failing, timeout=5))
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ["LLM down"] * 3)
+
+    def test_waiter_timeout(self):
+        flight, release = SingleFlight(), threading.Event()
+        leader = threading.Thread(target=lambda: flight.do("F30001", lambda: release.wait(5)))
+        leader.start()
+        time.sleep(0.05)
+        with self.assertRaises(TimeoutError):
+            flight.do("F30001", lambda: "never", timeout=0.05)
+        release.set()
+        leader.join(timeout=5)
+
+
+class TestAnalysisPool(unittest.TestCase):
+
+    def _blocked_pool(self, **kwargs):
+        """Pool with one worker busy on a job until `gate` is set."""
+        pool, gate = AnalysisPool(workers=1, **kwargs), threading.Event()
+        busy = pool.submit("BUSY", lambda: gate.wait(5))
+        deadline = time.time() + 5
+        while busy.status != "RUNNING" and time.time() < deadline:
+            time.sleep(0.01)
+        return pool, gate
+
+    def test_newest_alarm_runs_first(self):
+        pool, gate = self._blocked_pool()
+        order = []
+        jobs = [pool.submit(code, lambda code=code: order.append(code) or code) for code in ["F1", "F2", "F3"]]
+        gate.set()
+        for job in jobs:
+            self.assertTrue(job.done.wait(5))
+        self.assertEqual(order, ["F3", "F2", "F1"])
+        self.assertEqual(jobs[0].outcome(), "F1")
+
+    def test_bounded_queue_drops_oldest(self):
+        pool, gate = self._blocked_pool(max_queue=2)
+        jobs = [pool.submit(code, lambda: "report") for code in ["F1", "F2", "F3"]]
+        self.assertEqual(jobs[0].status, CANCELLED)
+        gate.set()
+        self.assertTrue(jobs[2].done.wait(5) and jobs[1].done.wait(5))
+        self.assertEqual((jobs[1].status, jobs[2].status), (DONE, DONE))
+
+    def test_release_cancels_queued_job_without_interest(self):
+        pool, gate = self._blocked_pool()
+        calls = []
+        job = pool.submit("F1", lambda: calls.append(1), acquire=True)
+        pool.submit("F1", lambda: calls.append(1), acquire=True)  # second session joins
+        pool.release("F1")
+        self.assertEqual(job.status, "QUEUED")
+        pool.release("F1")
+        self.assertEqual(job.status, CANCELLED)
+
+        gate.set()
+        time.sleep(0.1)
+        self.assertEqual(calls, [])
+        self.assertIsNot(pool.submit("F1", lambda: None), job)  # a new submit starts over
+
+    def test_failure_is_reported_to_collectors(self):
+        pool = AnalysisPool(workers=1)
+        job = pool.submit("F1", lambda: 1 / 0)
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(job.status, FAILED)
+        self.assertIs(pool.submit("F1", lambda: "retry"), job)  # kept until result_ttl expires
+        with self.assertRaises(ZeroDivisionError):
+            job.outcome()
+
+
+class TestLogWriter(unittest.TestCase):
+
+    def test_batches_and_coalesces_consecutive_duplicates(self):
+        batches = []
+        writer = LogWriter(batches.append, batch_rows=3, flush_interval=0.2, coalesce_key=lambda row: row[0])
+        for code in ["F1", "F1", "F2", "F3", "F3", "F4", "F1"]:
+            self.assertTrue(writer.submit((code,)))
+        self.assertTrue(writer.flush(timeout=5))
+
+        rows = [row[0] for batch in batches for row in batch]
+        self.assertEqual(rows, ["F1", "F2", "F3", "F4", "F1"])
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+        self.assertLess(len(batches), len(rows))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        gate = threading.Event()
+        writer = LogWriter(lambda batch: gate.wait(5), max_queue=2, batch_rows=1)
+        results = [writer.submit((i,)) for i in range(6)]
+        gate.set()
+        self.assertFalse(all(results))
+        self.assertEqual(writer.dropped, results.count(False))
+        self.assertTrue(writer.flush(timeout=5))
+
+    def test_timed_out_flush_leaves_no_thread_behind(self):
+        gate = threading.Event()
+        writer = LogWriter(lambda batch: gate.wait(5), batch_rows=1)
+        writer.submit(("F1",))
+        threads = threading.active_count()
+        for _ in range(3):
+            self.assertFalse(writer.flush(timeout=0.05))
+        self.assertEqual(threading.active_count(), threads)
+        gate.set()
+        self.assertTrue(writer.flush(timeout=5))
+
+    def test_dropped_row_is_not_coalesced_away_later(self):
+        gate = threading.Event()
+        written = []
+        def write(batch):
+            gate.wait(5)
+            written.extend(row[0] for row in batch)
+        writer = LogWriter(write, max_queue=1, batch_rows=1, coalesce_key=lambda row: row[0])
+        writer.submit(("F1",))
+        time.sleep(0.1) # F1 is being written, the queue is empty again
+        self.assertTrue(writer.submit(("F2",)))
+        self.assertFalse(writer.submit(("F3",))) # queue full: dropped
+
+        gate.set()
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertTrue(writer.submit(("F3",))) # the same alarm again must be logged
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(written, ["F1", "F2", "F3"])